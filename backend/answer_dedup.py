@@ -0,0 +1,196 @@
+"""
+Near-duplicate answer detection so /grade can reuse prior grades.
+
+Answers are normalized (prose: case, spacing and trailing punctuation; Python
+code: comments and the spacing between tokens), shingled into character 5-grams and summarized
+with a MinHash signature. Signatures are bucketed with LSH banding per
+question, so a lookup only compares against a handful of candidates instead
+of every graded answer.
+"""
+
+import ast
+import hashlib
+import io
+import json
+import re
+import sqlite3
+import time
+import tokenize
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+_PRIME = np.uint64((1 << 61) - 1)
+
+_rng = np.random.RandomState(1337)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS graded_answers (
+    id INTEGER PRIMARY KEY,
+    question_key TEXT NOT NULL,
+    answer_hash TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_graded_exact ON graded_answers(question_key, answer_hash);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    question_key TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    answer_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lsh_lookup ON lsh_buckets(question_key, band, bucket);
+"""
+
+
+def _normalize_code(code: str) -> str:
+    """Python source as one line per statement: tokens joined by single spaces, 4-space indents.
+
+    Only comments, blank lines and spacing between tokens are dropped; string
+    literals are kept exactly as written, so `"#"` or `"a  b"` never collapse.
+    """
+    lines: List[str] = []
+    current: List[str] = []
+    depth = 0
+    for tok in tokenize.generate_tokens(io.StringIO(code.expandtabs(4)).readline):
+        if tok.type == tokenize.INDENT:
+            depth += 1
+        elif tok.type == tokenize.DEDENT:
+            depth -= 1
+        elif tok.type == tokenize.NEWLINE:
+            if current:
+                lines.append(" " * (4 * depth) + " ".join(current))
+                current = []
+        elif tok.type not in (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER):
+            current.append(tok.string)
+    if current:
+        lines.append(" " * (4 * depth) + " ".join(current))
+    return "\n".join(lines)
+
+
+def normalize_answer(answer: str, is_code: bool) -> str:
+    """Canonical form that ignores formatting-only differences."""
+    text = answer
+    if is_code:
+        try:
+            # `#` only starts a comment in Python (C's #include does not), so other code is left alone
+            ast.parse(text)
+            return _normalize_code(text)
+        except (tokenize.TokenError, SyntaxError, ValueError):
+            # Not Python (another language, broken code): only drop blank lines
+            # and trailing spaces, since anything more may merge distinct answers
+            return "\n".join(line.rstrip() for line in text.expandtabs(4).splitlines() if line.strip())
+    # Operators, signs and digits carry meaning ("x < y" vs "x > y", "-5" vs "5"), so prose keeps them
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip(".!?,;:").rstrip()
+
+
+def question_key(question: str) -> str:
+    """Stable key for a question, insensitive to case and spacing."""
+    return hashlib.sha256(re.sub(r"\s+", " ", question.strip().lower()).encode("utf-8")).hexdigest()
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of the text's character shingles."""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    # 32-bit shingle hashes keep a * x + b below 2**63, so nothing overflows
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # (a * x + b) mod p for every permutation/shingle pair, then min per permutation
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME
+    return permuted.min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+class AnswerIndex:
+    """Per-question store of graded answers with MinHash/LSH lookup."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bands(self, signature: np.ndarray):
+        for band in range(BANDS):
+            chunk = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+            yield band, hashlib.blake2b(chunk.tobytes(), digest_size=8).hexdigest()
+
+    def find(self, question: str, answer: str, is_code: bool, threshold: float) -> Optional[Tuple[Dict, float]]:
+        """Return (prior result, similarity) for the closest graded answer above threshold."""
+        qkey = question_key(question)
+        normalized = normalize_answer(answer, is_code)
+        answer_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM graded_answers WHERE question_key = ? AND answer_hash = ? ORDER BY id DESC LIMIT 1",
+                (qkey, answer_hash),
+            ).fetchone()
+            if row:
+                return json.loads(row[0]), 1.0
+            if threshold >= 1.0:
+                return None
+
+            signature = minhash(normalized)
+            candidates = set()
+            for band, bucket in self._bands(signature):
+                for (answer_id,) in conn.execute(
+                    "SELECT answer_id FROM lsh_buckets WHERE question_key = ? AND band = ? AND bucket = ?",
+                    (qkey, band, bucket),
+                ):
+                    candidates.add(answer_id)
+            if not candidates:
+                return None
+            placeholders = ",".join("?" for _ in candidates)
+            rows = conn.execute(
+                f"SELECT signature, result FROM graded_answers WHERE id IN ({placeholders})", tuple(candidates)
+            ).fetchall()
+
+        best: Optional[Tuple[Dict, float]] = None
+        for blob, result in rows:
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (json.loads(result), score)
+        return best
+
+    def add(self, question: str, answer: str, is_code: bool, result: Dict) -> None:
+        """Record a freshly graded answer."""
+        qkey = question_key(question)
+        normalized = normalize_answer(answer, is_code)
+        answer_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        signature = minhash(normalized)
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO graded_answers (question_key, answer_hash, signature, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (qkey, answer_hash, signature.tobytes(), json.dumps(result), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO lsh_buckets (question_key, band, bucket, answer_id) VALUES (?, ?, ?, ?)",
+                [(qkey, band, bucket, cur.lastrowid) for band, bucket in self._bands(signature)],
+            )
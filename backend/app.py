@@ -1,9 +1,35 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, g, has_request_context, send_file
 from flask_cors import CORS
 import requests
 from memory_manager import EducatorMemory
+from llm_client import GenerationCancelled, generate_text, limit_concurrency, model_report, sample_outputs
+from quiz_generator import generate_questions, render_markdown
+from question_bank import QuestionBank, render_flashcards
+from job_queue import JobQueue
+from prefetch import Prefetcher
+from search_index import SearchIndex
+from code_precheck import analyze as analyze_code, local_grade
+from markdown_slides import is_structured, markdown_to_slides
+from document_store import DocumentStore
+from generation_cache import GenerationCache, prompt_key
+from batch_templates import MAX_ROSTER, placeholders_in, render_roster, roster_fields
+from incremental_generation import generate_sections, renumber_slides, split_markdown_sections, split_paragraphs
+import generation_profiles
+import llm_backends
+import metrics
+from interprocess import ActivityMarker, append_line
+from lazy import Lazy, optional_module
 import os
+import atexit
+import gzip
+import hashlib
 import json
+import select
+import signal
+import socket
+import sys
+import threading
+import time
 from datetime import datetime
 from prompts import (
     lecture_content_prompt,
@@ -12,74 +38,255 @@ from prompts import (
     grading_prompt,
     quiz_prompt,
     admin_prompt,
+    personalization_prompt,
     ideas_prompt,
     help_prompt,
     chat_prompt,
 )
 from typing import Optional
 
-try:
-    import PyPDF2  # type: ignore
-except Exception:
-    PyPDF2 = None
-try:
-    import pdfplumber  # type: ignore
-except Exception:
-    pdfplumber = None
+# Routes live on a blueprint so create_app() can build the app per worker process
+api = Blueprint("api", __name__)
 
-app = Flask(__name__)
-CORS(app)
+# Default model (env MODEL_NAME); generation profiles may route tasks elsewhere
+MODEL_NAME = generation_profiles.DEFAULT_MODEL
+# Concurrent model calls allowed across all worker processes on this machine
+MODEL_CONCURRENCY = int(os.environ.get("MODEL_CONCURRENCY", "4"))
+# Fraction of generations logged to data/model_samples.jsonl for reviewing model routing
+MODEL_SAMPLE_RATE = float(os.environ.get("MODEL_SAMPLE_RATE", "0.01"))
 
-# Ollama API endpoint
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "mistral"
+# Client-supplied deadline headers: absolute unix time, or seconds from now.
+DEADLINE_HEADER = "X-Request-Deadline"
+TIMEOUT_HEADER = "X-Request-Timeout"
 
-# Initialize memory manager
-memory_manager = EducatorMemory()
+# Services below are built on first use (see lazy.py) so a new worker accepts
+# requests without waiting on disk I/O or NumPy; create_app() warms them up
+# in the background.
+memory_manager = Lazy(EducatorMemory)
 
-# Local data directory for saved outputs
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# Local data directory for saved outputs and service state (DATA_DIR points tests and extra deployments elsewhere)
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(os.path.dirname(__file__), "data")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
+def _background_generate(prompt: str, should_cancel=None) -> str:
+    """Generate outside any request (no client deadline, generous timeout); aborted once `should_cancel` fires."""
+    return generate_text(prompt, profile="bank", timeout=300, should_cancel=should_cancel, cancel_reason="bank_yield")
+
+
+# Entries kept in the generation cache before the least recently used are evicted
+GENERATION_CACHE_MAX_ENTRIES = int(os.environ.get("GENERATION_CACHE_MAX_ENTRIES", "20000"))
+# Section-level cache of generated outputs (slides, adjusted paragraphs, ...)
+generation_cache = Lazy(
+    lambda: GenerationCache(os.path.join(DATA_DIR, "generation_cache.sqlite3"), GENERATION_CACHE_MAX_ENTRIES)
+)
+
+# Interactive generations mark themselves here so background prefetch yields to them
+interactive_activity = ActivityMarker(os.path.join(DATA_DIR, "interactive.lock"))
+
+# Opt-in: speculatively generate slides/simplify/expand for new lectures while idle
+PREFETCH_FOLLOWUPS = os.environ.get("PREFETCH_FOLLOWUPS", "").lower() in ("1", "true", "yes")
+
+
+def _prefetch_generate(prompt: str, profile: str, should_cancel) -> str:
+    """Generate a speculative follow-up; aborted as soon as `should_cancel` fires."""
+    return generate_text(
+        prompt,
+        profile=profile,
+        timeout=300,
+        should_cancel=should_cancel,
+        cancel_reason="prefetch_yield",
+    )
+
+
+prefetcher = Lazy(
+    lambda: Prefetcher(generation_cache, _prefetch_generate, interactive_activity.busy, generation_profiles.resolved_model)
+)
+
+# Full-text index of saved outputs and uploads, updated as files are written
+search_index = Lazy(lambda: SearchIndex(os.path.join(DATA_DIR, "search_index.sqlite3"), DATA_DIR))
+
+# Extracted upload text, referenced by document_id from /chat and /generate
+document_store = Lazy(lambda: DocumentStore(os.path.join(DATA_DIR, "documents.sqlite3")))
+# Uploads nobody has referenced for this long are dropped at startup
+DOCUMENT_RETENTION_DAYS = 30
+
+# Question/flashcard bank precomputed from uploaded documents
+question_bank = Lazy(
+    lambda: QuestionBank(
+        os.path.join(DATA_DIR, "question_bank.sqlite3"), _background_generate, interactive_activity.busy
+    )
+)
+
+
 def _now_ts() -> str:
     """Return ISO timestamp without microseconds for filenames."""
     return datetime.now().replace(microsecond=0).isoformat().replace(":", "-")
 
 
-def _ollama_generate(prompt: str, temperature: float = 0.6, timeout: int = 120) -> str:
-    """Call local Ollama and return the string response, or raise an error."""
-    resp = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": MODEL_NAME,
-            "prompt": prompt,
-            "stream": False,
-            "temperature": temperature,
-        },
-        timeout=timeout,
-    )
-    resp.raise_for_status()
-    payload = resp.json()
-    return payload.get("response", "").strip()
+@api.before_app_request
+def _set_request_deadline():
+    """Parse the client deadline headers once per request."""
+    g.deadline = None
+    try:
+        if request.headers.get(DEADLINE_HEADER):
+            g.deadline = float(request.headers[DEADLINE_HEADER])
+        elif request.headers.get(TIMEOUT_HEADER):
+            g.deadline = time.time() + float(request.headers[TIMEOUT_HEADER])
+    except ValueError:
+        g.deadline = None
+
+
+def _client_disconnected(environ: Optional[dict] = None) -> bool:
+    """Return True if the client socket of the current (or given) request was closed."""
+    environ = environ if environ is not None else request.environ
+    sock = environ.get("werkzeug.socket") or environ.get("gunicorn.socket")
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return False
+
+
+def _cancelled_response(e: GenerationCancelled):
+    """Map a cancelled generation to an HTTP error response."""
+    if e.reason == "deadline":
+        return jsonify({"error": "Request deadline exceeded"}), 504
+    # 499: client closed request (nobody is listening, but keep the log honest)
+    return jsonify({"error": "Client disconnected"}), 499
+
+
+def _ollama_generate(prompt: str, profile: str = "default", timeout: int = 120) -> str:
+    """Call the model server and return the string response, or raise an error.
+
+    Inside a request, the client deadline caps `timeout` and the generation is
+    aborted as soon as the client disconnects.
+    """
+    deadline = g.get("deadline") if has_request_context() else None
+    should_cancel = _client_disconnected if has_request_context() else None
+    with interactive_activity.active():
+        return generate_text(
+            prompt,
+            profile=profile,
+            timeout=timeout,
+            deadline=deadline,
+            should_cancel=should_cancel,
+        )
+
+
+def _threaded_generator(profile: str = "default", timeout: int = 120):
+    """Return a prompt -> text callable bound to the current request.
+
+    The callable carries the request deadline and disconnect check with it,
+    so it can be used from worker threads and streaming responses.
+    """
+    deadline = g.get("deadline")
+    environ = request.environ
+
+    def generate(prompt: str) -> str:
+        with interactive_activity.active():
+            return generate_text(
+                prompt,
+                profile=profile,
+                timeout=timeout,
+                deadline=deadline,
+                should_cancel=lambda: _client_disconnected(environ),
+            )
+
+    return generate
+
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+
+@api.after_app_request
+def _compress_response(response):
+    """Compress large JSON/text bodies with br or gzip when the client accepts it."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype == "application/json" or response.mimetype.startswith("text/"))
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    brotli = optional_module("brotli") if request.accept_encodings["br"] else None
+    if brotli is not None:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif request.accept_encodings["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _file_validators(path: str):
+    """Return (etag, last_modified) for a file from its size and mtime."""
+    st = os.stat(path)
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}", datetime.fromtimestamp(int(st.st_mtime)).astimezone()
+
+
+def _not_modified(etag: str, last_modified: datetime):
+    """Return a 304 response if the request's validators still match, else None."""
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag, weak=True)
+    resp.last_modified = last_modified
+    return resp
+
+
+def _with_validators(resp, etag: str, last_modified: datetime):
+    """Attach cache validators so clients revalidate instead of refetching."""
+    resp.set_etag(etag, weak=True)
+    resp.last_modified = last_modified
+    resp.cache_control.no_cache = True
+    return resp
 
 
 def _write_text_file(content: str, prefix: str, ext: str = ".md") -> str:
     """Save text content to the data directory and return the file path."""
     safe_prefix = "".join(ch for ch in prefix if ch.isalnum() or ch in ("-", "_")) or "output"
-    filename = f"{safe_prefix}_{_now_ts()}{ext}"
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
-    return path
+    stamp = _now_ts()
+    for attempt in range(1000):
+        suffix = f"-{attempt}" if attempt else ""
+        path = os.path.join(DATA_DIR, f"{safe_prefix}_{stamp}{suffix}{ext}")
+        try:
+            # Exclusive create: another worker saving in the same second gets the next name
+            with open(path, "x", encoding="utf-8") as f:
+                f.write(content)
+        except FileExistsError:
+            continue
+        try:
+            search_index.index_file(os.path.basename(path), content)
+        except Exception as e:
+            print(f"Could not index {path}: {e}")
+        return path
+    raise FileExistsError(f"No free filename for {safe_prefix}_{stamp}{ext}")
 
 
 def _append_jsonl(row: dict, filename: str) -> str:
     """Append a JSON line to a file under the data directory and return path."""
     path = os.path.join(DATA_DIR, filename)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    append_line(path, json.dumps(row, ensure_ascii=False))
     return path
 
 def build_prompt(task, text, user_id=None):
@@ -108,7 +315,120 @@ def build_prompt(task, text, user_id=None):
     
     return task_prompts.get(task, f"{tone_instruction}{context}Summarize this text:\n\n{text}")
 
-@app.route("/generate", methods=["POST"])
+
+def _requested_document(data: dict):
+    """Resolve `document_id` in a request body to (document, error response)."""
+    doc_id = (data.get("document_id") or "").strip()
+    if not doc_id:
+        return None, None
+    document = document_store.get(doc_id)
+    if document is None:
+        return None, (jsonify({"error": "Unknown document_id; upload the file again"}), 404)
+    return document, None
+
+# -------- Background Jobs --------
+JOB_TIMEOUT = 1800
+
+
+def _job_prompt(task: str, params: dict):
+    """Build (prompt, generation profile) for a job task, raising ValueError on bad input."""
+    if task == "generate":
+        text = (params.get("text") or "").strip()
+        if not text:
+            raise ValueError("No text provided")
+        return build_prompt(params.get("task", "summarize"), text, params.get("user_id", "default_user")), "generate"
+    if task == "content_create":
+        topic_or_text = (params.get("input") or "").strip()
+        if not topic_or_text:
+            raise ValueError("No input provided")
+        difficulty = (params.get("difficulty") or "beginner").lower()
+        return lecture_content_prompt(topic_or_text, difficulty), "content_create"  # type: ignore[arg-type]
+    if task == "content_slide":
+        content = (params.get("content") or "").strip()
+        if not content:
+            raise ValueError("No content provided")
+        return slide_content_prompt(content), "slides_full"
+    if task == "content_adjust":
+        content = (params.get("content") or "").strip()
+        action = (params.get("action") or "simplify").lower()
+        if action not in ("simplify", "expand"):
+            raise ValueError("action must be 'simplify' or 'expand'")
+        if not content:
+            raise ValueError("No content provided")
+        return adjust_content_prompt(content, action), "adjust_full"  # type: ignore[arg-type]
+    if task == "quiz":
+        topic = (params.get("topic") or "").strip()
+        qtype = (params.get("type") or "mcq").lower()
+        if not topic:
+            raise ValueError("No topic provided")
+        if qtype not in ("mcq", "short"):
+            raise ValueError("type must be 'mcq' or 'short'")
+        count = max(1, min(20, int(params.get("count", 5))))
+        difficulty = (params.get("difficulty") or "beginner").lower()
+        return quiz_prompt(topic, difficulty, count, qtype), "quiz"  # type: ignore[arg-type]
+    if task == "ideas":
+        topic = (params.get("topic") or "").strip()
+        if not topic:
+            raise ValueError("No topic provided")
+        level = (params.get("level") or "beginner").lower()
+        return ideas_prompt(topic, level, bool(params.get("variations", True))), "ideas"  # type: ignore[arg-type]
+    raise ValueError("task must be one of: generate, content_create, content_slide, content_adjust, quiz, ideas")
+
+
+def _run_job(task: str, params: dict, on_chunk, should_cancel) -> str:
+    """Job runner: build the task prompt and stream it from the model."""
+    prompt, profile = _job_prompt(task, params)
+    return generate_text(
+        prompt,
+        profile=profile,
+        timeout=JOB_TIMEOUT,
+        should_cancel=should_cancel,
+        on_chunk=on_chunk,
+        cancel_reason="job_cancelled",
+    )
+
+
+job_queue = Lazy(lambda: JobQueue(os.path.join(DATA_DIR, "jobs.sqlite3"), _run_job, workers=2))
+
+
+@api.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queue a long-running generation and return its id for polling."""
+    data = request.json or {}
+    task = (data.get("task") or "").strip()
+    params = data.get("params") or {}
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object"}), 400
+    try:
+        _job_prompt(task, params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        job_id = job_queue.submit(task, params)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Poll a job's status and (partial) output."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@api.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job_id": job_id, "status": status})
+
+
+@api.route("/generate", methods=["POST"])
 def generate():
     """Main endpoint for generating AI responses with memory integration."""
     data = request.json or {}
@@ -116,9 +436,33 @@ def generate():
     task = data.get("task", "summarize")
     user_id = data.get("user_id", "default_user")
     
+    document, error = _requested_document(data)
+    if error is not None:
+        return error
+    if document is not None:
+        text = document["text"]
+        data.setdefault("document", document["name"])
+    
     if not text:
         return jsonify({"error": "No text provided"}), 400
     
+    # Serve flashcards for an uploaded document from the precomputed bank
+    if task == "flashcards":
+        try:
+            cards = question_bank.flashcards_for(text=text, document=data.get("document"))
+        except Exception as e:
+            print(f"Question bank lookup failed: {e}")
+            cards = None
+        if cards:
+            metrics.incr("bank.hit.flashcards")
+            memory = memory_manager.load_memory(user_id)
+            return jsonify({
+                "output": render_flashcards(cards),
+                "source": "bank",
+                "memory_summary": memory_manager.build_memory_context(memory).replace("EDUCATOR CONTEXT: ", "").replace("\n\n", "").strip()
+            })
+        metrics.incr("bank.miss.flashcards")
+    
     # Process the interaction and update memory
     try:
         updated_memory = memory_manager.process_interaction(user_id, text)
@@ -131,17 +475,9 @@ def generate():
     
     # Call Ollama
     try:
-        resp = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": MODEL_NAME, 
-                "prompt": prompt, 
-                "stream": False,
-                "temperature": 0.7
-            },
-            timeout=120
-        )
-        resp.raise_for_status()
+        output = _ollama_generate(prompt, "generate", timeout=120)
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except requests.exceptions.Timeout:
         return jsonify({"error": "Request timed out. Please try again."}), 504
     except requests.exceptions.RequestException as e:
@@ -149,9 +485,6 @@ def generate():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
-    payload = resp.json()
-    output = payload.get("response", "").strip()
-    
     # Return response with memory summary
     return jsonify({
         "output": output,
@@ -160,7 +493,7 @@ def generate():
 
 
 # -------- Core Modules: Content Generation --------
-@app.route("/content/create", methods=["POST"])
+@api.route("/content/create", methods=["POST"])
 def content_create():
     data = request.json or {}
     topic_or_text = data.get("input", "").strip()
@@ -178,8 +511,18 @@ def content_create():
             pass
 
         prompt = lecture_content_prompt(topic_or_text, difficulty)  # type: ignore[arg-type]
-        output = _ollama_generate(prompt, temperature=0.5)
+        output = _ollama_generate(prompt, "content_create")
+        if PREFETCH_FOLLOWUPS and output:
+            # Same section prompts and profiles as /content/slide and /content/adjust;
+            # structured lectures get their slides locally, so only prefetch the rest
+            if not is_structured(output):
+                prefetcher.schedule("slides", [slide_content_prompt(s) for s in split_markdown_sections(output)], "slides")
+            paragraphs = split_paragraphs(output)
+            prefetcher.schedule("adjust", [adjust_content_prompt(p, "simplify") for p in paragraphs], "adjust")
+            prefetcher.schedule("adjust", [adjust_content_prompt(p, "expand") for p in paragraphs], "adjust")
         return jsonify({"content": output})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except requests.exceptions.Timeout:
         return jsonify({"error": "Request timed out"}), 504
     except requests.exceptions.RequestException as e:
@@ -188,21 +531,52 @@ def content_create():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/content/slide", methods=["POST"])
+# /content/slide modes: "auto" converts well-structured lectures locally and
+# sends the rest to the model; "local" only converts (400 for unstructured
+# input); "llm" always asks the model (creative rewrites)
+SLIDE_MODES = ("auto", "local", "llm")
+
+
+@api.route("/content/slide", methods=["POST"])
 def content_slide():
     data = request.json or {}
     markdown_content = data.get("content", "").strip()
+    mode = (data.get("mode") or "auto").lower()
     if not markdown_content:
         return jsonify({"error": "No content provided"}), 400
+    if mode not in SLIDE_MODES:
+        return jsonify({"error": f"mode must be one of: {', '.join(SLIDE_MODES)}"}), 400
+    structured = mode != "llm" and is_structured(markdown_content)
+    if mode == "local" and not structured:
+        return jsonify({"error": "Content is not structured enough for local conversion; use mode 'auto' or 'llm'"}), 400
+    if structured:
+        with metrics.timed("slides.local_ms"):
+            output = markdown_to_slides(markdown_content)
+        if output:
+            metrics.incr("slides.local")
+            return jsonify({"slides": output, "sections": len(split_markdown_sections(markdown_content)), "reused_sections": 0, "mode": "local"})
     try:
-        prompt = slide_content_prompt(markdown_content)
-        output = _ollama_generate(prompt, temperature=0.5)
-        return jsonify({"slides": output})
+        # Generate per section so an edit only regenerates the sections it touched
+        sections = split_markdown_sections(markdown_content)
+        outputs, reused = generate_sections(
+            sections,
+            slide_content_prompt,
+            _threaded_generator("slides"),
+            generation_cache,
+            "slides",
+            generation_profiles.resolved_model("slides"),
+            use_prefetch=PREFETCH_FOLLOWUPS,
+        )
+        output = renumber_slides("\n\n".join(out.strip() for out in outputs if out.strip()))
+        metrics.incr("slides.llm")
+        return jsonify({"slides": output, "sections": len(sections), "reused_sections": reused, "mode": "llm"})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/content/adjust", methods=["POST"])
+@api.route("/content/adjust", methods=["POST"])
 def content_adjust():
     data = request.json or {}
     text = data.get("content", "").strip()
@@ -212,14 +586,30 @@ def content_adjust():
     if not text:
         return jsonify({"error": "No content provided"}), 400
     try:
-        prompt = adjust_content_prompt(text, action)  # type: ignore[arg-type]
-        output = _ollama_generate(prompt, temperature=0.4)
-        return jsonify({"content": output})
+        # Adjust per paragraph; unchanged paragraphs are served from the cache
+        paragraphs = split_paragraphs(text)
+        outputs, reused = generate_sections(
+            paragraphs,
+            lambda paragraph: adjust_content_prompt(paragraph, action),  # type: ignore[arg-type]
+            _threaded_generator("adjust"),
+            generation_cache,
+            "adjust",
+            generation_profiles.resolved_model("adjust"),
+            use_prefetch=PREFETCH_FOLLOWUPS,
+        )
+        return jsonify({
+            "content": "\n\n".join(out.strip() for out in outputs if out.strip()),
+            "paragraphs": len(paragraphs),
+            "reused_paragraphs": reused,
+            "reused_ratio": reused / len(paragraphs) if paragraphs else 0.0,
+        })
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/content/save", methods=["POST"])
+@api.route("/content/save", methods=["POST"])
 def content_save():
     data = request.json or {}
     text = data.get("content", "")
@@ -235,46 +625,101 @@ def content_save():
 
 
 # -------- Core Modules: Grading & Feedback --------
-@app.route("/grade", methods=["POST"])
+# Minimum estimated similarity for an answer to reuse a prior grade. Code only
+# reuses on a normalized exact match: a one-character edit can change correctness.
+GRADE_REUSE_THRESHOLD = 0.9
+GRADE_REUSE_THRESHOLD_CODE = 1.0
+
+def _answer_index():
+    from answer_dedup import AnswerIndex
+
+    return AnswerIndex(os.path.join(DATA_DIR, "answer_index.sqlite3"))
+
+
+answer_index = Lazy(_answer_index)
+
+@api.route("/grade", methods=["POST"])
 def grade():
     data = request.json or {}
     question = data.get("question", "").strip()
     answer = data.get("answer", "").strip()
     is_code = bool(data.get("is_code", False))
     instructor_edit = data.get("instructor_edit", None)
+    force_regrade = bool(data.get("force_regrade", False))
 
     if not question or not answer:
         return jsonify({"error": "Both question and answer are required"}), 400
     try:
-        prompt = grading_prompt(question, answer, is_code)
-        raw = _ollama_generate(prompt, temperature=0.2, timeout=90)
+        default_threshold = GRADE_REUSE_THRESHOLD_CODE if is_code else GRADE_REUSE_THRESHOLD
+        threshold = float(data.get("reuse_threshold", default_threshold))
+    except (TypeError, ValueError):
+        return jsonify({"error": "reuse_threshold must be a number"}), 400
+    try:
+        # Identical or near-identical answers to the same question reuse the prior grade
+        match = None
+        if not force_regrade:
+            try:
+                match = answer_index.find(question, answer, is_code, threshold)
+            except Exception as e:
+                print(f"Answer index lookup failed: {e}")
+        if match is not None:
+            prior, score = match
+            result = dict(prior)
+            if instructor_edit and isinstance(instructor_edit, str) and instructor_edit.strip():
+                result["feedback"] = instructor_edit.strip()
+            metrics.incr("grade.reused")
+            _append_jsonl(
+                {
+                    "ts": datetime.now().isoformat(),
+                    "question": question,
+                    "answer": answer,
+                    "is_code": is_code,
+                    "result": result,
+                    "reused": True,
+                    "similarity": score,
+                },
+                "grading_history.jsonl",
+            )
+            return jsonify({**result, "reused": True, "similarity": round(score, 3)})
+
+        # Code that does not parse (or is only stubs) is graded locally; otherwise
+        # the static findings focus the model on logic
+        report = None
+        if is_code and data.get("precheck", True):
+            with metrics.timed("grade.precheck_ms"):
+                report = analyze_code(answer)
+        result = local_grade(report) if report else None
+        if result is not None:
+            metrics.incr("grade.precheck_graded")
+        else:
+            prompt = grading_prompt(question, answer, is_code, report["findings"] if report else None)
+            raw = _ollama_generate(prompt, "grade", timeout=90)
 
-        # Try to parse JSON from model output
-        parsed = {}
-        try:
-            # find JSON braces if model added text
-            start = raw.find("{")
-            end = raw.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                parsed = json.loads(raw[start : end + 1])
-        except Exception:
+            # Try to parse JSON from model output
             parsed = {}
-
-        # Fallback defaults
-        grade_val = int(parsed.get("grade", 0)) if isinstance(parsed.get("grade"), (int, float)) else 0
-        feedback_text = parsed.get("feedback") or ""
-        detected_issues = parsed.get("detected_issues") or []
-        strengths = parsed.get("strengths") or []
+            try:
+                # find JSON braces if model added text
+                start = raw.find("{")
+                end = raw.rfind("}")
+                if start != -1 and end != -1 and end > start:
+                    parsed = json.loads(raw[start : end + 1])
+            except Exception:
+                parsed = {}
+
+            # Fallback defaults
+            grade_val = int(parsed.get("grade", 0)) if isinstance(parsed.get("grade"), (int, float)) else 0
+            detected_issues = parsed.get("detected_issues") or []
+            if report and report["findings"] and isinstance(detected_issues, list):
+                detected_issues = list(dict.fromkeys(report["findings"] + list(detected_issues)))
+            result = {
+                "grade": max(0, min(100, grade_val)),
+                "feedback": parsed.get("feedback") or "",
+                "detected_issues": detected_issues,
+                "strengths": parsed.get("strengths") or [],
+            }
 
         if instructor_edit and isinstance(instructor_edit, str) and instructor_edit.strip():
-            feedback_text = instructor_edit.strip()
-
-        result = {
-            "grade": max(0, min(100, grade_val)),
-            "feedback": feedback_text,
-            "detected_issues": detected_issues,
-            "strengths": strengths,
-        }
+            result["feedback"] = instructor_edit.strip()
 
         _append_jsonl(
             {
@@ -286,19 +731,65 @@ def grade():
             },
             "grading_history.jsonl",
         )
-        return jsonify(result)
+        try:
+            answer_index.add(question, answer, is_code, result)
+        except Exception as e:
+            print(f"Answer index update failed: {e}")
+        metrics.incr("grade.regraded" if force_regrade else "grade.graded")
+        response = {**result, "reused": False}
+        if report is not None:
+            response["static_analysis"] = report
+        return jsonify(response)
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _grading_analytics():
+    from grading_analytics import GradingAnalytics
+
+    return GradingAnalytics(
+        os.path.join(DATA_DIR, "grading_history.jsonl"),
+        os.path.join(DATA_DIR, "grading_analytics"),
+    )
+
+
+grading_analytics = Lazy(_grading_analytics)
+
+
+@api.route("/grade/analytics", methods=["GET"])
+def grade_analytics():
+    """Class-level aggregates over the grading history."""
+    try:
+        since = request.args.get("since")
+        until = request.args.get("until")
+        bucket = (request.args.get("bucket", "day") or "day").lower()
+        if bucket not in ("day", "week"):
+            return jsonify({"error": "bucket must be 'day' or 'week'"}), 400
+        summary = grading_analytics.summary(
+            since=datetime.fromisoformat(since).timestamp() if since else None,
+            until=datetime.fromisoformat(until).timestamp() if until else None,
+            pass_mark=int(request.args.get("pass_mark", 60)),
+            top_issues=int(request.args.get("top", 10)),
+            bucket=bucket,
+        )
+        return jsonify(summary)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # -------- Core Modules: Quiz & Exercise Generator --------
-@app.route("/quiz", methods=["POST"])
+@api.route("/quiz", methods=["POST"])
 def quiz():
     data = request.json or {}
     topic = data.get("topic", "").strip()
     difficulty = (data.get("difficulty", "beginner") or "beginner").lower()
     qtype = (data.get("type", "mcq") or "mcq").lower()
     num_questions = int(data.get("count", 5))
+    stream = bool(data.get("stream", False))
 
     if not topic:
         return jsonify({"error": "No topic provided"}), 400
@@ -306,30 +797,127 @@ def quiz():
         return jsonify({"error": "type must be 'mcq' or 'short'"}), 400
     num_questions = max(1, min(20, num_questions))
 
+    # An uploaded document (by document_id or name) limits banked questions to that file
+    document, error = _requested_document(data)
+    if error is not None:
+        return error
+    try:
+        banked = question_bank.questions_for(
+            qtype, difficulty, num_questions, document["name"] if document else data.get("document"), topic
+        )
+    except Exception as e:
+        print(f"Question bank lookup failed: {e}")
+        banked = None
+    metrics.incr("bank.hit.quiz" if banked else "bank.miss.quiz")
+
+    if banked:
+        if stream:
+            lines = [json.dumps({"type": "question", "index": i, "question": q}) + "\n" for i, q in enumerate(banked, 1)]
+            lines.append(json.dumps({
+                "type": "done",
+                "requested": num_questions,
+                "generated": len(banked),
+                "source": "bank",
+                "quiz": render_markdown(banked, qtype),
+            }) + "\n")
+            return Response(lines, mimetype="application/x-ndjson")
+        return jsonify({
+            "quiz": render_markdown(banked, qtype),
+            "questions": banked,
+            "requested": num_questions,
+            "generated": len(banked),
+            "source": "bank",
+        })
+
+    generate_fn = _threaded_generator("quiz_json")
+    questions = generate_questions(generate_fn, topic, difficulty, num_questions, qtype)  # type: ignore[arg-type]
+
+    if stream:
+        fallback_fn = _threaded_generator("quiz")
+
+        def ndjson():
+            collected = []
+            try:
+                for q in questions:
+                    collected.append(q)
+                    yield json.dumps({"type": "question", "index": len(collected), "question": q}) + "\n"
+                # Model ignored the JSON format; fall back to the free-text prompt
+                quiz_text = (
+                    render_markdown(collected, qtype)
+                    if collected
+                    else fallback_fn(quiz_prompt(topic, difficulty, num_questions, qtype))  # type: ignore[arg-type]
+                )
+            except GenerationCancelled as e:
+                yield json.dumps({"type": "error", "error": str(e), "reason": e.reason}) + "\n"
+                return
+            except Exception as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+                return
+            yield json.dumps({
+                "type": "done",
+                "requested": num_questions,
+                "generated": len(collected),
+                "source": "live",
+                "quiz": quiz_text,
+            }) + "\n"
+
+        return Response(ndjson(), mimetype="application/x-ndjson")
+
     try:
-        prompt = quiz_prompt(topic, difficulty, num_questions, qtype)  # type: ignore[arg-type]
-        output = _ollama_generate(prompt, temperature=0.5)
-        return jsonify({"quiz": output})
+        collected = list(questions)
+        if not collected:
+            # Model ignored the JSON format; fall back to the free-text prompt
+            prompt = quiz_prompt(topic, difficulty, num_questions, qtype)  # type: ignore[arg-type]
+            output = _ollama_generate(prompt, "quiz")
+            return jsonify({"quiz": output, "questions": [], "requested": num_questions, "generated": 0, "source": "live"})
+        return jsonify({
+            "quiz": render_markdown(collected, qtype),
+            "questions": collected,
+            "requested": num_questions,
+            "generated": len(collected),
+            "source": "live",
+        })
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # -------- Storage & History --------
-@app.route("/history", methods=["GET"])
+@api.route("/history", methods=["GET"])
 def history():
     """Return saved history summaries."""
-    items = []
-    # List saved text files
+    # The listing only changes when saved text files change or grades are appended.
+    # DATA_DIR's own mtime is no signal: SQLite journals in it churn on every write.
+    grading_file = os.path.join(DATA_DIR, "grading_history.jsonl")
+    files = []
     try:
-        for fname in os.listdir(DATA_DIR):
-            fpath = os.path.join(DATA_DIR, fname)
-            if os.path.isfile(fpath) and (fname.endswith(".md") or fname.endswith(".txt")):
-                items.append({"type": "file", "name": fname})
-    except Exception:
-        pass
+        with os.scandir(DATA_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith((".md", ".txt")) and entry.is_file():
+                    files.append((entry.name, entry.stat().st_mtime_ns))
+        grading_stat = os.stat(grading_file) if os.path.exists(grading_file) else None
+    except OSError:
+        files, grading_stat = None, None
+    signature = None
+    if files is not None:
+        files.sort()
+        digest = hashlib.sha1("\n".join(f"{name}\t{mtime:x}" for name, mtime in files).encode("utf-8"))
+        signature = digest.hexdigest()[:16]
+        if grading_stat is not None:
+            signature += f"-{grading_stat.st_size:x}-{grading_stat.st_mtime_ns:x}"
+        newest_ns = max([mtime for _, mtime in files] + [grading_stat.st_mtime_ns if grading_stat else 0])
+        last_modified = datetime.fromtimestamp(newest_ns // 1_000_000_000).astimezone()
+        not_modified = _not_modified(signature, last_modified)
+        if not_modified is not None:
+            return not_modified
+        if _history_cache.get("signature") == signature:
+            return _with_validators(jsonify(_history_cache["body"]), signature, last_modified)
+
+    # List saved text files
+    items = [{"type": "file", "name": name} for name, _ in files or []]
 
     # Include grading history count
-    grading_file = os.path.join(DATA_DIR, "grading_history.jsonl")
     grading_count = 0
     try:
         if os.path.exists(grading_file):
@@ -338,27 +926,134 @@ def history():
     except Exception:
         grading_count = 0
 
-    return jsonify({"items": items, "grading_entries": grading_count})
+    body = {"items": items, "grading_entries": grading_count}
+    if signature is None:
+        return jsonify(body)
+    _history_cache.update(signature=signature, body=body)
+    return _with_validators(jsonify(body), signature, last_modified)
+
+
+# Last computed /history body, keyed by the saved-files signature
+_history_cache: dict = {}
+
+
+@api.route("/search", methods=["GET"])
+def search():
+    """Ranked full-text search over saved outputs and uploads."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    try:
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("page_size", 10))
+    except ValueError:
+        return jsonify({"error": "page and page_size must be integers"}), 400
+    try:
+        with metrics.timed("search.latency_ms"):
+            return jsonify(search_index.search(query, page, page_size))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
 # -------- Admin Tools --------
-@app.route("/admin/template", methods=["POST"])
+@api.route("/admin/template", methods=["POST"])
 def admin_template():
     data = request.json or {}
     template = (data.get("template", "") or "").lower()
     variables = data.get("variables", {}) or {}
     if template not in ("reminder_email", "course_summary", "grading_rubric"):
         return jsonify({"error": "template must be one of: reminder_email, course_summary, grading_rubric"}), 400
+    if data.get("roster") is not None:
+        return _admin_template_batch(template, variables, data)
     try:
         prompt = admin_prompt(template, variables)
-        output = _ollama_generate(prompt, temperature=0.4)
+        output = _ollama_generate(prompt, "admin")
         return jsonify({"output": output})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _admin_template_batch(template: str, variables: dict, data: dict):
+    """Render one template for every roster entry: generate once, fill locally."""
+    roster = data.get("roster")
+    personalize = data.get("personalize", []) or []
+    if not isinstance(roster, list) or not roster or not all(isinstance(r, dict) for r in roster):
+        return jsonify({"error": "roster must be a non-empty list of objects"}), 400
+    if len(roster) > MAX_ROSTER:
+        return jsonify({"error": f"roster is limited to {MAX_ROSTER} entries"}), 400
+    if not isinstance(personalize, list):
+        return jsonify({"error": "personalize must be a list of field names"}), 400
+    fields = roster_fields(roster)
+    personalize = [f for f in personalize if f in fields]
+    stream = bool(data.get("stream", False))
+
+    try:
+        # Per-recipient fields become placeholders in the one generated template
+        prompt = admin_prompt(template, {**variables, **{f: "{{" + f + "}}" for f in fields}}, placeholders=fields)
+        key = prompt_key(generation_profiles.resolved_model("admin"), prompt)
+        shared = generation_cache.get("admin_template", key)
+        if not shared:
+            shared = _ollama_generate(prompt, "admin")
+            if shared:
+                generation_cache.put("admin_template", key, shared)
+        missing_placeholders = [f for f in fields if f not in placeholders_in(shared)]
+        metrics.incr("admin.batch.renders", len(roster))
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Shared variables also fill any placeholder the model chose to keep for them
+    recipients = [{**variables, **entry} for entry in roster]
+    rendered = render_roster(shared, recipients, personalize, personalization_prompt, _threaded_generator("admin_personalize"))
+
+    def save(results: list) -> str:
+        """Write every rendered document to one Markdown file; return its name."""
+        label_field = next((f for f in ("name", "student", "email") if f in fields), None)
+        parts = []
+        for r in results:
+            label = roster[r["index"] - 1].get(label_field) if label_field else None
+            heading = f"## {r['index']}. {label}" if label else f"## {r['index']}"
+            parts.append(f"{heading}\n\n{r['output']}")
+        return os.path.basename(_write_text_file("\n\n---\n\n".join(parts), f"{template}_batch"))
+
+    summary = {
+        "template": shared,
+        "count": len(roster),
+        "personalized": personalize,
+        "missing_placeholders": missing_placeholders,
+    }
+    if stream:
+        def ndjson():
+            results = []
+            yield json.dumps({"type": "template", **summary}) + "\n"
+            try:
+                for result in rendered:
+                    results.append(result)
+                    yield json.dumps({"type": "recipient", **result}) + "\n"
+            except GenerationCancelled as e:
+                yield json.dumps({"type": "error", "error": str(e), "reason": e.reason}) + "\n"
+                return
+            except Exception as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+                return
+            yield json.dumps({"type": "done", "file": save(results), **summary}) + "\n"
+
+        return Response(ndjson(), mimetype="application/x-ndjson")
+
+    try:
+        results = list(rendered)
+        return jsonify({**summary, "file": save(results), "outputs": results})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # -------- Ideas & Projects --------
-@app.route("/ideas", methods=["POST"])
+@api.route("/ideas", methods=["POST"])
 def ideas():
     data = request.json or {}
     topic = data.get("topic", "").strip()
@@ -368,29 +1063,57 @@ def ideas():
         return jsonify({"error": "No topic provided"}), 400
     try:
         prompt = ideas_prompt(topic, level, variations)  # type: ignore[arg-type]
-        output = _ollama_generate(prompt, temperature=0.6)
+        output = _ollama_generate(prompt, "ideas")
         return jsonify({"ideas": output})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # -------- Help / Mentor Chatbot --------
-@app.route("/help", methods=["POST"])
+# Cosine similarity of hashed n-gram vectors. Against the seeded FAQ (questions
+# plus paraphrases), a different action on the same object ("How do I delete my
+# saved files?") reaches ~0.71, so lower thresholds answer the wrong question;
+# looser rewordings (~0.78, "How do I make flash cards?") go to the model instead.
+HELP_CACHE_THRESHOLD = 0.8
+
+def _help_cache():
+    from help_cache import SemanticCache
+
+    cache = SemanticCache(threshold=HELP_CACHE_THRESHOLD, store_path=os.path.join(DATA_DIR, "help_cache.jsonl"))
+    print(f"Help cache: {cache.seed_faq(os.path.join(os.path.dirname(__file__), 'help_faq.json'))} FAQ entries seeded")
+    return cache
+
+
+help_cache = Lazy(_help_cache)
+
+@api.route("/help", methods=["POST"])
 def help_chat():
     data = request.json or {}
     question = data.get("question", "").strip()
     if not question:
         return jsonify({"error": "No question provided"}), 400
     try:
+        match = help_cache.lookup(question)
+        if match:
+            answer, score, matched = match
+            metrics.incr("help_cache.hit")
+            return jsonify({"answer": answer, "cached": True, "similarity": round(score, 4), "matched_question": matched})
+        metrics.incr("help_cache.miss")
         prompt = help_prompt(question)
-        answer = _ollama_generate(prompt, temperature=0.5)
-        return jsonify({"answer": answer})
+        answer = _ollama_generate(prompt, "help")
+        if answer.strip():
+            help_cache.add(question, answer)
+        return jsonify({"answer": answer, "cached": False})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # -------- Conversational Chat --------
-@app.route("/chat", methods=["POST"])
+@api.route("/chat", methods=["POST"])
 def chat():
     """Conversational chat endpoint with context awareness."""
     data = request.json or {}
@@ -398,23 +1121,33 @@ def chat():
     user_id = data.get("user_id", "default_user")
     history = data.get("history", [])
     
-    if not message:
+    document, error = _requested_document(data)
+    if error is not None:
+        return error
+    if not message and document is None:
         return jsonify({"error": "No message provided"}), 400
     
     try:
         # Process interaction for memory
-        try:
-            memory_manager.process_interaction(user_id, message)
-        except Exception as e:
-            print(f"Memory processing error: {e}")
+        if message:
+            try:
+                memory_manager.process_interaction(user_id, message)
+            except Exception as e:
+                print(f"Memory processing error: {e}")
         
-        # Build chat prompt with history
-        prompt = chat_prompt(message, history)
+        # Build chat prompt with history (and the referenced file, if any).
+        # The full file goes in only on the turn that uploaded it; follow-ups get excerpts.
+        document_in_history = document is not None and any(
+            isinstance(entry, dict) and entry.get("document_id") == document["id"] for entry in history
+        )
+        prompt = chat_prompt(message, history, document, document_in_history)
         
         # Generate response
-        response = _ollama_generate(prompt, temperature=0.7, timeout=120)
+        response = _ollama_generate(prompt, "chat", timeout=120)
         
         return jsonify({"response": response})
+    except GenerationCancelled as e:
+        return _cancelled_response(e)
     except requests.exceptions.Timeout:
         return jsonify({"error": "Request timed out. Please try again."}), 504
     except requests.exceptions.RequestException as e:
@@ -428,6 +1161,10 @@ def _extract_text_from_pdf(file_path: str) -> str:
     """Extract text from PDF using multiple methods with detailed error logging."""
     extracted_text = ""
     
+    # Parsers are imported on first use; they are slow to import
+    pdfplumber = optional_module("pdfplumber")
+    PyPDF2 = optional_module("PyPDF2")
+    
     # Try pdfplumber first (usually better for complex PDFs)
     if pdfplumber is not None:
         try:
@@ -485,7 +1222,10 @@ def _extract_text_from_pdf(file_path: str) -> str:
     return extracted_text
 
 
-@app.route("/upload", methods=["POST"])
+UPLOAD_PREVIEW_CHARS = 500
+
+
+@api.route("/upload", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
         return jsonify({"error": "No file provided"}), 400
@@ -531,14 +1271,49 @@ def upload_file():
     
     print(f"{'='*60}\n")
     
-    return jsonify({
-        "filename": safe_name, 
-        "extracted_text": text,
+    document_id = None
+    if extraction_status == "success" and text.strip():
+        try:
+            document_id = document_store.put(safe_name, text)
+        except Exception as e:
+            print(f"Could not store extracted text: {e}")
+        try:
+            question_bank.schedule_document(safe_name, text)
+        except Exception as e:
+            print(f"Could not schedule question bank build: {e}")
+        try:
+            search_index.index_file(safe_name, text, kind="upload")
+        except Exception as e:
+            print(f"Could not index upload: {e}")
+    
+    body = {
+        "filename": safe_name,
+        "document_id": document_id,
         "extraction_status": extraction_status,
         "char_count": len(text)
-    })
+    }
+    # Clients that chat via document_id don't need the text back (include_text=0)
+    if request.values.get("include_text", "1").lower() in ("0", "false", "no"):
+        body["preview"] = text[:UPLOAD_PREVIEW_CHARS]
+    else:
+        body["extracted_text"] = text
+    return jsonify(body)
+
+@api.route("/bank/status", methods=["GET"])
+def bank_status():
+    """Report question bank build status for an uploaded document."""
+    name = request.args.get("document", "").strip()
+    if not name:
+        return jsonify({"error": "No document provided"}), 400
+    try:
+        status = question_bank.status(name)
+        if status is None:
+            return jsonify({"error": "Document not found in question bank"}), 404
+        return jsonify({"document": name, **status})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-@app.route("/tone/<user_id>", methods=["GET"])
+@api.route("/tone/<user_id>", methods=["GET"])
 def get_tone(user_id):
     """Get current tone for a user."""
     try:
@@ -551,7 +1326,7 @@ def get_tone(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/tone/<user_id>", methods=["POST"])
+@api.route("/tone/<user_id>", methods=["POST"])
 def set_tone(user_id):
     """Set tone preference for a user."""
     data = request.json or {}
@@ -563,16 +1338,10 @@ def set_tone(user_id):
         return jsonify({"error": f"Invalid tone. Must be one of: {', '.join(available_tones)}"}), 400
     
     try:
-        # Load existing memory
-        memory = memory_manager.load_memory(user_id)
-        if not memory:
-            memory = memory_manager._empty_structure()
-        
-        # Update tone
-        memory["preferred_tone"] = tone
-        
-        # Save memory
-        memory_manager.save_memory(user_id, memory)
+        # Update tone in the stored memory (created if missing)
+        memory_manager.modify_memory(
+            user_id, lambda memory: {**(memory or memory_manager._empty_structure()), "preferred_tone": tone}
+        )
         
         return jsonify({
             "message": "Tone updated successfully",
@@ -582,7 +1351,7 @@ def set_tone(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/memory/<user_id>", methods=["GET"])
+@api.route("/memory/<user_id>", methods=["GET"])
 def get_memory(user_id):
     """Retrieve memory for a specific user."""
     try:
@@ -595,7 +1364,7 @@ def get_memory(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/memory/<user_id>", methods=["DELETE"])
+@api.route("/memory/<user_id>", methods=["DELETE"])
 def clear_memory(user_id):
     """Clear memory for a specific user."""
     try:
@@ -604,14 +1373,23 @@ def clear_memory(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/memory/<user_id>", methods=["PUT"])
+@api.route("/memory/<user_id>/flush", methods=["POST"])
+def flush_memory(user_id):
+    """Extract buffered messages for a user now (call at session end)."""
+    try:
+        memory_manager.flush_pending(user_id)
+        return jsonify({"user_id": user_id, "memory": memory_manager.load_memory(user_id)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/memory/<user_id>", methods=["PUT"])
 def update_memory_manual(user_id):
     """Manually update memory for a user."""
     data = request.json or {}
     try:
-        existing_memory = memory_manager.load_memory(user_id)
-        updated_memory = memory_manager.update_memory(existing_memory, data)
-        memory_manager.save_memory(user_id, updated_memory)
+        updated_memory = memory_manager.modify_memory(
+            user_id, lambda existing_memory: memory_manager.update_memory(existing_memory, data)
+        )
         return jsonify({
             "message": "Memory updated successfully",
             "memory": updated_memory
@@ -619,14 +1397,28 @@ def update_memory_manual(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/health", methods=["GET"])
+@api.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "healthy", "model": MODEL_NAME})
+    return jsonify({"status": "healthy", "model": MODEL_NAME, "backend": llm_backends.DEFAULT_BACKEND})
+
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Return in-process counters (cancellations, model latency, ...)."""
+    stats = {
+        **metrics.snapshot(),
+        "memory_prefilter": memory_manager.prefilter_stats(),
+        "generation_profiles": generation_profiles.all_profiles(),
+        "models": model_report(),
+    }
+    if PREFETCH_FOLLOWUPS:
+        stats["prefetch"] = prefetcher.stats()
+    return jsonify(stats)
 
 
 # Add new route for retrieving saved files
-@app.route("/file", methods=["GET"])
+@api.route("/file", methods=["GET"])
 def get_file():
     """Retrieve content of a saved file from the data directory."""
     filename = request.args.get("name", "").strip()
@@ -642,15 +1434,88 @@ def get_file():
     if not os.path.exists(file_path) or not os.path.isfile(file_path):
         return jsonify({"error": "File not found"}), 404
 
+    # Raw mode streams from disk and supports Range requests for chunked reads
+    if request.args.get("raw", "").lower() in ("1", "true", "yes"):
+        mimetype = "text/markdown" if safe_name.endswith(".md") else "text/plain"
+        resp = send_file(file_path, mimetype=f"{mimetype}; charset=utf-8", conditional=True, etag=True)
+        resp.cache_control.no_cache = True
+        return resp
+
     try:
+        etag, last_modified = _file_validators(file_path)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
         with open(file_path, "r", encoding="utf-8") as f:
             content = f.read()
-        return jsonify({
+        return _with_validators(jsonify({
             "name": safe_name,
             "content": content
-        })
+        }), etag, last_modified)
     except Exception as e:
         return jsonify({"error": f"Failed to read file: {str(e)}"}), 500
 
+def create_app(start_background: bool = True) -> Flask:
+    """Build the Flask app; with `start_background`, also warm up and start this process's background workers."""
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    limit_concurrency(os.path.join(DATA_DIR, "model_slots"), MODEL_CONCURRENCY)
+    sample_outputs(os.path.join(DATA_DIR, "model_samples.jsonl"), MODEL_SAMPLE_RATE)
+    if start_background:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    return app
+
+
+def __getattr__(name: str):
+    """Module-level `app` for `flask run` and `from app import app`, built on first access rather than at import."""
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _warm_up() -> None:
+    """Build deferred services off the request path once the app is serving."""
+    try:
+        # Pick up jobs queued or interrupted before a restart
+        job_queue.start()
+        # Replay memory batches journaled by workers that are gone
+        memory_manager.lazy_instance()
+        question_bank.lazy_instance()
+        document_store.purge(DOCUMENT_RETENTION_DAYS * 86400)
+        # Expired prefetches and least recently used sections beyond the cap
+        generation_cache.purge()
+        # Catch up on files written while the server was down (e.g. by batch_cli)
+        indexed, removed = search_index.sync()
+        if indexed or removed:
+            print(f"Search index: {indexed} file(s) indexed, {removed} removed")
+        for service in (answer_index, grading_analytics, help_cache):
+            service.lazy_instance()
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+
+
+def shutdown() -> None:
+    """Stop background workers and flush buffered memory batches (worker exit)."""
+    if job_queue.lazy_loaded:
+        job_queue.stop()
+    if prefetcher.lazy_loaded:
+        prefetcher.stop()
+    if question_bank.lazy_loaded:
+        question_bank.close()
+    if memory_manager.lazy_loaded:
+        memory_manager.close()
+
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    debug = True
+    # With the reloader this process only watches files; the child it spawns
+    # (WERKZEUG_RUN_MAIN set) serves requests and runs the background workers.
+    serving = not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    if serving:
+        # Turn SIGTERM into a normal exit so buffered memory batches are flushed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        atexit.register(shutdown)
+    create_app(start_background=serving).run(debug=debug, port=5000)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Offline batch processing of a directory of course material.
+
+    python batch_cli.py ~/courses/cs101 --tasks summarize,quiz,flashcards
+
+Documents (PDF, TXT, MD) are extracted on a process pool, then every selected
+task runs through the same prompts as /generate with bounded concurrency.
+Outputs are written to the data directory as <document>_<task>.md, so they
+show up in History and /search. A checkpoint manifest records finished work per document
+content hash; rerunning after an interruption skips everything already done.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from utils_io import atomic_write, sanitize_filename
+
+TASKS = ("summarize", "quiz", "flashcards", "explain")
+EXTENSIONS = (".pdf", ".txt", ".md")
+MIN_TEXT_CHARS = 50
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _extract(path: str) -> Tuple[str, str, Optional[str]]:
+    """Extract one document in a pool process; returns (path, text, error)."""
+    try:
+        if path.lower().endswith(".pdf"):
+            from app import _extract_text_from_pdf
+
+            text = _extract_text_from_pdf(path)
+        else:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+    except Exception as e:
+        return path, "", str(e)
+    if len(text.strip()) < MIN_TEXT_CHARS:
+        return path, "", f"extracted only {len(text.strip())} characters"
+    return path, text, None
+
+
+class Manifest:
+    """Checkpoint of finished (document, task) outputs, saved after every change."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data: Dict = {"documents": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def done(self, name: str, digest: str, task: str) -> bool:
+        doc = self.data["documents"].get(name)
+        if not doc or doc.get("hash") != digest:
+            return False
+        output = doc.get("tasks", {}).get(task)
+        return bool(output) and os.path.exists(output["file"])
+
+    def record(self, name: str, digest: str, task: Optional[str] = None, **fields) -> None:
+        with self._lock:
+            doc = self.data["documents"].get(name)
+            if not doc or doc.get("hash") != digest:
+                # New or changed document: earlier outputs no longer apply
+                doc = self.data["documents"][name] = {"hash": digest, "tasks": {}}
+            if task is None:
+                doc.update(fields)
+            else:
+                doc.pop("extraction_error", None)
+                doc["tasks"][task] = fields
+            atomic_write(json.dumps(self.data, indent=2), self.path)
+
+
+def run(args: argparse.Namespace) -> int:
+    # Imported here so --help stays instant
+    import app
+    from llm_client import generate_text, limit_concurrency
+
+    source = os.path.abspath(args.directory)
+    if not os.path.isdir(source):
+        print(f"Not a directory: {source}", file=sys.stderr)
+        return 2
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = [t for t in tasks if t not in TASKS]
+    if unknown:
+        print(f"Unknown task(s): {', '.join(unknown)}; choose from {', '.join(TASKS)}", file=sys.stderr)
+        return 2
+
+    # Share the server's machine-wide model slots so a batch run cannot starve it
+    limit_concurrency(os.path.join(app.DATA_DIR, "model_slots"), app.MODEL_CONCURRENCY)
+    manifest = Manifest(args.manifest or os.path.join(app.DATA_DIR, f"batch_{sanitize_filename(os.path.basename(source))}.manifest.json"))
+
+    documents = sorted(
+        os.path.join(root, fname)
+        for root, _, files in os.walk(source)
+        for fname in files
+        if fname.lower().endswith(EXTENSIONS)
+    )
+    pending: Dict[str, Tuple[str, str, List[str]]] = {}
+    for path in documents:
+        name = os.path.relpath(path, source)
+        digest = _file_hash(path)
+        todo = [t for t in tasks if args.force or not manifest.done(name, digest, t)]
+        if todo:
+            pending[path] = (name, digest, todo)
+    total = sum(len(todo) for _, _, todo in pending.values())
+    print(f"{len(documents)} documents, {total} task(s) to run, {len(documents) * len(tasks) - total} already done")
+    if not pending:
+        return 0
+
+    def generate(name: str, digest: str, task: str, text: str) -> str:
+        start = time.time()
+        output = generate_text(app.build_prompt(task, text, args.user_id), profile="generate", timeout=app.JOB_TIMEOUT)
+        if not output:
+            raise ValueError("empty model output")
+        stem = sanitize_filename(os.path.splitext(name.replace(os.sep, "_"))[0])
+        out_path = os.path.join(app.DATA_DIR, f"{stem}_{task}.md")
+        atomic_write(output, out_path)
+        app.search_index.index_file(os.path.basename(out_path), output)
+        manifest.record(name, digest, task, file=out_path, seconds=round(time.time() - start, 1), finished_at=time.time())
+        return out_path
+
+    failures = 0
+    extract_pool = ProcessPoolExecutor(max_workers=args.extract_workers)
+    generate_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        extractions = [extract_pool.submit(_extract, path) for path in pending]
+        generations = {}
+        for future in as_completed(extractions):
+            path, text, error = future.result()
+            name, digest, todo = pending[path]
+            if error:
+                failures += len(todo)
+                manifest.record(name, digest, extraction_error=error)
+                print(f"✗ {name}: {error}")
+                continue
+            print(f"✓ extracted {name} ({len(text)} chars)")
+            for task in todo:
+                generations[generate_pool.submit(generate, name, digest, task, text)] = (name, task)
+        for future in as_completed(generations):
+            name, task = generations[future]
+            try:
+                print(f"✓ {name} [{task}] -> {os.path.basename(future.result())}")
+            except Exception as e:
+                failures += 1
+                print(f"✗ {name} [{task}]: {e}")
+    except KeyboardInterrupt:
+        print("Interrupted; finished outputs are checkpointed, rerun to resume", file=sys.stderr)
+        generate_pool.shutdown(wait=False, cancel_futures=True)
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    generate_pool.shutdown()
+    extract_pool.shutdown()
+    print(f"Done: {total - failures} succeeded, {failures} failed. Manifest: {manifest.path}")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Batch-process a directory of course material.")
+    parser.add_argument("directory", help="directory scanned recursively for PDF, TXT and MD files")
+    parser.add_argument("--tasks", default="summarize,quiz,flashcards", help=f"comma-separated, from: {', '.join(TASKS)}")
+    parser.add_argument("--user-id", default=None, help="apply this educator's memory and tone")
+    parser.add_argument("--concurrency", type=int, default=2, help="concurrent model calls (default 2)")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 2, help="extraction processes")
+    parser.add_argument("--manifest", default=None, help="checkpoint file (default: data/batch_<dir>.manifest.json)")
+    parser.add_argument("--force", action="store_true", help="redo tasks even if the manifest says they are done")
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Roster-scale rendering of admin templates.
+
+A template with {{field}} placeholders is generated once; each roster entry
+is then filled in locally. Only fields listed for personalization cost a
+(short) model call per recipient, and identical requests are generated once.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from llm_client import GenerationCancelled
+
+MAX_WORKERS = 4
+MAX_ROSTER = 1000
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+
+def roster_fields(roster: List[Dict]) -> List[str]:
+    """Every variable name used by any roster entry, in first-seen order."""
+    fields: Dict[str, None] = {}
+    for entry in roster:
+        for key in entry:
+            fields.setdefault(str(key), None)
+    return list(fields)
+
+
+def placeholders_in(template: str) -> List[str]:
+    """Placeholder names present in a template."""
+    return sorted({m.group(1) for m in _PLACEHOLDER.finditer(template)})
+
+
+def fill_template(template: str, values: Dict) -> Tuple[str, List[str]]:
+    """Substitute {{field}} placeholders; return (text, fields with no value)."""
+    missing: List[str] = []
+
+    def replace(match: re.Match) -> str:
+        value = values.get(match.group(1))
+        if value in (None, ""):
+            missing.append(match.group(1))
+            return ""
+        return str(value)
+
+    text = _PLACEHOLDER.sub(replace, template)
+    # Drop blank lines left behind by empty optional fields
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip(), missing
+
+
+def render_roster(
+    template: str,
+    roster: List[Dict],
+    personalize: List[str],
+    build_prompt: Callable[[str, str, Dict], str],
+    generate: Callable[[str], str],
+) -> Iterator[Dict]:
+    """Yield {"index", "output", "missing", "failed"} for each roster entry, in order.
+
+    Values of `personalize` fields are treated as hints and replaced by
+    generated text before filling; other fields are substituted as given.
+    A personalization call that fails keeps the given value for that entry
+    and lists the field in "failed"; only cancellation stops the roster.
+    """
+    entry_prompts = [
+        {field: build_prompt(field, str(entry[field]), entry) for field in personalize if entry.get(field) not in (None, "")}
+        for entry in roster
+    ]
+    unique = {prompt for prompts in entry_prompts for prompt in prompts.values()}
+
+    futures = {}
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS) if unique else None
+    try:
+        if pool is not None:
+            futures = {prompt: pool.submit(generate, prompt) for prompt in unique}
+        for index, (entry, prompts) in enumerate(zip(roster, entry_prompts), 1):
+            values = dict(entry)
+            failed = []
+            for field, prompt in prompts.items():
+                try:
+                    values[field] = futures[prompt].result() or entry[field]
+                except GenerationCancelled:
+                    raise
+                except Exception:
+                    failed.append(field)
+            output, missing = fill_template(template, values)
+            yield {"index": index, "output": output, "missing": missing, "failed": failed}
+    except GenerationCancelled:
+        for future in futures.values():
+            future.cancel()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
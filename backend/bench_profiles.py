@@ -0,0 +1,124 @@
+"""
+Before/after benchmark of generation profiles against a running Ollama.
+
+    python bench_profiles.py [--runs 3] [--routes grade,help,memory_extract]
+
+For each route a representative prompt is sent twice per run: once the way
+requests were sent before profiles (default model, temperature as an ignored
+top-level field, no options) and once with the route's profile and model.
+Prints median output tokens (Ollama's eval_count) and latency for both, plus
+how often the profile's num_predict cap was hit.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import requests
+
+from generation_profiles import DEFAULT_MODEL, DEFAULT_PROFILES, get_profile
+from llm_backends import OLLAMA_URL, OllamaBackend
+from prompts import (
+    adjust_content_prompt,
+    admin_prompt,
+    chat_prompt,
+    grading_prompt,
+    help_prompt,
+    ideas_prompt,
+    lecture_content_prompt,
+    personalization_prompt,
+    quiz_json_prompt,
+    quiz_prompt,
+    slide_content_prompt,
+)
+
+_LECTURE = (
+    "# Recursion\n\nA recursive function calls itself on a smaller input until it reaches a base case.\n\n"
+    "## Base case\n\nWithout a base case the recursion never ends and the stack overflows.\n"
+)
+
+SAMPLES = {
+    "generate": lambda: "Summarize this text:\n\n" + _LECTURE * 4,
+    "content_create": lambda: lecture_content_prompt("binary search", "beginner"),
+    "slides": lambda: slide_content_prompt(_LECTURE),
+    "adjust": lambda: adjust_content_prompt("A recursive function calls itself on a smaller input.", "expand"),
+    "grade": lambda: grading_prompt("What is a base case?", "The case where recursion stops.", False),
+    "quiz": lambda: quiz_prompt("recursion", "beginner", 5, "mcq"),
+    "quiz_json": lambda: quiz_json_prompt("recursion", "beginner", 5, "mcq"),
+    "admin": lambda: admin_prompt("Dear {name}, your grade in {course} is {grade}.", {"course": "CS101"}),
+    "admin_personalize": lambda: personalization_prompt("note", "encourage them", {"name": "Sam", "grade": "B"}),
+    "ideas": lambda: ideas_prompt("sorting algorithms", "beginner", True),
+    "help": lambda: help_prompt("How do I upload a PDF?"),
+    "chat": lambda: chat_prompt("Can you suggest a warm-up activity for recursion?"),
+    "memory_extract": lambda: (
+        "Extract teaching_subjects, grade_levels and preferred_tone as JSON from: "
+        "\"I teach 10th grade chemistry and prefer a casual tone.\"\nRespond with ONLY valid JSON:"
+    ),
+}
+
+
+def _call(body: dict) -> dict:
+    start = time.perf_counter()
+    resp = requests.post(OLLAMA_URL, json=body, timeout=600)
+    resp.raise_for_status()
+    usage = OllamaBackend.usage(resp.json())
+    return {
+        "tokens": usage["output_tokens"] or 0,
+        "ms": (time.perf_counter() - start) * 1000.0,
+        "truncated": usage["truncated"],
+    }
+
+
+def bench_route(route: str, runs: int) -> dict:
+    prompt = SAMPLES[route]()
+    settings = get_profile(route)
+    # What every route sent before profiles existed
+    before_body = {"model": DEFAULT_MODEL, "prompt": prompt, "stream": False, "temperature": settings["temperature"]}
+    _, after_body, _ = OllamaBackend().request(settings["model"] or DEFAULT_MODEL, prompt, settings, stream=False)
+    before = [_call(before_body) for _ in range(runs)]
+    after = [_call(after_body) for _ in range(runs)]
+    return {
+        "route": route,
+        "model": after_body["model"],
+        "before_tokens": statistics.median(r["tokens"] for r in before),
+        "after_tokens": statistics.median(r["tokens"] for r in after),
+        "before_ms": round(statistics.median(r["ms"] for r in before)),
+        "after_ms": round(statistics.median(r["ms"] for r in after)),
+        "after_truncated": sum(r["truncated"] for r in after),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--routes", default=",".join(SAMPLES), help="comma-separated profile names")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in SAMPLES or r not in DEFAULT_PROFILES]
+    if unknown:
+        print(f"No sample prompt for: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        results = [bench_route(route, args.runs) for route in routes]
+    except requests.exceptions.RequestException as e:
+        print(f"Ollama request failed ({OLLAMA_URL}): {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'route':<18}{'model':<16}{'tokens before':>14}{'after':>8}{'ms before':>11}{'after':>8}{'capped':>8}")
+    for r in results:
+        print(
+            f"{r['route']:<18}{r['model']:<16}{r['before_tokens']:>14}{r['after_tokens']:>8}"
+            f"{r['before_ms']:>11}{r['after_ms']:>8}{r['after_truncated']:>5}/{args.runs}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark: time for a fresh process to import the app, build it and
+answer its first request.
+
+    python bench_startup.py [--runs 5] [--budget-ms 150]
+
+Each run is a new interpreter, so nothing is warm except the OS file cache.
+The budget applies to the app's own share of the cold start: its total minus
+the floor of a bare Flask app that imports requests, measured the same way on
+the same machine. Exits with status 1 when the median exceeds the budget;
+tests/test_startup.py enforces the same budget under pytest, against a
+throwaway data directory.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+# Milliseconds the app may add to the bare Flask floor. Eager imports (NumPy, the
+# PDF parsers) and service construction added 300-370 ms before startup was made lazy.
+BUDGET_MS = 150.0
+# Marks the child's result line; warm-up threads may print around it
+RESULT_PREFIX = "BENCH_STARTUP "
+
+# Runs inside the child interpreter; prints timings as JSON after RESULT_PREFIX.
+_CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app()
+t2 = time.perf_counter()
+resp = flask_app.test_client().get("/health")
+t3 = time.perf_counter()
+assert resp.status_code == 200, resp.status_code
+heavy = [m for m in ("numpy", "pdfplumber", "PyPDF2", "brotli") if m in __import__("sys").modules]
+print("BENCH_STARTUP " + json.dumps({"import_ms": (t1 - t0) * 1000, "create_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "total_ms": (t3 - t0) * 1000, "heavy_modules": heavy}),
+      flush=True)
+app.shutdown()
+"""
+
+# The same steps for a bare Flask app: the part of a cold start the app cannot avoid.
+_FLOOR_CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import flask, requests
+floor_app = flask.Flask("floor")
+floor_app.route("/health")(lambda: {"status": "ok"})
+resp = floor_app.test_client().get("/health")
+assert resp.status_code == 200, resp.status_code
+print("BENCH_STARTUP " + json.dumps({"total_ms": (time.perf_counter() - t0) * 1000}), flush=True)
+"""
+
+
+def run_once(data_dir: Optional[str] = None, child: str = _CHILD) -> dict:
+    """One cold start; with `data_dir`, the app's state (DATA_DIR and the working directory) lives there."""
+    backend = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    if data_dir is not None:
+        env["DATA_DIR"] = data_dir
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [backend, env.get("PYTHONPATH")]))
+    out = subprocess.run(
+        [sys.executable, "-c", child], cwd=data_dir or backend, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in out.splitlines() if line.startswith(RESULT_PREFIX))
+    return json.loads(line[len(RESULT_PREFIX) :])
+
+
+def measure(runs: int, data_dir: Optional[str] = None) -> dict:
+    """Median timings over `runs` fresh interpreters, the bare Flask floor and the app's overhead above it."""
+    results, floors = [], []
+    for _ in range(runs):
+        # Interleaved so both see the same machine load
+        results.append(run_once(data_dir))
+        floors.append(run_once(data_dir, _FLOOR_CHILD)["total_ms"])
+    summary = {key: round(statistics.median(r[key] for r in results), 1) for key in results[0] if key.endswith("_ms")}
+    summary["floor_ms"] = round(statistics.median(floors), 1)
+    summary["overhead_ms"] = round(statistics.median(r["total_ms"] - f for r, f in zip(results, floors)), 1)
+    summary["heavy_modules"] = results[-1]["heavy_modules"]
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+
+    summary = measure(args.runs)
+    print(json.dumps(summary, indent=2))
+    if summary["overhead_ms"] > args.budget_ms:
+        print(f"Cold start overhead {summary['overhead_ms']} ms exceeds budget {args.budget_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Local static pre-check of code answers before /grade calls the model.
+
+Python submissions are dedented, parsed with `ast` and walked once for
+lint-style findings (undefined names, unused imports, bare except, ...) and
+complexity metrics. A submission that contains no implementation, or that
+clearly is Python (it has def/class/import lines) and does not parse, is
+graded here without a model call; for the rest, the findings (including a
+syntax error in code that may be pseudocode) go into the grading prompt so
+the model can concentrate on logic.
+
+Answers that do not look like Python are left to the model unchanged.
+"""
+
+import ast
+import builtins
+import re
+import textwrap
+from typing import Dict, List, Optional, Set
+
+# Grade given without a model call when the code cannot run at all
+BROKEN_CODE_GRADE = 0
+MAX_FINDINGS = 8
+
+_BUILTINS = frozenset(dir(builtins))
+_FENCE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n\s*```\s*$", re.S)
+# Hints that code which does not parse is another language (C, Java, JS, ...) rather than broken Python
+_OTHER_LANGUAGE = re.compile(
+    r"(^\s*#include\b|\bpublic\s+(static\s+)?(class|void|int)\b|\bfunction\s+\w+\s*\(|^\s*(const|let|var)\s+\w+\s*=|"
+    r"System\.out\.|console\.log\(|[;{}]\s*$)",
+    re.M,
+)
+_PYTHON_HINT = re.compile(r"^\s*(def|class|import|from|for|while|if|elif|try|return|print)\b", re.M)
+# Lines only a Python program has; prose that starts with "if" or "for" does not match
+_PYTHON_DEFINITION = re.compile(
+    r"^\s*(def\s+\w+\s*\(.*\)\s*(->.*)?:|class\s+\w+\s*(\(.*\))?\s*:|import\s+[\w.]+(\s+as\s+\w+)?\s*$|"
+    r"from\s+[\w.]+\s+import\s+[\w*(])",
+    re.M,
+)
+# Calls that end the program, so a `while True` loop containing one does exit
+_EXIT_CALLS = frozenset(("exit", "quit", "sys.exit", "os._exit"))
+_SHADOWABLE = frozenset(("list", "dict", "str", "set", "sum", "max", "min", "len", "input", "id", "type", "map", "filter"))
+
+
+def strip_fences(code: str) -> str:
+    """Code without a surrounding markdown ``` fence."""
+    match = _FENCE.match(code)
+    return match.group(1) if match else code
+
+
+def _is_python(tree: ast.Module) -> bool:
+    """Parsed code is a program, not prose that happens to parse (a lone word or number)."""
+    return any(not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, (ast.Name, ast.Constant))) for stmt in tree.body)
+
+
+def _looks_like_python(code: str) -> bool:
+    """Text that does not parse may still be meant as Python (rather than another language)."""
+    return not _OTHER_LANGUAGE.search(code) and bool(_PYTHON_HINT.search(code))
+
+
+def _is_broken_python(code: str) -> bool:
+    """Code that does not parse clearly is a Python program, so the syntax error is its fault."""
+    return _looks_like_python(code) and bool(_PYTHON_DEFINITION.search(code))
+
+
+def _exits(loop: ast.While) -> bool:
+    """The loop body can leave the loop: break, return, raise or a sys.exit()-style call."""
+    for node in ast.walk(loop):
+        if isinstance(node, (ast.Break, ast.Return, ast.Raise)):
+            return True
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+                name = f"{func.value.id}.{func.attr}"
+            else:
+                name = getattr(func, "id", "")
+            if name in _EXIT_CALLS:
+                return True
+    return False
+
+
+def _bound_names(tree: ast.AST) -> Set[str]:
+    """Every name the code binds anywhere (scope-insensitive, so undefined-name checks err on silence)."""
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+    return names
+
+
+def _complexity(func: ast.AST) -> int:
+    """Cyclomatic complexity of one function: 1 + decision points."""
+    score = 1
+    for node in ast.walk(func):
+        if isinstance(node, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert)):
+            score += 1
+        elif isinstance(node, ast.BoolOp):
+            score += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            score += 1 + len(node.ifs)
+    return score
+
+
+def _max_depth(node: ast.AST, depth: int = 0) -> int:
+    """Deepest nesting of control-flow blocks."""
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        nested = isinstance(child, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try))
+        deepest = max(deepest, _max_depth(child, depth + 1 if nested else depth))
+    return deepest
+
+
+def _is_stub(body: List[ast.stmt]) -> bool:
+    """True when statements are only docstrings, `pass`, `...`, NotImplementedError and stub definitions."""
+    for stmt in body:
+        if isinstance(stmt, ast.Pass) or (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)):
+            continue
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and _is_stub(stmt.body):
+            continue
+        if isinstance(stmt, ast.Raise) and "NotImplementedError" in ast.dump(stmt):
+            continue
+        return False
+    return True
+
+
+def _findings(tree: ast.Module) -> List[str]:
+    findings: List[str] = []
+    bound = _bound_names(tree)
+    loaded: Set[str] = set()
+    undefined: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            loaded.add(node.id)
+            if node.id not in bound and node.id not in _BUILTINS and node.id not in undefined:
+                undefined.append(node.id)
+    findings.extend(f"Undefined name '{name}'" for name in undefined)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            continue
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = alias.asname or alias.name.split(".")[0]
+                if name != "*" and name not in loaded:
+                    findings.append(f"Unused import '{name}' (line {node.lineno})")
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            findings.append(f"Bare except hides all errors (line {node.lineno})")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+                if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                    findings.append(f"Mutable default argument in '{node.name}' (line {node.lineno})")
+        elif isinstance(node, ast.Compare):
+            for op, right in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(right, ast.Constant) and right.value is None:
+                    findings.append(f"Comparison to None with == instead of 'is' (line {node.lineno})")
+                elif (
+                    isinstance(op, (ast.Is, ast.IsNot))
+                    and isinstance(right, ast.Constant)
+                    and isinstance(right.value, (int, float, str, bytes))
+                    and not isinstance(right.value, bool)
+                ):
+                    findings.append(f"'is' used to compare with a literal (line {node.lineno})")
+        elif isinstance(node, ast.While):
+            if isinstance(node.test, ast.Constant) and node.test.value and not _exits(node):
+                findings.append(f"Infinite loop: 'while True' never exits (line {node.lineno})")
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store) and node.id in _SHADOWABLE:
+            findings.append(f"Assignment shadows built-in '{node.id}' (line {node.lineno})")
+
+        body = getattr(node, "body", None)
+        if isinstance(body, list):
+            for stmt, following in zip(body, body[1:]):
+                if isinstance(stmt, (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+                    findings.append(f"Unreachable code after {type(stmt).__name__.lower()} (line {following.lineno})")
+                    break
+    return list(dict.fromkeys(findings))[:MAX_FINDINGS]
+
+
+def analyze(code: str) -> Optional[Dict]:
+    """Static report for a code answer, or None when it is not recognizably Python.
+
+    Returns {"language", "syntax_error", "empty", "findings", "metrics"};
+    "syntax_error" is "line N: message" or None.
+    """
+    # Code pasted with a uniform indent is still valid Python
+    code = textwrap.dedent(strip_fences(code))
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError) as e:
+        if not _looks_like_python(code):
+            return None
+        line = getattr(e, "lineno", None)
+        message = getattr(e, "msg", None) or str(e)
+        error = f"line {line}: {message}" if line else message
+        broken = _is_broken_python(code)
+        return {
+            "language": "python",
+            # Only a clear Python program is graded locally; pseudocode or prose goes to the model
+            "syntax_error": error if broken else None,
+            "empty": False,
+            "findings": [] if broken else [f"Does not parse as Python ({error}); it may be pseudocode or prose"],
+            "metrics": {},
+        }
+    if not _is_python(tree):
+        return None
+    functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    lines = [line for line in code.splitlines() if line.strip() and not line.strip().startswith("#")]
+    return {
+        "language": "python",
+        "syntax_error": None,
+        "empty": _is_stub(tree.body),
+        "findings": _findings(tree),
+        "metrics": {
+            "lines": len(lines),
+            "functions": len(functions),
+            "max_complexity": max((_complexity(f) for f in functions), default=_complexity(tree)),
+            "max_nesting": _max_depth(tree),
+        },
+    }
+
+
+def local_grade(report: Dict) -> Optional[Dict]:
+    """Grade result for code that cannot be graded meaningfully by the model, else None."""
+    if report["syntax_error"]:
+        issue = f"Syntax error at {report['syntax_error']}"
+        feedback = (
+            f"The code does not parse ({report['syntax_error']}), so it cannot run. "
+            "Fix the syntax error and resubmit."
+        )
+    elif report["empty"]:
+        issue = "No implementation"
+        feedback = "The submission contains no implementation, only stubs or placeholders."
+    else:
+        return None
+    return {"grade": BROKEN_CODE_GRADE, "feedback": feedback, "detected_issues": [issue], "strengths": []}
@@ -0,0 +1,80 @@
+"""
+Server-side store of extracted upload text, addressed by document id.
+
+/upload saves the extracted text here and hands the client a short id; /chat
+and /generate accept that id instead of the text, so large documents cross
+the wire once. Ids are derived from the content, so re-uploading the same
+file returns the same id from any worker.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from question_bank import content_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+"""
+
+ID_CHARS = 16
+
+
+def document_id(text: str) -> str:
+    """Content-derived id of an extracted document."""
+    return content_hash(text)[:ID_CHARS]
+
+
+class DocumentStore:
+    """SQLite table of extracted document text keyed by content id."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put(self, name: str, text: str) -> str:
+        """Store extracted text (once per content) and return its id."""
+        doc_id = document_id(text)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO documents (id, name, text, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET name = excluded.name, last_used_at = excluded.last_used_at
+                """,
+                (doc_id, name, text, now, now),
+            )
+        return doc_id
+
+    def get(self, doc_id: str) -> Optional[Dict[str, str]]:
+        """Return {"id", "name", "text"} for a document id, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT name, text FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE documents SET last_used_at = ? WHERE id = ?", (time.time(), doc_id))
+        return {"id": doc_id, "name": row[0], "text": row[1]}
+
+    def purge(self, max_idle_seconds: float) -> int:
+        """Delete documents unused for `max_idle_seconds`; returns how many were removed."""
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM documents WHERE last_used_at < ?", (time.time() - max_idle_seconds,))
+            return cur.rowcount
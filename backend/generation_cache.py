@@ -0,0 +1,112 @@
+"""
+Persistent cache of model outputs keyed by a hash of the prompt.
+
+Backed by SQLite under the data directory so cached sections survive
+restarts. Entries can carry a time-to-live for short-lived caches. Every
+PURGE_EVERY writes (and via `purge` at startup) expired entries are deleted
+and the least recently used ones beyond `max_entries` are evicted.
+"""
+
+import hashlib
+import itertools
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    last_used_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+DEFAULT_MAX_ENTRIES = 20000
+PURGE_EVERY = 200
+# Hits refresh an entry's recency at most this often, so reads rarely write
+TOUCH_INTERVAL = 3600
+
+
+def prompt_key(*parts: str) -> str:
+    """Hash the parts that determine an output (model, prompt, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class GenerationCache:
+    """Namespaced key/value store for generated text."""
+
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._writes = itertools.count(1)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            if "last_used_at" not in {row[1] for row in conn.execute("PRAGMA table_info(cache)")}:
+                conn.execute("ALTER TABLE cache ADD COLUMN last_used_at REAL")
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """Return a cached value, or None if missing or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at, COALESCE(last_used_at, created_at) FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < now:
+                return None
+            if row[2] < now - TOUCH_INTERVAL:
+                conn.execute("UPDATE cache SET last_used_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return row[0]
+
+    def put(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Store a value, optionally expiring after `ttl` seconds."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, expires_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, now, now + ttl if ttl else None, now),
+            )
+        if next(self._writes) % PURGE_EVERY == 0:
+            self.purge()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            return cur.rowcount
+
+    def purge(self) -> int:
+        """Delete expired entries, then evict the least recently used beyond `max_entries`; returns rows removed."""
+        removed = self.purge_expired()
+        with self._connect() as conn:
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                cur = conn.execute(
+                    "DELETE FROM cache WHERE rowid IN "
+                    "(SELECT rowid FROM cache ORDER BY COALESCE(last_used_at, created_at) LIMIT ?)",
+                    (excess,),
+                )
+                removed += cur.rowcount
+        return removed
@@ -0,0 +1,134 @@
+"""
+Per-route generation profiles: model routing, sampling temperature and Ollama options.
+
+Each profile sets `temperature` plus any Ollama option (`num_predict` caps
+output tokens, `num_ctx` sets the context window, `stop` lists stop strings)
+and optionally `format: "json"` for Ollama's JSON mode.
+
+Routing: `tier: "small"` sends a profile to SMALL_MODEL_NAME (cheap structured
+work), `model` names a model outright, and `fallback: "small"` switches to the
+small model when no model slot frees up within `fallback_after_ms` (deep
+queue). Until SMALL_MODEL_NAME is set every profile runs on MODEL_NAME.
+`backend` ("ollama" or "openai", see llm_backends) sends a profile to a
+different model server than LLM_BACKEND.
+
+Defaults live here; any of them can be overridden without code changes in
+generation_profiles.json next to this file (or the file named by
+GENERATION_PROFILES), e.g.
+
+    {"grade": {"num_predict": 300}, "chat": {"num_ctx": 16384, "model": "llama3.1:8b"}}
+
+The file is re-read when it changes. Unknown profile names fall back to
+"default".
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+# Deployment default model, and the model for tier "small" profiles
+DEFAULT_MODEL = os.environ.get("MODEL_NAME", "mistral")
+SMALL_MODEL = os.environ.get("SMALL_MODEL_NAME", "") or DEFAULT_MODEL
+
+PROFILES_FILE = os.environ.get(
+    "GENERATION_PROFILES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "generation_profiles.json")
+)
+
+DEFAULT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"temperature": 0.6, "num_predict": 1024, "num_ctx": 4096},
+    # Summaries/quizzes/flashcards over uploaded text: long inputs
+    "generate": {"temperature": 0.7, "num_predict": 1024, "num_ctx": 8192, "fallback": "small"},
+    "content_create": {"temperature": 0.5, "num_predict": 2048, "num_ctx": 4096, "fallback": "small"},
+    "slides": {"temperature": 0.5, "num_predict": 768, "num_ctx": 4096},
+    "adjust": {"temperature": 0.4, "num_predict": 512, "num_ctx": 4096},
+    # Background jobs convert or adjust a whole lecture in one call
+    "slides_full": {"temperature": 0.5, "num_predict": 2048, "num_ctx": 8192},
+    "adjust_full": {"temperature": 0.4, "num_predict": 3072, "num_ctx": 8192},
+    "grade": {"temperature": 0.2, "num_predict": 400, "num_ctx": 4096, "format": "json", "tier": "small"},
+    "quiz": {"temperature": 0.5, "num_predict": 2048, "num_ctx": 4096},
+    "quiz_json": {"temperature": 0.5, "num_predict": 1200, "num_ctx": 4096, "fallback": "small"},
+    "bank": {"temperature": 0.5, "num_predict": 1200, "num_ctx": 8192},
+    "admin": {"temperature": 0.4, "num_predict": 600, "num_ctx": 4096},
+    "admin_personalize": {"temperature": 0.6, "num_predict": 100, "num_ctx": 2048, "stop": ["\n\n"], "tier": "small"},
+    "ideas": {"temperature": 0.6, "num_predict": 1024, "num_ctx": 4096, "fallback": "small"},
+    "help": {"temperature": 0.5, "num_predict": 400, "num_ctx": 4096, "tier": "small"},
+    "chat": {"temperature": 0.7, "num_predict": 1024, "num_ctx": 8192, "fallback": "small"},
+    "memory_extract": {"temperature": 0.2, "num_predict": 400, "num_ctx": 4096, "format": "json", "tier": "small"},
+}
+
+# Queue wait after which a profile with a fallback switches to the small model
+DEFAULT_FALLBACK_AFTER_MS = 2000
+
+_lock = threading.Lock()
+_overrides: Dict[str, Dict[str, Any]] = {}
+_overrides_mtime: Optional[float] = None
+
+
+def _load_overrides() -> Dict[str, Dict[str, Any]]:
+    """Return overrides from PROFILES_FILE, re-reading it when its mtime changes."""
+    global _overrides, _overrides_mtime
+    try:
+        mtime = os.path.getmtime(PROFILES_FILE)
+    except OSError:
+        mtime = None
+    with _lock:
+        if mtime != _overrides_mtime:
+            _overrides_mtime = mtime
+            _overrides = {}
+            if mtime is not None:
+                try:
+                    with open(PROFILES_FILE, "r", encoding="utf-8") as f:
+                        _overrides = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Ignoring invalid generation profiles file {PROFILES_FILE}: {e}")
+        return _overrides
+
+
+def _tier_model(tier: Optional[str]) -> Optional[str]:
+    return SMALL_MODEL if tier == "small" else DEFAULT_MODEL if tier == "large" else None
+
+
+def get_profile(name: str) -> Dict[str, Any]:
+    """Resolve a profile for llm_client.generate_text.
+
+    Returns {"temperature", "options", "format", "model", "fallback_model",
+    "fallback_after_ms", "backend"}; "model" is None when the caller's model
+    applies and "backend" is None for the deployment default.
+    """
+    overrides = _load_overrides()
+    base = name if name in DEFAULT_PROFILES or name in overrides else "default"
+    merged = {**DEFAULT_PROFILES["default"], **overrides.get("default", {})}
+    if base != "default":
+        merged.update(DEFAULT_PROFILES.get(base, {}))
+        merged.update(overrides.get(base, {}))
+    temperature = merged.pop("temperature")
+    fmt = merged.pop("format", None)
+    model = merged.pop("model", None) or _tier_model(merged.pop("tier", None))
+    merged.pop("tier", None)
+    fallback_model = merged.pop("fallback_model", None) or _tier_model(merged.pop("fallback", None))
+    merged.pop("fallback", None)
+    fallback_after_ms = merged.pop("fallback_after_ms", DEFAULT_FALLBACK_AFTER_MS)
+    backend = merged.pop("backend", None)
+    # Whatever remains are Ollama options; None clears a default (e.g. "stop": null)
+    options = {key: value for key, value in merged.items() if value is not None}
+    return {
+        "temperature": temperature,
+        "options": options,
+        "format": fmt,
+        "model": model,
+        "fallback_model": fallback_model,
+        "fallback_after_ms": fallback_after_ms,
+        "backend": backend,
+    }
+
+
+def resolved_model(name: str) -> str:
+    """Model a profile's generations run on (before any load fallback); cache keys use it."""
+    return get_profile(name)["model"] or DEFAULT_MODEL
+
+
+def all_profiles() -> Dict[str, Dict[str, Any]]:
+    """Every resolved profile, for inspection."""
+    names = set(DEFAULT_PROFILES) | set(_load_overrides())
+    return {name: get_profile(name) for name in sorted(names)}
@@ -0,0 +1,250 @@
+"""
+Vectorized analytics over grading_history.jsonl.
+
+The JSONL log is indexed incrementally into append-only binary column files
+(one per field) next to a small meta file holding the byte offset of the
+last indexed line. Each refresh parses only the lines appended since then;
+aggregations run with NumPy over memory-mapped columns.
+
+Layout of the cache directory:
+    meta.json        {"offset", "rows", "issue_rows", "vocab"}
+    ts.f8            float64 unix timestamp per grading
+    day.i4           int32 local calendar day (date.toordinal) per grading
+    grade.i2         int16 grade (0-100)
+    is_code.u1       uint8 flag
+    issue_row.i4     int32 grading row for each detected issue
+    issue_id.i4      int32 index into vocab for each detected issue
+
+Issues are normalized (case, spacing, "(line N)" suffixes) and the vocab is
+capped at MAX_ISSUES; rarer issues seen after that are counted as OTHER_ISSUE.
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from interprocess import file_lock
+from utils_io import atomic_write
+
+COLUMNS = {
+    "ts": np.float64,
+    "day": np.int32,
+    "grade": np.int16,
+    "is_code": np.uint8,
+}
+ISSUE_COLUMNS = {
+    "issue_row": np.int32,
+    "issue_id": np.int32,
+}
+_SUFFIX = {np.float64: "f8", np.int16: "i2", np.uint8: "u1", np.int32: "i4"}
+
+# Distinct issues kept in meta.json; it is rewritten on every refresh
+MAX_ISSUES = 1000
+OTHER_ISSUE = "(other issues)"
+_LINE_REF = re.compile(r"\s*\(?\bline \d+\)?")
+
+
+def _issue_key(issue) -> str:
+    """Issue text as counted: lower case, single spaces, no line references or trailing punctuation."""
+    key = _LINE_REF.sub("", str(issue).lower())
+    return re.sub(r"\s+", " ", key).strip(" .;:")
+
+
+def _column_path(cache_dir: str, name: str, dtype) -> str:
+    return os.path.join(cache_dir, f"{name}.{_SUFFIX[dtype]}")
+
+
+class GradingAnalytics:
+    """Incrementally maintained columnar index of grading history."""
+
+    def __init__(self, history_path: str, cache_dir: str):
+        self.history_path = history_path
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # -------- Indexing --------
+    def _load_meta(self) -> Dict:
+        path = os.path.join(self.cache_dir, "meta.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"offset": 0, "rows": 0, "issue_rows": 0, "vocab": []}
+
+    def _truncate_columns(self, meta: Dict) -> None:
+        """Drop column bytes written after the last committed meta (crash recovery)."""
+        for columns, rows in ((COLUMNS, meta["rows"]), (ISSUE_COLUMNS, meta["issue_rows"])):
+            for name, dtype in columns.items():
+                path = _column_path(self.cache_dir, name, dtype)
+                expected = rows * np.dtype(dtype).itemsize
+                if not os.path.exists(path):
+                    if expected:
+                        raise ValueError(f"missing column {name}")
+                    open(path, "wb").close()
+                elif os.path.getsize(path) != expected:
+                    with open(path, "r+b") as f:
+                        f.truncate(expected)
+
+    def refresh(self) -> Dict:
+        """Index lines appended to the history since the last refresh; return meta."""
+        # Other worker processes may be indexing the same directory
+        with self._lock, file_lock(os.path.join(self.cache_dir, "meta.json")):
+            meta = self._load_meta()
+            try:
+                self._truncate_columns(meta)
+            except ValueError:
+                meta = {"offset": 0, "rows": 0, "issue_rows": 0, "vocab": []}
+                self._truncate_columns(meta)
+            if not os.path.exists(self.history_path):
+                return meta
+            if os.path.getsize(self.history_path) < meta["offset"]:
+                # Log was truncated or replaced: rebuild from scratch
+                meta = {"offset": 0, "rows": 0, "issue_rows": 0, "vocab": []}
+                self._truncate_columns(meta)
+
+            with open(self.history_path, "rb") as f:
+                f.seek(meta["offset"])
+                chunk = f.read()
+            end = chunk.rfind(b"\n") + 1  # only complete lines
+            if end == 0:
+                return meta
+
+            vocab: List[str] = meta["vocab"]
+            vocab_index = {issue: i for i, issue in enumerate(vocab)}
+            ts, days, grades, is_code, issue_rows, issue_ids = [], [], [], [], [], []
+            row = meta["rows"]
+            for line in chunk[:end].splitlines():
+                try:
+                    entry = json.loads(line)
+                    result = entry.get("result") or {}
+                    when = datetime.fromisoformat(entry["ts"])
+                    stamp = when.timestamp()
+                    grade = int(result.get("grade", 0))
+                except (ValueError, KeyError, TypeError):
+                    continue
+                ts.append(stamp)
+                # Calendar day as logged (local time), so trend buckets match their labels
+                days.append(when.date().toordinal())
+                grades.append(max(0, min(100, grade)))
+                is_code.append(1 if entry.get("is_code") else 0)
+                for issue in result.get("detected_issues") or []:
+                    key = _issue_key(issue)
+                    if not key:
+                        continue
+                    if key not in vocab_index and len(vocab) >= MAX_ISSUES:
+                        key = OTHER_ISSUE
+                    if key not in vocab_index:
+                        vocab_index[key] = len(vocab)
+                        vocab.append(key)
+                    issue_rows.append(row)
+                    issue_ids.append(vocab_index[key])
+                row += 1
+
+            for name, values in (("ts", ts), ("day", days), ("grade", grades), ("is_code", is_code)):
+                dtype = COLUMNS[name]
+                with open(_column_path(self.cache_dir, name, dtype), "ab") as f:
+                    np.asarray(values, dtype=dtype).tofile(f)
+            for name, values in (("issue_row", issue_rows), ("issue_id", issue_ids)):
+                dtype = ISSUE_COLUMNS[name]
+                with open(_column_path(self.cache_dir, name, dtype), "ab") as f:
+                    np.asarray(values, dtype=dtype).tofile(f)
+
+            meta = {
+                "offset": meta["offset"] + end,
+                "rows": row,
+                "issue_rows": meta["issue_rows"] + len(issue_rows),
+                "vocab": vocab,
+            }
+            atomic_write(json.dumps(meta), os.path.join(self.cache_dir, "meta.json"))
+            return meta
+
+    def _column(self, name: str, dtype, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_path(self.cache_dir, name, dtype), dtype=dtype, mode="r", shape=(rows,))
+
+    # -------- Aggregation --------
+    def summary(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        pass_mark: int = 60,
+        top_issues: int = 10,
+        bucket: str = "day",
+    ) -> Dict:
+        """Compute grade distribution, pass rates, top issues and trends."""
+        meta = self.refresh()
+        rows = meta["rows"]
+        ts = self._column("ts", np.float64, rows)
+        day = self._column("day", np.int32, rows)
+        grade = self._column("grade", np.int16, rows)
+        is_code = self._column("is_code", np.uint8, rows).astype(bool)
+
+        mask = np.ones(rows, dtype=bool)
+        if since is not None:
+            mask &= ts >= since
+        if until is not None:
+            mask &= ts < until
+        g = grade[mask].astype(np.float64)
+        code = is_code[mask]
+        passed = g >= pass_mark
+
+        def rate(selector: np.ndarray) -> Optional[float]:
+            n = int(selector.sum())
+            return float(passed[selector].mean()) if n else None
+
+        hist, edges = np.histogram(g, bins=np.arange(0, 111, 10))
+        distribution = [
+            {"range": f"{int(lo)}-{int(min(hi - 1, 100))}", "count": int(c)} for lo, hi, c in zip(edges[:-1], edges[1:], hist)
+        ]
+
+        issue_row = self._column("issue_row", np.int32, meta["issue_rows"])
+        issue_id = self._column("issue_id", np.int32, meta["issue_rows"])
+        selected = issue_id[mask[issue_row]] if len(issue_row) else issue_id
+        counts = np.bincount(selected, minlength=len(meta["vocab"])).astype(np.int64)
+        if not len(selected):
+            counts = np.zeros(len(meta["vocab"]), dtype=np.int64)
+        if OTHER_ISSUE in meta["vocab"]:
+            counts[meta["vocab"].index(OTHER_ISSUE)] = 0
+        top = np.argsort(counts)[::-1][:top_issues]
+        issues = [{"issue": meta["vocab"][i], "count": int(counts[i])} for i in top if counts[i] > 0]
+
+        trend = []
+        if g.size:
+            buckets = day[mask].astype(np.int64)
+            if bucket == "week":
+                # Ordinal 1 (0001-01-01) is a Monday, so weeks start on Monday
+                buckets -= (buckets - 1) % 7
+            keys, inverse = np.unique(buckets, return_inverse=True)
+            n = np.bincount(inverse)
+            mean = np.bincount(inverse, weights=g) / n
+            pass_rate = np.bincount(inverse, weights=passed.astype(np.float64)) / n
+            trend = [
+                {
+                    "start": date.fromordinal(int(k)).isoformat(),
+                    "count": int(c),
+                    "mean_grade": round(float(m), 2),
+                    "pass_rate": round(float(p), 4),
+                }
+                for k, c, m, p in zip(keys, n, mean, pass_rate)
+            ]
+
+        return {
+            "count": int(g.size),
+            "mean_grade": round(float(g.mean()), 2) if g.size else None,
+            "median_grade": float(np.median(g)) if g.size else None,
+            "pass_mark": pass_mark,
+            "pass_rate": rate(np.ones(g.size, dtype=bool)),
+            "pass_rate_code": rate(code),
+            "pass_rate_non_code": rate(~code),
+            "distribution": distribution,
+            "top_issues": issues,
+            "trend": trend,
+            "bucket": bucket,
+        }
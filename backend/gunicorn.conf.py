@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the multi-worker production mode.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker imports the app itself (no preload), so background threads are
+started after the fork. Shared state is coordinated through the data
+directory: file locks around memory/JSONL writes, SQLite for queues and
+caches, and MODEL_CONCURRENCY lock-file slots for model calls.
+"""
+
+import os
+
+bind = os.environ.get("BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+# Threads per worker: streamed generations hold a thread for their full duration
+threads = int(os.environ.get("THREADS", "8"))
+worker_class = "gthread"
+# Generations can take minutes; per-request deadlines are enforced by the app
+timeout = int(os.environ.get("WORKER_TIMEOUT", "600"))
+graceful_timeout = 60
+preload_app = False
+
+
+def worker_exit(server, worker):
+    """Flush buffered memory batches and stop job workers before the process exits."""
+    import app
+
+    app.shutdown()
@@ -0,0 +1,133 @@
+"""
+Semantic answer cache for the /help mentor bot.
+
+Questions are embedded locally with hashed character n-grams and word
+unigrams (a fixed-size NumPy vector, L2-normalized), so paraphrases such as
+"how do I upload a PDF?" and "uploading pdf how?" land close together. A
+lookup is one matrix-vector product against every cached question.
+
+Vectors live in a matrix preallocated for `capacity` rows and written in
+place, so an insert costs O(DIM) and eviction overwrites the oldest model
+answer's row. Untouched rows of the zeroed allocation are not backed by
+memory until used.
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+
+from interprocess import append_line
+
+# 16 KB per cached question at float32
+DIM = 1 << 12
+NGRAM_SIZES = (3, 4, 5)
+
+_STOPWORDS = frozenset("a an the i do does how can to is it my me of in on for what where with".split())
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed n-gram vector of a question (float32, unit length)."""
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in _STOPWORDS]
+    vec = np.zeros(DIM, dtype=np.float32)
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            features.extend(padded[i : i + n] for i in range(max(1, len(padded) - n + 1)))
+    for feature in features:
+        vec[zlib.crc32(feature.encode("utf-8")) % DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticCache:
+    """Thread-safe nearest-neighbour cache of answered help questions."""
+
+    def __init__(self, threshold: float = 0.8, capacity: int = 5000, store_path: Optional[str] = None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((capacity, DIM), dtype=np.float32)
+        self._entries: List[dict] = []
+        # Rows holding model answers, oldest first (curated FAQ rows are never evicted)
+        self._evictable: Deque[int] = deque()
+        if store_path and os.path.exists(store_path):
+            self._load_store()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, question: str) -> Optional[Tuple[str, float, str]]:
+        """Return (answer, similarity, matched question) above threshold, else None."""
+        vec = embed(question)
+        with self._lock:
+            if not self._entries:
+                return None
+            scores = self._matrix[: len(self._entries)] @ vec
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            entry = self._entries[best]
+        if score < self.threshold:
+            return None
+        return entry["answer"], score, entry["question"]
+
+    def add(self, question: str, answer: str, source: str = "model", persist: bool = True) -> None:
+        """Cache an answered question (oldest model answers are evicted first)."""
+        entry = {"question": question, "answer": answer, "source": source}
+        vec = embed(question)
+        with self._lock:
+            self._put(entry, vec)
+        if persist and self.store_path and source != "faq":
+            try:
+                append_line(self.store_path, json.dumps(entry, ensure_ascii=False))
+            except OSError as e:
+                print(f"Could not persist help cache entry: {e}")
+
+    def _put(self, entry: dict, vec: np.ndarray) -> None:
+        """Write one entry into a free row, or over the oldest model answer (lock held)."""
+        if len(self._entries) < self.capacity:
+            row = len(self._entries)
+            self._entries.append(entry)
+        elif self._evictable:
+            row = self._evictable.popleft()
+            self._entries[row] = entry
+        else:
+            return  # full of curated FAQ entries
+        self._matrix[row] = vec
+        if entry["source"] != "faq":
+            self._evictable.append(row)
+
+    def seed_faq(self, path: str) -> int:
+        """Load curated question/answer pairs (each with optional paraphrases)."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            faq = json.load(f)
+        entries = [
+            {"question": question, "answer": item["answer"], "source": "faq"}
+            for item in faq
+            for question in [item["question"], *item.get("paraphrases", [])]
+        ]
+        self._extend(entries)
+        return len(entries)
+
+    def _load_store(self) -> None:
+        with open(self.store_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        self._extend(
+            [{"question": r["question"], "answer": r["answer"], "source": r.get("source", "model")} for r in rows[-self.capacity:]]
+        )
+
+    def _extend(self, entries: List[dict]) -> None:
+        """Bulk-add entries (startup loading)."""
+        vectors = [embed(e["question"]) for e in entries]
+        with self._lock:
+            for entry, vec in zip(entries, vectors):
+                self._put(entry, vec)
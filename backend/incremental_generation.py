@@ -0,0 +1,131 @@
+"""
+Section-level incremental generation.
+
+Long inputs are split into independent sections (Markdown sections for
+slides, paragraphs for simplify/expand), each section is generated
+concurrently, and results are cached by a hash of the section's prompt. After
+an edit only the changed sections reach the model; the rest are reused.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import metrics
+from generation_cache import GenerationCache, prompt_key
+from llm_client import GenerationCancelled
+from prefetch import prefetch_namespace
+
+MAX_WORKERS = 4
+
+_SECTION_HEADING = re.compile(r"^#{1,2}\s+\S", re.MULTILINE)
+_SLIDE_LINE = re.compile(r"^(\s*)Slide\s+\d+\s*:", re.MULTILINE | re.IGNORECASE)
+
+
+def split_markdown_sections(markdown: str) -> List[str]:
+    """Split Markdown on # / ## headings; ### subsections stay with their parent.
+
+    A heading with no body (e.g. the lecture title) is merged into the next
+    section so it does not cost a generation of its own.
+    """
+    text = markdown.strip()
+    starts = [m.start() for m in _SECTION_HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = [text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(text)])]
+    merged: List[str] = []
+    carry = ""
+    for section in sections:
+        if not section:
+            continue
+        if len(section.splitlines()) == 1 and section.startswith("#"):
+            carry = f"{carry}\n\n{section}".strip()
+            continue
+        merged.append(f"{carry}\n\n{section}".strip() if carry else section)
+        carry = ""
+    if carry:
+        merged.append(carry)
+    return merged
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text into paragraph blocks on blank lines, keeping fenced code intact.
+
+    Heading-only blocks are attached to the paragraph that follows them.
+    """
+    blocks: List[str] = []
+    current: List[str] = []
+    in_fence = False
+    for line in text.strip().splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+
+    merged: List[str] = []
+    carry = ""
+    for block in blocks:
+        if block.lstrip().startswith("#") and len(block.splitlines()) == 1:
+            carry = f"{carry}\n\n{block}".strip()
+            continue
+        merged.append(f"{carry}\n\n{block}" if carry else block)
+        carry = ""
+    if carry:
+        merged.append(carry)
+    return merged
+
+
+def renumber_slides(text: str) -> str:
+    """Renumber "Slide N:" lines sequentially across reassembled sections."""
+    counter = iter(range(1, 1_000_000))
+    return _SLIDE_LINE.sub(lambda m: f"{m.group(1)}Slide {next(counter)}:", text)
+
+
+def generate_sections(
+    sections: List[str],
+    build_prompt: Callable[[str], str],
+    generate: Callable[[str], str],
+    cache: GenerationCache,
+    namespace: str,
+    model: str,
+    use_prefetch: bool = False,
+) -> Tuple[List[str], int]:
+    """Generate every section (cached ones are reused) and return (outputs, reused).
+
+    Outputs are returned in section order; missing sections run concurrently.
+    With `use_prefetch`, sections speculatively generated by the prefetcher
+    are used (and kept) before falling back to the model.
+    """
+    prompts = [build_prompt(section) for section in sections]
+    keys = [prompt_key(model, prompt) for prompt in prompts]
+    outputs: List[str] = [cache.get(namespace, key) or "" for key in keys]
+    if use_prefetch:
+        for i, key in enumerate(keys):
+            if not outputs[i]:
+                outputs[i] = cache.get(prefetch_namespace(namespace), key) or ""
+                if outputs[i]:
+                    cache.put(namespace, key, outputs[i])
+                    metrics.incr("prefetch.hit")
+    missing = [i for i, out in enumerate(outputs) if not out]
+    if use_prefetch and missing:
+        metrics.incr("prefetch.miss", len(missing))
+    reused = len(sections) - len(missing)
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(missing))) as pool:
+            futures = {i: pool.submit(generate, prompts[i]) for i in missing}
+            try:
+                for i, future in futures.items():
+                    outputs[i] = future.result()
+                    if outputs[i]:
+                        cache.put(namespace, keys[i], outputs[i])
+            except GenerationCancelled:
+                for future in futures.values():
+                    future.cancel()
+                raise
+    return outputs, reused
@@ -0,0 +1,173 @@
+"""
+Cross-process coordination for running the backend under several workers.
+
+All primitives are advisory `flock` locks on files under the data directory,
+so they are released by the kernel when a worker dies. Without `fcntl`
+(Windows) they degrade to per-process thread locks, which is enough for the
+single-process development server.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl  # type: ignore
+except ImportError:
+    fcntl = None
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_guard = threading.Lock()
+_held = threading.local()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    with _local_guard:
+        return _local_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive lock on `path + ".lock"` (reentrant within a thread)."""
+    lock_path = os.path.abspath(path) + ".lock"
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if lock_path in held:
+        yield
+        return
+    with _thread_lock(lock_path):
+        fd = None
+        if fcntl is not None:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+def try_lock(path: str) -> Optional[int]:
+    """Take a non-blocking lock on `path + ".lock"`; return the fd to keep it, or None.
+
+    Used to mark ownership of a file for the lifetime of a process: the lock
+    disappears with the process, so other workers can tell the owner is gone.
+    """
+    lock_path = os.path.abspath(path) + ".lock"
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def release_lock(fd: int) -> None:
+    """Release a lock returned by `try_lock`."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def append_line(path: str, line: str) -> None:
+    """Append one line to a file without interleaving with other workers."""
+    with file_lock(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line.rstrip("\n") + "\n")
+
+
+class ProcessSemaphore:
+    """Counting semaphore shared by every worker process on this machine.
+
+    Each of `slots` permits is a lock file in `lock_dir`; acquiring means
+    holding one of them. Threads of the same process compete exactly like
+    other processes, since each acquisition opens its own file descriptor.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, lock_dir: str, slots: int):
+        self.lock_dir = lock_dir
+        self.slots = max(1, slots)
+        os.makedirs(lock_dir, exist_ok=True)
+        self._local = threading.BoundedSemaphore(self.slots) if fcntl is None else None
+
+    def acquire(self, timeout: Optional[float] = None, should_cancel: Optional[Callable[[], bool]] = None) -> Optional[int]:
+        """Wait for a free slot; return a token for `release`, or None on timeout/cancel."""
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            if self._local is not None:
+                if self._local.acquire(timeout=self.POLL_SECONDS):
+                    return -1
+            else:
+                for i in range(self.slots):
+                    fd = try_lock(os.path.join(self.lock_dir, f"slot{i}"))
+                    if fd is not None:
+                        return fd
+                time.sleep(self.POLL_SECONDS)
+            if end is not None and time.time() >= end:
+                return None
+            if should_cancel is not None and should_cancel():
+                return None
+
+    def release(self, token: int) -> None:
+        if self._local is not None:
+            self._local.release()
+        else:
+            release_lock(token)
+
+
+class ActivityMarker:
+    """Tells background work whether foreground work is running in any worker.
+
+    Foreground work holds a shared lock on the marker file; `busy()` probes for
+    it with a non-blocking exclusive lock, so there is nothing to clean up if a
+    worker dies mid-request.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._count = 0
+        self._count_lock = threading.Lock()
+
+    @contextmanager
+    def active(self):
+        """Mark foreground work for the duration of the block."""
+        with self._count_lock:
+            self._count += 1
+        fd = None
+        if fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            with self._count_lock:
+                self._count -= 1
+
+    def busy(self) -> bool:
+        """True while foreground work is running here or in another worker."""
+        if self._count or fcntl is None:
+            return self._count > 0
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        else:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        finally:
+            os.close(fd)
@@ -0,0 +1,322 @@
+"""
+Persistent job queue for long-running generations.
+
+Jobs live in SQLite under the data directory, so they survive worker
+restarts: a running job whose lease expires (its worker died) is put back
+in the queue, unless it was cancelled meanwhile or is out of attempts.
+Worker threads claim jobs atomically, stream partial output into the row,
+retry transport failures and timeouts with backoff (other errors, such as a
+prompt that cannot be built, fail at once) and honour cancellation requests.
+Finished jobs are deleted after `retention_seconds`.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+import metrics
+from llm_client import GenerationCancelled
+
+# (task, params, on_chunk, should_cancel) -> output text
+JobRunner = Callable[[str, Dict, Callable[[str], None], Callable[[], bool]], str]
+
+LEASE_SECONDS = 60.0
+FLUSH_SECONDS = 1.0
+RETENTION_SECONDS = 7 * 86400
+# Finished jobs are purged every this many submissions (and when workers start)
+PURGE_EVERY = 100
+# Failures worth another attempt; a deadline cancellation counts as a timeout
+RETRYABLE_ERRORS: Tuple[type, ...] = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    output TEXT,
+    partial TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, not_before, created_at);
+"""
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class JobQueue:
+    """SQLite-backed job queue with a fixed pool of worker threads."""
+
+    def __init__(
+        self,
+        db_path: str,
+        runner: JobRunner,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retention_seconds: float = RETENTION_SECONDS,
+    ):
+        self.db_path = db_path
+        self.runner = runner
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._submitted = 0
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open an autocommit connection and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # -------- Client API --------
+    def submit(self, task: str, params: Dict, max_attempts: Optional[int] = None) -> str:
+        """Queue a job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, task, params, status, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, task, json.dumps(params), max_attempts or self.max_attempts, now, now),
+            )
+        metrics.incr("jobs.submitted")
+        self._submitted += 1
+        if self._submitted % PURGE_EVERY == 0:
+            self.purge()
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a job's public state, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "task": row["task"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "output": row["output"],
+            "partial_output": row["partial"] if row["status"] == "running" else None,
+            "error": row["error"],
+            "cancel_requested": bool(row["cancel_requested"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job; queued jobs stop immediately, running ones at the next chunk."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (_now(), _now(), job_id),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'running'",
+                (_now(), job_id),
+            )
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def purge(self) -> int:
+        """Delete succeeded, failed and cancelled jobs finished over `retention_seconds` ago; return how many."""
+        cutoff = (datetime.now() - timedelta(seconds=self.retention_seconds)).isoformat()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?", (cutoff,)
+            )
+        if cur.rowcount:
+            metrics.incr("jobs.purged", cur.rowcount)
+        return cur.rowcount
+
+    # -------- Workers --------
+    def start(self) -> None:
+        """Start worker threads (idempotent)."""
+        if self._threads or self._stopped:
+            return
+        try:
+            self.purge()
+        except sqlite3.Error as e:
+            print(f"Job purge error: {e}")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self) -> None:
+        """Ask workers to exit after their current job."""
+        self._stopped = True
+        self._wake.set()
+
+    def _heartbeat(self) -> None:
+        """Renew leases of this process's running jobs, even while waiting on the model."""
+        while not self._stopped:
+            time.sleep(LEASE_SECONDS / 3)
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND lease_owner = ?",
+                        (time.time() + LEASE_SECONDS, self.owner),
+                    )
+            except sqlite3.Error as e:
+                print(f"Job heartbeat error: {e}")
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically take the next runnable job, reclaiming expired leases."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died (restart, crash) go back to the queue, unless
+                # they were cancelled meanwhile or have used up their attempts
+                expired = "status = 'running' AND lease_expires < ?"
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', lease_owner = NULL, finished_at = ?, updated_at = ? "
+                    f"WHERE {expired} AND cancel_requested = 1",
+                    (_now(), _now(), now),
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker exited while running the job', "
+                    f"lease_owner = NULL, finished_at = ?, updated_at = ? WHERE {expired} AND attempts >= max_attempts",
+                    (_now(), _now(), now),
+                )
+                conn.execute(
+                    f"UPDATE jobs SET status = 'queued', lease_owner = NULL, updated_at = ? WHERE {expired}",
+                    (_now(), now),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, partial = '', "
+                    "lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (self.owner, now + LEASE_SECONDS, _now(), row["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _work(self) -> None:
+        while not self._stopped:
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}")
+                row = None
+            if row is None:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            self._run(row)
+
+    def _run(self, row: sqlite3.Row) -> None:
+        job_id = row["id"]
+        partial: List[str] = []
+        state = {"flushed": time.time(), "cancel": False}
+
+        def refresh() -> None:
+            # Persist partial output and pick up cancellation requests
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET partial = ?, updated_at = ? WHERE id = ?",
+                    ("".join(partial), _now(), job_id),
+                )
+                flag = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            state["cancel"] = bool(flag and flag["cancel_requested"])
+            state["flushed"] = time.time()
+
+        def on_chunk(text: str) -> None:
+            partial.append(text)
+
+        def should_cancel() -> bool:
+            if time.time() - state["flushed"] >= FLUSH_SECONDS:
+                refresh()
+            return state["cancel"]
+
+        try:
+            output = self.runner(row["task"], json.loads(row["params"]), on_chunk, should_cancel)
+        except GenerationCancelled as e:
+            if e.reason == "job_cancelled":
+                self._finish_or_retry(row, "cancelled", error=str(e))
+            else:
+                self._finish_or_retry(row, None if e.reason == "deadline" else "failed", error=str(e))
+            return
+        except RETRYABLE_ERRORS as e:
+            self._finish_or_retry(row, None, error=str(e))
+            return
+        except Exception as e:
+            self._finish_or_retry(row, "failed", error=str(e))
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', output = ?, partial = NULL, error = NULL, "
+                "lease_owner = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+                (output, _now(), _now(), job_id),
+            )
+        metrics.incr("jobs.succeeded")
+
+    def _finish_or_retry(self, row: sqlite3.Row, status: Optional[str], error: str) -> None:
+        """Record a failure: `status` None retries with backoff while attempts remain, else finishes as `status`."""
+        attempts = row["attempts"] + 1
+        if status is None:
+            with self._connect() as conn:
+                flag = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            if flag and flag["cancel_requested"]:
+                status = "cancelled"
+        if status is None and attempts < row["max_attempts"]:
+            status, not_before, finished = "queued", time.time() + 2 ** attempts, None
+            metrics.incr("jobs.retried")
+        else:
+            status, not_before, finished = status or "failed", 0, _now()
+            metrics.incr(f"jobs.{status}")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, not_before = ?, lease_owner = NULL, "
+                "finished_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, not_before, finished, _now(), row["id"]),
+            )
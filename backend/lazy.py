@@ -0,0 +1,48 @@
+"""
+Deferred construction and imports to keep worker cold starts fast.
+
+Heavy optional dependencies (PDF parsers, compression) and services that touch
+disk at construction time are created on first use instead of at import.
+"""
+
+import importlib
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def optional_module(name: str) -> Optional[Any]:
+    """Import a module on first use; None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except Exception:
+        return None
+
+
+class Lazy(Generic[T]):
+    """Proxy that builds its object on first attribute access (thread-safe)."""
+
+    # Proxy attributes are all prefixed with "lazy" so they never shadow the
+    # wrapped object's own (e.g. GenerationCache.get).
+
+    def __init__(self, factory: Callable[[], T]):
+        self._lazy_factory = factory
+        self._lazy_obj: Optional[T] = None
+        self._lazy_lock = threading.Lock()
+
+    @property
+    def lazy_loaded(self) -> bool:
+        return self._lazy_obj is not None
+
+    def lazy_instance(self) -> T:
+        if self._lazy_obj is None:
+            with self._lazy_lock:
+                if self._lazy_obj is None:
+                    self._lazy_obj = self._lazy_factory()
+        return self._lazy_obj
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.lazy_instance(), name)
@@ -0,0 +1,152 @@
+"""
+Model server protocols behind llm_client.generate_text.
+
+- "ollama": Ollama's /api/generate (NDJSON stream, sampling under "options").
+- "openai": any OpenAI-compatible server (vLLM, llama.cpp server, TGI, ...)
+  via /v1/chat/completions with server-sent events. Such servers batch
+  concurrent requests continuously, so raise MODEL_CONCURRENCY to match.
+
+The deployment default is LLM_BACKEND (default "ollama"); a generation profile
+can pick another with "backend". Both stream text the same way and report
+usage in one shape: {"output_tokens", "prompt_tokens", "truncated",
+"generation_seconds"} (None where the server does not say).
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "http://localhost:8000/v1")
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+DEFAULT_BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+
+# (text fragment, usage); usage is set only on the final event of a stream
+StreamEvent = Tuple[str, Optional[Dict]]
+
+
+class OllamaBackend:
+    """Ollama /api/generate."""
+
+    name = "ollama"
+
+    def __init__(self, url: str = OLLAMA_URL):
+        self.url = url
+
+    def request(self, model: str, prompt: str, settings: Dict, stream: bool = True) -> Tuple[str, Dict, Dict]:
+        """Return (url, JSON body, headers) for a resolved generation profile."""
+        body = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            # Sampling settings only take effect inside "options"
+            "options": {"temperature": settings["temperature"], **settings["options"]},
+        }
+        if settings["format"]:
+            body["format"] = settings["format"]
+        return self.url, body, {}
+
+    def parse_stream(self, lines: Iterable[bytes]) -> Iterator[StreamEvent]:
+        for line in lines:
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise requests.exceptions.RequestException(chunk["error"])
+            if chunk.get("done"):
+                yield chunk.get("response", ""), self.usage(chunk)
+                return
+            yield chunk.get("response", ""), None
+
+    @staticmethod
+    def usage(final: Dict) -> Dict:
+        """Usage from Ollama's final chunk (or non-streamed response)."""
+        return {
+            "output_tokens": final.get("eval_count"),
+            "prompt_tokens": final.get("prompt_eval_count"),
+            "truncated": final.get("done_reason") == "length",
+            "generation_seconds": final["eval_duration"] / 1e9 if final.get("eval_duration") else None,
+        }
+
+
+class OpenAICompatibleBackend:
+    """OpenAI-compatible /v1/chat/completions; the prompt is sent as one user message."""
+
+    name = "openai"
+
+    # Ollama option names the chat completions API also understands
+    _PASSTHROUGH = ("top_p", "seed", "presence_penalty", "frequency_penalty")
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: str = OPENAI_API_KEY):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.api_key = api_key
+
+    def request(self, model: str, prompt: str, settings: Dict, stream: bool = True) -> Tuple[str, Dict, Dict]:
+        """Return (url, JSON body, headers); num_ctx has no equivalent and is left to the server."""
+        options = settings["options"]
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": stream,
+            "temperature": settings["temperature"],
+        }
+        if "num_predict" in options:
+            body["max_tokens"] = options["num_predict"]
+        if options.get("stop"):
+            body["stop"] = options["stop"]
+        for key in self._PASSTHROUGH:
+            if key in options:
+                body[key] = options[key]
+        if settings["format"] == "json":
+            body["response_format"] = {"type": "json_object"}
+        if stream:
+            # Usage arrives in one last chunk before [DONE]
+            body["stream_options"] = {"include_usage": True}
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return self.url, body, headers
+
+    def parse_stream(self, lines: Iterable[bytes]) -> Iterator[StreamEvent]:
+        usage: Dict = {}
+        finish_reason = None
+        for line in lines:
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                error = chunk["error"]
+                raise requests.exceptions.RequestException(error.get("message") if isinstance(error, dict) else error)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                finish_reason = choice.get("finish_reason") or finish_reason
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield text, None
+        yield "", self.usage(usage, finish_reason)
+
+    @staticmethod
+    def usage(usage: Dict, finish_reason: Optional[str]) -> Dict:
+        return {
+            "output_tokens": usage.get("completion_tokens"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "truncated": finish_reason == "length",
+            "generation_seconds": None,
+        }
+
+
+_BACKENDS = {"ollama": OllamaBackend, "openai": OpenAICompatibleBackend}
+_instances: Dict[str, object] = {}
+
+
+def get_backend(name: Optional[str] = None):
+    """Backend by name (default LLM_BACKEND); raises ValueError for unknown names."""
+    name = name or DEFAULT_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {', '.join(_BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = _BACKENDS[name]()
+    return _instances[name]
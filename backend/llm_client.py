@@ -0,0 +1,273 @@
+"""HTTP client for the local model server with deadline and cancellation support.
+
+Generations are streamed (from Ollama or an OpenAI-compatible server, see
+llm_backends) so the request can be aborted between chunks. Closing the
+streaming connection makes the server stop generating, so no tokens are
+produced for a client that has gone away or a deadline that passed.
+
+`limit_concurrency` caps how many generations run at once across every worker
+process; callers queue for a slot before their request reaches the model.
+
+The model, sampling settings and load fallback come from a named generation
+profile (see generation_profiles). Output tokens and latency are recorded per
+profile and per model, and `sample_outputs` logs a fraction of generations
+for offline quality review of the routing table.
+"""
+
+import json
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import requests
+
+import metrics
+from generation_profiles import DEFAULT_MODEL, get_profile
+from interprocess import ProcessSemaphore, append_line
+from llm_backends import get_backend
+
+# Read timeouts fire at the deadline give or take socket timer granularity
+DEADLINE_SLACK = 0.05
+
+_model_slots: Optional[ProcessSemaphore] = None
+_sample_path: Optional[str] = None
+_sample_rate = 0.0
+_read_cap_warned = False
+
+
+class GenerationCancelled(Exception):
+    """Raised when an in-flight generation is aborted before completion."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Generation cancelled: {reason}")
+        self.reason = reason
+
+
+def _cancel(reason: str) -> GenerationCancelled:
+    metrics.incr("llm.cancelled")
+    metrics.incr(f"llm.cancelled.{reason}")
+    return GenerationCancelled(reason)
+
+
+def _cap_read_timeout(resp: requests.Response, seconds: float) -> None:
+    """Limit the next socket read of a streaming response to `seconds` (the time left before the deadline).
+
+    The read timeout passed to `requests.post` is fixed for the whole stream,
+    so this adjusts the socket of the response's connection. Servers that
+    close the connection after the response (and future urllib3 versions)
+    may not expose it; reads then keep the timeout the request was sent with,
+    which is already capped at the deadline, and a warning is logged once.
+    """
+    global _read_cap_warned
+    sock = getattr(getattr(resp.raw, "connection", None), "sock", None)
+    if sock is None or not hasattr(sock, "settimeout"):
+        if not _read_cap_warned:
+            _read_cap_warned = True
+            print("Warning: response socket unavailable; stream reads keep the request's read timeout")
+        metrics.incr("llm.read_cap_unavailable")
+        return
+    try:
+        sock.settimeout(max(0.01, seconds))
+    except OSError:
+        pass  # socket already closed; the next read fails on its own
+
+
+def limit_concurrency(lock_dir: str, slots: int) -> None:
+    """Allow at most `slots` concurrent model calls machine-wide (lock files in `lock_dir`)."""
+    global _model_slots
+    _model_slots = ProcessSemaphore(lock_dir, slots)
+
+
+def sample_outputs(path: str, rate: float) -> None:
+    """Append a `rate` fraction of generations (profile, model, prompt tail, output) to a JSONL file."""
+    global _sample_path, _sample_rate
+    _sample_path, _sample_rate = path, rate
+
+
+@contextmanager
+def model_slot(
+    timeout: float,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    cancel_reason: str = "client_disconnect",
+    deep_after: Optional[float] = None,
+):
+    """Hold a model slot for the duration of the block.
+
+    Raises GenerationCancelled("deadline") if no slot frees up within
+    `timeout` seconds, or with `cancel_reason` if `should_cancel` fires first.
+    Yields True if the queue was deep: no slot was free within `deep_after`
+    seconds.
+    """
+    if _model_slots is None:
+        yield False
+        return
+    start = time.perf_counter()
+    token = None
+    deep = False
+    if deep_after is not None:
+        token = _model_slots.acquire(timeout=max(0.0, min(deep_after, timeout)), should_cancel=should_cancel)
+        deep = token is None
+    if token is None:
+        token = _model_slots.acquire(timeout=max(0.0, timeout - (time.perf_counter() - start)), should_cancel=should_cancel)
+    metrics.observe("llm.queue_wait_ms", (time.perf_counter() - start) * 1000.0)
+    if token is None:
+        if should_cancel is not None and should_cancel():
+            raise _cancel(cancel_reason)
+        raise _cancel("deadline")
+    try:
+        yield deep
+    finally:
+        _model_slots.release(token)
+
+
+def generate_text(
+    prompt: str,
+    profile: str = "default",
+    model: Optional[str] = None,
+    timeout: float = 120,
+    deadline: Optional[float] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cancel_reason: str = "client_disconnect",
+) -> str:
+    """Stream a completion from the model server and return the full response text.
+
+    `profile` names the generation profile supplying the backend, the model
+    (`model`, else MODEL_NAME, when the profile does not route), temperature,
+    options (num_predict, num_ctx, stop) and JSON format mode.
+
+    `deadline` is an absolute `time.time()` value that caps `timeout`;
+    `should_cancel` is polled between chunks (e.g. a client-disconnect check)
+    and reported as `cancel_reason`. Raises GenerationCancelled when either
+    fires. `on_chunk` receives each text fragment as it arrives.
+    """
+    end = time.time() + timeout
+    if deadline is not None:
+        end = min(end, deadline)
+    remaining = end - time.time()
+    if remaining <= 0:
+        raise _cancel("deadline")
+
+    settings = get_profile(profile)
+    backend = get_backend(settings["backend"])
+    model = settings["model"] or model or DEFAULT_MODEL
+    fallback = settings["fallback_model"]
+    deep_after = settings["fallback_after_ms"] / 1000.0 if fallback and fallback != model else None
+    with model_slot(remaining, should_cancel, cancel_reason, deep_after) as deep:
+        if deep:
+            # Queue is backed up: answer with the smaller model instead of waiting on the big one
+            model = fallback
+            metrics.incr(f"llm.fallback.{profile}")
+        remaining = end - time.time()
+        if remaining <= 0:
+            raise _cancel("deadline")
+        url, body, headers = backend.request(model, prompt, settings)
+        metrics.incr("llm.requests")
+        start = time.perf_counter()
+        usage: dict = {}
+        parts = []
+        try:
+            resp = requests.post(
+                url,
+                json=body,
+                headers=headers,
+                stream=True,
+                timeout=(min(10.0, remaining), remaining),
+            )
+            try:
+                resp.raise_for_status()
+                for text, final in backend.parse_stream(resp.iter_lines()):
+                    if time.time() > end:
+                        raise _cancel("deadline")
+                    if should_cancel is not None and should_cancel():
+                        raise _cancel(cancel_reason)
+                    parts.append(text)
+                    if on_chunk is not None and text:
+                        on_chunk(text)
+                    if final is not None:
+                        usage = final
+                        break
+                    _cap_read_timeout(resp, end - time.time())
+            finally:
+                # Closing the connection is what tells the server to stop generating.
+                resp.close()
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            # A read that timed out at the deadline (slow prefill, model load, stalled stream)
+            if time.time() >= end - DEADLINE_SLACK:
+                raise _cancel("deadline")
+            raise
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    output = "".join(parts).strip()
+    _record(profile, backend.name, model, settings, prompt, output, usage, latency_ms)
+    return output
+
+
+def _record(
+    profile: str, backend: str, model: str, settings: dict, prompt: str, output: str, usage: dict, latency_ms: float
+) -> None:
+    """Per-profile and per-model usage, latency and quality signals (same for every backend)."""
+    metrics.observe("llm.latency_ms", latency_ms)
+    metrics.observe(f"llm.latency_ms.{profile}", latency_ms)
+    metrics.observe(f"llm.latency_ms.model.{model}", latency_ms)
+    metrics.incr(f"llm.requests.model.{model}")
+    metrics.incr(f"llm.requests.backend.{backend}")
+    output_tokens = usage.get("output_tokens")
+    if output_tokens is not None:
+        metrics.observe("llm.output_tokens", output_tokens)
+        metrics.observe(f"llm.output_tokens.{profile}", output_tokens)
+        metrics.observe(f"llm.output_tokens.model.{model}", output_tokens)
+        # Prefer the server's own generation time; otherwise include time to first token
+        seconds = usage.get("generation_seconds") or latency_ms / 1000.0
+        if seconds > 0:
+            metrics.observe(f"llm.tokens_per_s.model.{model}", output_tokens / seconds)
+    if usage.get("prompt_tokens") is not None:
+        metrics.observe(f"llm.prompt_tokens.{profile}", usage["prompt_tokens"])
+    if usage.get("truncated"):
+        # Output hit num_predict: the profile's cap may be too tight for this route
+        metrics.incr(f"llm.truncated.{profile}")
+    if settings["format"] == "json":
+        # Cheap quality signal for structured routes: did the model return parseable JSON?
+        try:
+            json.loads(output)
+            metrics.incr(f"llm.json_valid.model.{model}")
+        except ValueError:
+            metrics.incr(f"llm.json_invalid.model.{model}")
+    if _sample_path and random.random() < _sample_rate:
+        append_line(
+            _sample_path,
+            json.dumps(
+                {
+                    "ts": time.time(),
+                    "profile": profile,
+                    "backend": backend,
+                    "model": model,
+                    "latency_ms": round(latency_ms),
+                    "output_tokens": output_tokens,
+                    "prompt_tail": prompt[-1000:],
+                    "output": output,
+                },
+                ensure_ascii=False,
+            ),
+        )
+
+
+def model_report() -> dict:
+    """Per-model request count, latency, output size, speed and JSON validity."""
+    snapshot = metrics.snapshot()
+    counters, samples = snapshot["counters"], snapshot["samples"]
+    report = {}
+    for name, count in counters.items():
+        if not name.startswith("llm.requests.model."):
+            continue
+        model = name[len("llm.requests.model."):]
+        valid = counters.get(f"llm.json_valid.model.{model}", 0)
+        invalid = counters.get(f"llm.json_invalid.model.{model}", 0)
+        report[model] = {
+            "requests": count,
+            "avg_latency_ms": samples.get(f"llm.latency_ms.model.{model}", {}).get("avg"),
+            "avg_output_tokens": samples.get(f"llm.output_tokens.model.{model}", {}).get("avg"),
+            "avg_tokens_per_s": samples.get(f"llm.tokens_per_s.model.{model}", {}).get("avg"),
+            "json_valid_rate": round(valid / (valid + invalid), 4) if valid + invalid else None,
+        }
+    return report
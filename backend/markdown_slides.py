@@ -0,0 +1,181 @@
+"""
+Deterministic Markdown-to-slides conversion for well-structured lectures.
+
+Lectures written to lecture_content_prompt's format (a # title, ## sections,
+### subsections, bullet lists, short paragraphs and code fences) map onto
+slides mechanically: every section or subsection becomes a slide titled by
+its heading, list items become bullets, paragraphs are split into one bullet
+per sentence and code blocks are summarized by their first line. Output uses
+the "Slide N: Title" / "- bullet" format slide_content_prompt asks the model
+for, so /content/slide returns the same shape either way.
+
+`is_structured` decides whether an input qualifies; anything else (long
+prose, no headings) still goes to the model.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+MAX_BULLETS = 6
+MAX_BULLET_WORDS = 18
+# Longer paragraphs need real summarizing, which only the model can do
+MAX_PARAGRAPH_WORDS = 80
+MIN_SECTIONS = 2
+# Share of content blocks that must already be headings, list items or table rows
+MIN_STRUCTURED_RATIO = 0.4
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.*)$")
+_TABLE_RULE = re.compile(r"^\s*\|?\s*:?-{3,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9`\"'(])")
+# A period after these ends a word, not a sentence ("Dr. Smith", "vs. Python")
+_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "jr", "sr", "vs", "fig", "cf", "approx"}
+# Initials and dotted abbreviations: "J.", "U.S.", "e.g.", "i.e."
+_INITIALS = re.compile(r"^(?:[A-Za-z]\.)+$")
+_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|_)(?=\S)(.+?)(?<=\S)\1")
+
+
+def _blocks(markdown: str) -> List[Tuple[str, str]]:
+    """Split Markdown into (kind, text) blocks: heading, item, paragraph, code, table."""
+    blocks: List[Tuple[str, str]] = []
+    paragraph: List[str] = []
+    fence: Optional[List[str]] = None
+
+    def flush() -> None:
+        if paragraph:
+            blocks.append(("paragraph", " ".join(paragraph)))
+            paragraph.clear()
+
+    for line in markdown.strip().splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if fence is None:
+                flush()
+                fence = [stripped[3:].strip()]
+            else:
+                blocks.append(("code", "\n".join(fence)))
+                fence = None
+            continue
+        if fence is not None:
+            fence.append(line)
+            continue
+        heading = _HEADING.match(stripped)
+        item = _LIST_ITEM.match(line)
+        if not stripped:
+            flush()
+        elif heading:
+            flush()
+            blocks.append(("h" + str(len(heading.group(1))), heading.group(2)))
+        elif item:
+            flush()
+            blocks.append(("item", item.group(1)))
+        elif stripped.startswith("|"):
+            flush()
+            if not _TABLE_RULE.match(stripped):
+                blocks.append(("table", stripped))
+        else:
+            paragraph.append(stripped.lstrip("> ").strip())
+    flush()
+    if fence is not None:
+        blocks.append(("code", "\n".join(fence)))
+    return blocks
+
+
+def is_structured(markdown: str) -> bool:
+    """True when the Markdown follows the heading/bullet lecture structure closely enough to convert locally."""
+    blocks = _blocks(markdown)
+    if not blocks or not blocks[0][0].startswith("h"):
+        return False
+    if sum(1 for kind, _ in blocks if kind in ("h1", "h2", "h3")) < MIN_SECTIONS:
+        return False
+    paragraphs = [text for kind, text in blocks if kind == "paragraph"]
+    if any(len(text.split()) > MAX_PARAGRAPH_WORDS for text in paragraphs):
+        return False
+    structured = sum(1 for kind, _ in blocks if kind not in ("paragraph", "code"))
+    return structured / max(1, structured + len(paragraphs)) >= MIN_STRUCTURED_RATIO
+
+
+def _clean(text: str) -> str:
+    text = _LINK.sub(r"\1", text)
+    text = _EMPHASIS.sub(r"\2", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _sentences(text: str) -> List[str]:
+    """Split cleaned text into sentences, keeping abbreviations and initials inside their sentence."""
+    sentences: List[str] = []
+    for piece in _SENTENCE_END.split(text):
+        last = sentences[-1].split()[-1] if sentences and sentences[-1].split() else ""
+        if last and (_INITIALS.match(last) or last.rstrip(".").lower() in _ABBREVIATIONS):
+            sentences[-1] += " " + piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def _bullet(text: str) -> str:
+    """One short bullet: the first sentence, clipped to MAX_BULLET_WORDS."""
+    text = _sentences(_clean(text))[0]
+    words = text.split()
+    if len(words) > MAX_BULLET_WORDS:
+        return " ".join(words[:MAX_BULLET_WORDS]).rstrip(",;:") + "…"
+    return text.rstrip(".")
+
+
+def _code_bullet(code: str) -> str:
+    language, *lines = code.split("\n")
+    first = next((line.strip() for line in lines if line.strip() and not line.strip().startswith("#")), "")
+    label = f"Example ({language})" if language else "Example"
+    return f"{label}: `{first}`" if first else label
+
+
+def _slide_bullets(kind: str, text: str) -> List[str]:
+    if kind == "item":
+        return [_bullet(text)]
+    if kind == "paragraph":
+        return [_bullet(sentence) for sentence in _sentences(_clean(text)) if sentence.strip()]
+    if kind == "code":
+        return [_code_bullet(text)]
+    if kind == "table":
+        cells = [_clean(cell) for cell in text.strip("|").split("|")]
+        return [" – ".join(cell for cell in cells if cell)]
+    return []
+
+
+def markdown_to_slides(markdown: str) -> str:
+    """Convert lecture Markdown to "Slide N: Title" slides with at most MAX_BULLETS bullets each."""
+    slides: List[Tuple[str, List[str]]] = []
+    title: Optional[str] = None
+    sections: List[str] = []
+    for kind, text in _blocks(markdown):
+        if kind == "h1" and title is None and not slides:
+            title = _clean(text)
+        elif kind in ("h1", "h2"):
+            sections.append(_clean(text))
+            slides.append((sections[-1], []))
+        elif kind.startswith("h"):
+            # ### and deeper get their own slide
+            slides.append((_clean(text), []))
+        else:
+            if not slides:
+                slides.append((title or "Introduction", []))
+            bullets = slides[-1][1]
+            new = [bullet for bullet in _slide_bullets(kind, text) if bullet]
+            if kind == "code" and bullets and bullets[-1].endswith(":"):
+                # "... you'd write:" followed by the code reads as one bullet
+                bullets[-1] += " " + new.pop(0).split(": ", 1)[-1]
+            bullets.extend(new)
+
+    if title is not None:
+        # Title slide lists the agenda
+        slides.insert(0, (title, sections[:MAX_BULLETS]))
+    out: List[str] = []
+    for heading, bullets in slides:
+        if not bullets:
+            continue
+        for start in range(0, len(bullets), MAX_BULLETS):
+            name = heading if start == 0 else f"{heading} (cont.)"
+            lines = [f"Slide {len(out) + 1}: {name}"] + [f"- {bullet}" for bullet in bullets[start : start + MAX_BULLETS]]
+            out.append("\n".join(lines))
+    return "\n\n".join(out)
@@ -0,0 +1,68 @@
+"""
+Cheap local pre-filter that decides whether a message is worth an LLM
+memory extraction.
+
+Most messages ("explain photosynthesis", a pasted PDF) say nothing about the
+teacher. These patterns look for the phrasing that actually carries profile
+information: first-person teaching context, grade levels, tone requests and
+future plans.
+"""
+
+import re
+
+# Uploaded files are sent as "File: ...\n\nExtracted content:\n...\n\nUser question: ..."
+_UPLOAD_MARKER = "Extracted content:"
+_QUESTION_MARKER = "User question:"
+
+FIRST_PERSON = re.compile(r"\b(i|i'm|im|i've|me|my|we|we're|our|us)\b")
+
+TONE_WORDS = re.compile(
+    r"\b(casual|formal|professional|humorous|funny|fun|witty|concise|brief|short|enthusiastic|"
+    r"encouraging|socratic|storyteller|friendly)\b"
+)
+TONE_CUES = re.compile(r"\b(prefer|please|be more|be less|keep it|make it|sound|tone|style|respond|answer|talk|write)\b")
+
+SIGNAL_PATTERNS = [
+    # teaching context and subjects
+    re.compile(r"\b(teach\w*|taught|instructor|professor|educator|tutor\w*)\b"),
+    re.compile(r"\b(my|our)\s+(students?|class(es)?|classroom|course|courses|lectures?|lessons?|curriculum|pupils|kids|school|department)\b"),
+    # grade levels
+    re.compile(
+        r"\b(\d{1,2}(st|nd|rd|th)[ -]grade(rs)?|grade \d{1,2}|kindergarten|elementary|primary school|"
+        r"middle school|high school|secondary|freshm[ae]n|sophomores?|juniors|seniors|"
+        r"undergrad\w*|graduate students|university|college|k-12)\b"
+    ),
+    # teaching style, interests and goals
+    re.compile(
+        r"\b(project-based|hands-on|inquiry-based|flipped|interactive|lecture-based|"
+        r"my goal|our goal|goals?|i want (my|to)|i'd like to|i would like to|struggl\w*|engag\w*|"
+        r"interested in|passionate about|focus(ing)? on)\b"
+    ),
+    # future plans and upcoming topics
+    re.compile(
+        r"\b(next (week|month|term|semester|year|quarter|unit|class)|plan(ning|s)? to|going to|"
+        r"will be (teaching|covering|starting)|upcoming|this (fall|spring|summer|winter|term|semester)|"
+        r"in (the )?(fall|spring|summer|winter)|by (the end of|december|january|june|may)|"
+        r"field trip|science fair|club)\b"
+    ),
+]
+
+
+def user_portion(message: str) -> str:
+    """Strip uploaded file content so only the teacher's own words are scanned."""
+    if _UPLOAD_MARKER in message:
+        idx = message.rfind(_QUESTION_MARKER)
+        return message[idx + len(_QUESTION_MARKER):] if idx != -1 else ""
+    return message
+
+
+def has_profile_signal(message: str) -> bool:
+    """Return True if the message plausibly contains educator profile info."""
+    text = user_portion(message).strip().lower()
+    if len(text) < 10:
+        return False
+    if TONE_WORDS.search(text) and TONE_CUES.search(text):
+        return True
+    if not FIRST_PERSON.search(text):
+        return False
+    return any(p.search(text) for p in SIGNAL_PATTERNS)
@@ -1,10 +1,67 @@
+import atexit
+import glob
 import json
 import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
-import requests
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import re
 
+import metrics
+from memory_filter import has_profile_signal
+from generation_profiles import DEFAULT_MODEL
+from interprocess import file_lock, release_lock, try_lock
+from llm_client import GenerationCancelled, generate_text
+from utils_io import atomic_write
+
+# List fields of the memory structure, in the order they are rendered
+LIST_FIELDS = (
+    "teaching_subjects",
+    "grade_levels",
+    "teaching_style",
+    "interests",
+    "goals",
+    "future_plans",
+    "upcoming_topics",
+    "planned_activities",
+    "learning_objectives",
+    "next_focus_areas",
+)
+# Most entries kept per field; the lowest-scoring ones are evicted beyond this
+FIELD_CAPS = {
+    "teaching_subjects": 8,
+    "grade_levels": 5,
+    "teaching_style": 6,
+    "interests": 10,
+    "goals": 8,
+    "future_plans": 6,
+    "upcoming_topics": 8,
+    "planned_activities": 6,
+    "learning_objectives": 6,
+    "next_focus_areas": 6,
+}
+# Who the teacher is matters more to every prompt than any single plan
+FIELD_PRIORITY = {"teaching_subjects": 2.0, "grade_levels": 2.0, "teaching_style": 1.5}
+# An entry's weight halves for every half-life it goes unmentioned (plans go
+# stale faster than what the teacher teaches)...
+HALF_LIFE_DAYS = {"teaching_subjects": 180.0, "grade_levels": 180.0, "teaching_style": 90.0}
+DEFAULT_HALF_LIFE_DAYS = 30.0
+# ...and it is dropped once it decays below this (about 4 half-lives for a single mention)
+MIN_ENTRY_SCORE = 0.06
+# Rough prompt budget for the rendered educator context (~4 characters per token)
+CONTEXT_TOKEN_BUDGET = 160
+CHARS_PER_TOKEN = 4
+
+
+def entry_score(stats: Dict, now: float, field: str = "") -> float:
+    """Mention weight decayed exponentially since the entry was last seen."""
+    age_days = max(0.0, now - stats.get("last_seen", now)) / 86400.0
+    return stats.get("weight", 1.0) * 0.5 ** (age_days / HALF_LIFE_DAYS.get(field, DEFAULT_HALF_LIFE_DAYS))
+
 class EducatorMemory:
     """Manages persistent memory for educator-specific context and preferences."""
     
@@ -44,27 +101,112 @@ class EducatorMemory:
         }
     }
     
-    def __init__(self, memory_file="user_memory.json", ollama_url="http://localhost:11434/api/generate"):
+    def __init__(
+        self,
+        memory_file="user_memory.json",
+        model: str = DEFAULT_MODEL,
+        prefilter: Optional[Callable[[str], bool]] = has_profile_signal,
+        prefilter_sample_rate: float = 0.02,
+        batch_size: int = 5,
+        batch_idle_seconds: float = 60.0,
+    ):
         self.memory_file = memory_file
-        self.ollama_url = ollama_url
+        # Default model; the memory_extract profile may route extraction to a smaller one
+        self.model = model
+        # Local classifier deciding whether a message is worth an LLM extraction
+        self.prefilter = prefilter
+        # Fraction of skipped messages still sent to the LLM to measure false negatives
+        self.prefilter_sample_rate = prefilter_sample_rate
+        self.prefilter_misses = deque(maxlen=20)
+        # Rendered educator context by memory version
+        self._context_cache: "OrderedDict[int, str]" = OrderedDict()
+        self._context_lock = threading.Lock()
         self.ensure_memory_file()
+        # Coalesce extraction per user; batch_size=0 extracts every message inline
+        self.batcher = (
+            ExtractionBatcher(self, batch_size, batch_idle_seconds, memory_file)
+            if batch_size > 0
+            else None
+        )
     
     def ensure_memory_file(self):
         """Create memory file if it doesn't exist."""
-        if not os.path.exists(self.memory_file):
-            with open(self.memory_file, 'w') as f:
-                json.dump({}, f)
+        with file_lock(self.memory_file):
+            if not os.path.exists(self.memory_file):
+                with open(self.memory_file, 'w') as f:
+                    json.dump({}, f)
     
     def extract_user_info(self, message: str) -> Dict:
         """Use LLM to infer structured educator data from a message."""
+        decision = self._classify(message)
+        if decision == "extract":
+            return self._llm_extract([message])
+        if decision == "audit":
+            return self._audit_extract(message)
+        return self._empty_structure()
+    
+    def _classify(self, message: str) -> str:
+        """Decide whether a message should be extracted: 'extract', 'audit' or 'skip'."""
         # Skip extraction for very short messages
         if len(message.strip()) < 10:
-            return self._empty_structure()
+            return "skip"
+        if self.prefilter is None:
+            return "extract"
         
+        metrics.incr("memory.prefilter.checked")
+        if self.prefilter(message):
+            return "extract"
+        
+        metrics.incr("memory.prefilter.skipped")
+        # Audit a sample of skipped messages to estimate the false-negative rate
+        if random.random() < self.prefilter_sample_rate:
+            return "audit"
+        return "skip"
+    
+    def _audit_extract(self, message: str) -> Dict:
+        """Extract a message the pre-filter skipped and record whether it was a miss."""
+        metrics.incr("memory.prefilter.sampled")
+        extracted = self._llm_extract([message])
+        if self._has_info(extracted):
+            metrics.incr("memory.prefilter.false_negative")
+            self.prefilter_misses.append(message[:200])
+        return extracted
+    
+    def prefilter_stats(self) -> Dict:
+        """Report pre-filter skip rate and sampled false-negative rate."""
+        counters = metrics.snapshot()["counters"]
+        checked = counters.get("memory.prefilter.checked", 0)
+        skipped = counters.get("memory.prefilter.skipped", 0)
+        sampled = counters.get("memory.prefilter.sampled", 0)
+        false_negatives = counters.get("memory.prefilter.false_negative", 0)
+        return {
+            "checked": checked,
+            "skipped": skipped,
+            "skip_rate": skipped / checked if checked else 0.0,
+            "sampled": sampled,
+            "false_negatives": false_negatives,
+            "false_negative_rate": false_negatives / sampled if sampled else 0.0,
+            "recent_misses": list(self.prefilter_misses),
+        }
+    
+    def _has_info(self, info: Dict) -> bool:
+        """Return True if an extraction result contains any non-empty field."""
+        return any(value for value in info.values())
+    
+    def _llm_extract(self, messages: List[str]) -> Dict:
+        """Run one LLM extraction over one or more messages from the same teacher."""
         # Get available tones for the prompt
         tone_options = ", ".join(self.get_available_tones())
         
-        extraction_prompt = f"""Analyze this teacher's message and extract relevant information about them, including future plans and goals.
+        if len(messages) == 1:
+            subject = "this teacher's message"
+            message_block = f'Teacher\'s message: "{messages[0]}"'
+        else:
+            subject = "these messages from one teacher"
+            numbered = "\n".join(f'{i}. "{m}"' for i, m in enumerate(messages, 1))
+            message_block = f"Teacher's messages:\n{numbered}"
+        
+        extraction_prompt = f"""Analyze {subject} and extract relevant information about them, including future plans and goals.
 Return ONLY a valid JSON object with these fields (use empty arrays if nothing found):
 - teaching_subjects: list of subjects they teach (e.g., ["biology", "chemistry"])
 - grade_levels: list of grade levels or age groups (e.g., ["9th grade", "high school"])
@@ -86,24 +228,14 @@ Examples of tone preferences:
 - "Make it fun and witty like Grok" → "humorous"
 - "Keep it brief" → "concise"
 
-Teacher's message: "{message}"
+{message_block}
 
 Respond with ONLY valid JSON, no explanation or additional text:"""
 
         try:
-            resp = requests.post(
-                self.ollama_url,
-                json={
-                    "model": "mistral",
-                    "prompt": extraction_prompt,
-                    "stream": False,
-                    "temperature": 0.2  # Lower temperature for more consistent extraction
-                },
-                timeout=30
-            )
-            resp.raise_for_status()
-            
-            output = resp.json().get("response", "").strip()
+            timeout = 30 if len(messages) == 1 else 60
+            # JSON mode, low temperature and a short output cap (see generation_profiles)
+            output = generate_text(extraction_prompt, profile="memory_extract", model=self.model, timeout=timeout)
             
             # Extract JSON from response (handle cases where model adds text)
             json_match = re.search(r'\{.*\}', output, re.DOTALL)
@@ -116,7 +248,7 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
                 cleaned_info = self._validate_extraction(extracted_info)
                 return cleaned_info
             
-        except requests.exceptions.Timeout:
+        except GenerationCancelled:
             print("Timeout while extracting user info")
         except json.JSONDecodeError as e:
             print(f"JSON decode error: {e}")
@@ -152,11 +284,10 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
                 extracted_info[key] = default_structure[key]
         
         # Clean list fields - remove empty strings and duplicates
-        list_fields = ["teaching_subjects", "grade_levels", "teaching_style", "interests", "goals"]
-        for field in list_fields:
+        for field in LIST_FIELDS:
             if isinstance(extracted_info[field], list):
                 # Remove empty strings and strip whitespace
-                cleaned = [item.strip() for item in extracted_info[field] if item and item.strip()]
+                cleaned = [item.strip() for item in extracted_info[field] if isinstance(item, str) and item.strip()]
                 # Remove duplicates (case-insensitive)
                 seen = set()
                 unique = []
@@ -175,8 +306,13 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
         
         return extracted_info
     
-    def update_memory(self, existing_memory: Dict, new_info: Dict) -> Dict:
-        """Merge new educator info, avoiding duplicates and maintaining clean data."""
+    def update_memory(self, existing_memory: Dict, new_info: Dict, interactions: int = 1) -> Dict:
+        """Merge new educator info, avoiding duplicates and maintaining clean data.
+        
+        Every mention of an entry (new or repeated) bumps its recency and
+        frequency stats in "entry_stats"; fields are then trimmed to their cap
+        and entries that have decayed away are dropped.
+        """
         if not existing_memory:
             existing_memory = self._empty_structure()
             existing_memory["last_updated"] = datetime.now().isoformat()
@@ -184,21 +320,30 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
         
         # Track if any changes were made
         changes_made = False
+        now = time.time()
+        all_stats = existing_memory.setdefault("entry_stats", {})
         
         # Merge list fields (remove duplicates, case-insensitive)
-        list_fields = ["teaching_subjects", "grade_levels", "teaching_style", "interests", "goals"]
-        
-        for field in list_fields:
-            if field in new_info and new_info[field]:
-                # Get existing values (lowercase for comparison)
-                existing_lower = [item.lower() for item in existing_memory.get(field, [])]
-                
-                # Add new unique values
-                for item in new_info[field]:
-                    if item and item.strip() and item.lower() not in existing_lower:
-                        existing_memory[field].append(item)
-                        existing_lower.append(item.lower())
-                        changes_made = True
+        for field in LIST_FIELDS:
+            items = existing_memory.setdefault(field, [])
+            stats = all_stats.setdefault(field, {})
+            self._backfill_stats(existing_memory, field, now)
+            for item in new_info.get(field) or []:
+                if not isinstance(item, str) or not item.strip():
+                    continue
+                item = item.strip()
+                key = item.lower()
+                entry = stats.get(key)
+                if entry is None:
+                    items.append(item)
+                    stats[key] = {"count": 1, "weight": 1.0, "last_seen": now}
+                    changes_made = True
+                else:
+                    entry["weight"] = entry_score(entry, now, field) + 1.0
+                    entry["count"] = entry.get("count", 1) + 1
+                    entry["last_seen"] = now
+            if self._evict(existing_memory, field, now):
+                changes_made = True
         
         # Update preferred_tone if new one is provided and different
         if new_info.get("preferred_tone") and new_info["preferred_tone"] != existing_memory.get("preferred_tone"):
@@ -210,42 +355,73 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
             existing_memory["last_updated"] = datetime.now().isoformat()
         
         # Increment interaction count
-        existing_memory["interaction_count"] = existing_memory.get("interaction_count", 0) + 1
+        existing_memory["interaction_count"] = existing_memory.get("interaction_count", 0) + interactions
         
         return existing_memory
     
+    def _backfill_stats(self, memory: Dict, field: str, now: float) -> None:
+        """Give entries saved before stats existed a single mention at last_updated."""
+        stats = memory["entry_stats"].setdefault(field, {})
+        try:
+            seen = datetime.fromisoformat(memory.get("last_updated", "")).timestamp()
+        except ValueError:
+            seen = now
+        for item in memory.get(field, []):
+            stats.setdefault(item.lower(), {"count": 1, "weight": 1.0, "last_seen": seen})
+    
+    def _evict(self, memory: Dict, field: str, now: float) -> bool:
+        """Drop decayed entries and trim the field to its cap; True if anything was removed."""
+        items = memory[field]
+        stats = memory["entry_stats"][field]
+        scores = {item.lower(): entry_score(stats[item.lower()], now, field) for item in items}
+        keep = {key for key, score in scores.items() if score >= MIN_ENTRY_SCORE}
+        cap = FIELD_CAPS.get(field, len(items))
+        if len(keep) > cap:
+            keep = set(sorted(keep, key=lambda key: scores[key], reverse=True)[:cap])
+        if len(keep) == len(items):
+            return False
+        memory[field] = [item for item in items if item.lower() in keep]
+        for key in list(stats):
+            if key not in keep:
+                del stats[key]
+        metrics.incr("memory.evicted", len(items) - len(memory[field]))
+        return True
+    
     def save_memory(self, user_id: str, memory: Dict):
         """Write user memory to disk with error handling."""
+        self.modify_memory(user_id, lambda _: memory)
+    
+    def modify_memory(self, user_id: str, update: Callable[[Dict], Dict]) -> Dict:
+        """Load, update and save one user's memory as a single step.
+        
+        The whole read-modify-write holds a cross-process lock on the memory
+        file, so concurrent workers never lose each other's updates.
+        """
+        memory = {}
         try:
-            # Load all user memories
-            all_memories = {}
-            if os.path.exists(self.memory_file):
-                with open(self.memory_file, 'r') as f:
-                    try:
-                        all_memories = json.load(f)
-                    except json.JSONDecodeError:
-                        print("Warning: Corrupted memory file, creating new one")
-                        all_memories = {}
-            
-            # Update specific user's memory
-            all_memories[user_id] = memory
-            
-            # Save back with atomic write (write to temp file first)
-            temp_file = self.memory_file + ".tmp"
-            with open(temp_file, 'w') as f:
-                json.dump(all_memories, f, indent=2)
-            
-            # Atomic rename
-            os.replace(temp_file, self.memory_file)
+            with file_lock(self.memory_file):
+                # Load all user memories
+                all_memories = {}
+                if os.path.exists(self.memory_file):
+                    with open(self.memory_file, 'r') as f:
+                        try:
+                            all_memories = json.load(f)
+                        except json.JSONDecodeError:
+                            print("Warning: Corrupted memory file, creating new one")
+                            all_memories = {}
                 
+                # Update specific user's memory
+                memory = update(all_memories.get(user_id, {}))
+                if memory:
+                    # Unique per save: keys the rendered-context memo in every worker
+                    memory["version"] = time.time_ns()
+                all_memories[user_id] = memory
+                
+                # Save back with atomic write (unique temp file, then rename)
+                atomic_write(json.dumps(all_memories, indent=2), self.memory_file)
         except Exception as e:
             print(f"Error saving memory: {e}")
-            # Clean up temp file if it exists
-            if os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
+        return memory
     
     def load_memory(self, user_id: str) -> Dict:
         """Load memory for a specific user."""
@@ -264,15 +440,65 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
             return {}
     
     def build_memory_context(self, memory: Dict) -> str:
-        """Generate a natural language summary of educator memory for the prompt."""
-        if not memory or not any(memory.get(k) for k in ["teaching_subjects", "grade_levels", "teaching_style", "interests", "goals"]):
+        """Generate a natural language summary of educator memory for the prompt.
+        
+        Entries are ranked by decayed frequency and only the best ones that fit
+        CONTEXT_TOKEN_BUDGET are rendered. The result is memoized per memory
+        version, so it is rebuilt only after the memory changes.
+        """
+        version = memory.get("version") if memory else None
+        if version is not None:
+            with self._context_lock:
+                cached = self._context_cache.get(version)
+                if cached is not None:
+                    self._context_cache.move_to_end(version)
+                    metrics.incr("memory.context.memo_hit")
+                    return cached
+        context = self._render_context(memory)
+        if version is not None:
+            with self._context_lock:
+                self._context_cache[version] = context
+                while len(self._context_cache) > 256:
+                    self._context_cache.popitem(last=False)
+        return context
+    
+    def _render_context(self, memory: Dict) -> str:
+        """Render the highest-ranked entries that fit the context budget."""
+        if not memory or not any(memory.get(k) for k in LIST_FIELDS):
             return ""
         
+        now = time.time()
+        all_stats = memory.get("entry_stats", {})
+        ranked = []
+        for field in LIST_FIELDS:
+            stats = all_stats.get(field, {})
+            for item in memory.get(field, []):
+                entry = stats.get(item.lower())
+                score = entry_score(entry, now, field) if entry else 1.0
+                ranked.append((score * FIELD_PRIORITY.get(field, 1.0), field, item))
+        ranked.sort(key=lambda r: r[0], reverse=True)
+        
+        tone = memory.get("preferred_tone", "")
+        budget = CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN
+        chosen: Dict[str, List[str]] = {field: [] for field in LIST_FIELDS}
+        context = ""
+        for _, field, item in ranked:
+            chosen[field].append(item)
+            candidate = self._format_context(chosen, tone)
+            if len(candidate) > budget and context:
+                # Too long; a shorter lower-ranked entry may still fit
+                chosen[field].pop()
+                continue
+            context = candidate
+        return context
+    
+    def _format_context(self, entries: Dict[str, List[str]], tone: str) -> str:
+        """Phrase selected memory entries as the EDUCATOR CONTEXT preamble."""
         context_parts = []
         
         # Teaching subjects and grade level
-        subjects = memory.get("teaching_subjects", [])
-        grades = memory.get("grade_levels", [])
+        subjects = entries["teaching_subjects"]
+        grades = entries["grade_levels"]
         
         if subjects and grades:
             context_parts.append(f"This teacher teaches {', '.join(subjects)} to {', '.join(grades)} students")
@@ -281,48 +507,21 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
         elif grades:
             context_parts.append(f"This teacher works with {', '.join(grades)} students")
         
-        # Teaching style
-        styles = memory.get("teaching_style", [])
-        if styles:
-            context_parts.append(f"prefers {', '.join(styles)} teaching approaches")
-        
-        # Interests
-        interests = memory.get("interests", [])
-        if interests:
-            context_parts.append(f"is interested in {', '.join(interests)}")
-        
-        # Goals
-        goals = memory.get("goals", [])
-        if goals:
-            context_parts.append(f"Current goals: {', '.join(goals)}")
-            
-        # Future plans
-        future_plans = memory.get("future_plans", [])
-        if future_plans:
-            context_parts.append(f"Planning to: {', '.join(future_plans)}")
-            
-        # Upcoming topics
-        upcoming_topics = memory.get("upcoming_topics", [])
-        if upcoming_topics:
-            context_parts.append(f"Will be teaching: {', '.join(upcoming_topics)}")
-            
-        # Planned activities
-        planned_activities = memory.get("planned_activities", [])
-        if planned_activities:
-            context_parts.append(f"Upcoming activities: {', '.join(planned_activities)}")
-            
-        # Learning objectives
-        learning_objectives = memory.get("learning_objectives", [])
-        if learning_objectives:
-            context_parts.append(f"Future learning goals: {', '.join(learning_objectives)}")
-            
-        # Next focus areas
-        next_focus_areas = memory.get("next_focus_areas", [])
-        if next_focus_areas:
-            context_parts.append(f"Planning to focus on: {', '.join(next_focus_areas)}")
+        phrasing = (
+            ("teaching_style", "prefers {} teaching approaches"),
+            ("interests", "is interested in {}"),
+            ("goals", "Current goals: {}"),
+            ("future_plans", "Planning to: {}"),
+            ("upcoming_topics", "Will be teaching: {}"),
+            ("planned_activities", "Upcoming activities: {}"),
+            ("learning_objectives", "Future learning goals: {}"),
+            ("next_focus_areas", "Planning to focus on: {}"),
+        )
+        for field, template in phrasing:
+            if entries[field]:
+                context_parts.append(template.format(", ".join(entries[field])))
         
         # Preferred tone
-        tone = memory.get("preferred_tone", "")
         if tone:
             context_parts.append(f"Prefers communication that is {tone}")
         
@@ -332,20 +531,53 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
         return ""
     
     def process_interaction(self, user_id: str, message: str) -> Dict:
-        """Process a user message and update memory. Returns current memory."""
-        # Load existing memory
-        current_memory = self.load_memory(user_id)
+        """Process a user message and update memory. Returns current memory.
+        
+        With batching enabled the message is buffered and extracted later
+        together with the user's other messages; the returned memory is the
+        last flushed state.
+        """
+        if self.batcher is not None:
+            decision = self._classify(message)
+            info = self._audit_extract(message) if decision == "audit" else None
+            self.batcher.add(user_id, message if decision == "extract" else None, info)
+            return self.load_memory(user_id)
         
         # Extract new information from message
         new_info = self.extract_user_info(message)
         
-        # Update memory
-        updated_memory = self.update_memory(current_memory, new_info)
+        # Merge into the stored memory and save
+        return self.modify_memory(user_id, lambda current: self.update_memory(current, new_info))
+    
+    def flush_pending(self, user_id: Optional[str] = None) -> None:
+        """Extract and merge buffered messages now (e.g. at session end)."""
+        if self.batcher is not None:
+            self.batcher.flush(user_id)
+    
+    def close(self) -> None:
+        """Flush buffered batches and stop the batcher (process shutdown)."""
+        if self.batcher is not None:
+            self.batcher.close()
+    
+    def apply_batch(self, user_id: str, messages: List[str], infos: List[Dict], interactions: int) -> Dict:
+        """Extract a batch of messages in one LLM call and merge everything once."""
+        infos = list(infos)
+        if messages:
+            metrics.incr("memory.batch.extractions")
+            metrics.observe("memory.batch.size", len(messages))
+            infos.append(self._llm_extract(messages))
         
-        # Save updated memory
-        self.save_memory(user_id, updated_memory)
+        new_info = self._empty_structure()
+        for info in infos:
+            for key, value in info.items():
+                if isinstance(new_info.get(key), list) and isinstance(value, list):
+                    new_info[key].extend(value)
+                elif key == "preferred_tone" and value:
+                    new_info[key] = value
         
-        return updated_memory
+        return self.modify_memory(
+            user_id, lambda current: self.update_memory(current, new_info, interactions=interactions)
+        )
     
     def get_user_stats(self, user_id: str) -> Dict:
         """Get statistics about a user's memory."""
@@ -377,4 +609,165 @@ Respond with ONLY valid JSON, no explanation or additional text:"""
         """Get the instruction text for a specific tone to add to prompts."""
         tone_data = self.TONES.get(tone, self.TONES["professional"])
         instruction = tone_data.get("instruction", "")
-        return f"TONE: {instruction}\n\n" if instruction else ""
\ No newline at end of file
+        return f"TONE: {instruction}\n\n" if instruction else ""
+
+
+class ExtractionBatcher:
+    """Buffers messages per user and extracts each batch in a single LLM call.
+    
+    A user's batch is flushed when it reaches `max_batch` messages, after
+    `idle_seconds` without new messages, on an explicit flush (session end),
+    or at interpreter shutdown. Pending batches are journaled to disk so a
+    crash does not lose them; the journal is replayed on startup.
+    
+    Each worker process journals to its own file (named by pid and a random
+    suffix, so a restarted worker reusing a pid never collides with a dead
+    one's journal) and holds a lock on it while alive. On startup a worker
+    adopts the journals of workers that are gone.
+    """
+    
+    def __init__(self, memory: EducatorMemory, max_batch: int, idle_seconds: float, memory_file: str):
+        self.memory = memory
+        self.max_batch = max_batch
+        self.idle_seconds = idle_seconds
+        self.journal_pattern = memory_file + ".*pending.json"
+        self.journal_file = f"{memory_file}.{os.getpid()}-{uuid.uuid4().hex[:8]}.pending.json"
+        self._journal_lock = try_lock(self.journal_file)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict] = {}
+        self._inflight: Dict[str, Dict] = {}
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self._load_journal()
+        atexit.register(self.close)
+    
+    def add(self, user_id: str, message: Optional[str] = None, info: Optional[Dict] = None) -> None:
+        """Record one interaction, with a message to extract and/or already extracted info."""
+        with self._lock:
+            entry = self._pending.setdefault(user_id, self._new_entry())
+            entry["interactions"] += 1
+            entry["last_seen"] = time.time()
+            if message:
+                entry["messages"].append(message)
+            if info and self.memory._has_info(info):
+                entry["infos"].append(info)
+            self._write_journal()
+            full = len(entry["messages"]) >= self.max_batch
+        self._ensure_worker()
+        if full:
+            self._wake.set()
+    
+    def flush(self, user_id: Optional[str] = None) -> None:
+        """Apply buffered batches now, for one user or for everyone."""
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._pending)
+            batches = [(uid, self._pending.pop(uid)) for uid in users if uid in self._pending]
+            self._inflight.update(batches)
+        for uid, entry in batches:
+            try:
+                self.memory.apply_batch(uid, entry["messages"], entry["infos"], entry["interactions"])
+            except Exception as e:
+                print(f"Error applying memory batch for {uid}: {e}")
+            with self._lock:
+                self._inflight.pop(uid, None)
+                self._write_journal()
+    
+    def close(self) -> None:
+        """Stop the background worker and flush everything that is buffered."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._lock:
+            if self._journal_lock is not None and not self._pending and not self._inflight:
+                release_lock(self._journal_lock)
+                self._journal_lock = None
+                try:
+                    os.remove(self.journal_file + ".lock")
+                except OSError:
+                    pass
+    
+    def _new_entry(self) -> Dict:
+        return {"messages": [], "infos": [], "interactions": 0, "last_seen": time.time()}
+    
+    def _ensure_worker(self) -> None:
+        if self._worker is None and not self._closed:
+            self._worker = threading.Thread(target=self._run, name="memory-batcher", daemon=True)
+            self._worker.start()
+    
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(timeout=min(self.idle_seconds, 5.0))
+            self._wake.clear()
+            now = time.time()
+            with self._lock:
+                ready = [
+                    uid
+                    for uid, entry in self._pending.items()
+                    if len(entry["messages"]) >= self.max_batch or now - entry["last_seen"] >= self.idle_seconds
+                ]
+            for uid in ready:
+                self.flush(uid)
+    
+    def _write_journal(self) -> None:
+        """Persist pending and in-flight batches; caller must hold the lock."""
+        rows = [[uid, entry] for uid, entry in self._inflight.items()]
+        rows += [[uid, entry] for uid, entry in self._pending.items()]
+        try:
+            if rows:
+                atomic_write(json.dumps(rows), self.journal_file)
+            elif os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        except Exception as e:
+            print(f"Error writing memory batch journal: {e}")
+    
+    def _load_journal(self) -> None:
+        """Re-queue batches left over by previous runs or dead workers."""
+        adopted = []
+        for path in sorted(glob.glob(self.journal_pattern)):
+            if path == self.journal_file:
+                continue
+            fd = try_lock(path)
+            if fd is None:
+                continue  # owned by a live worker
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    rows = json.load(f)
+                for uid, entry in rows:
+                    pending = self._pending.setdefault(uid, self._new_entry())
+                    pending["messages"].extend(entry.get("messages", []))
+                    pending["infos"].extend(entry.get("infos", []))
+                    pending["interactions"] += entry.get("interactions", 0)
+                adopted.append((path, fd))
+            except Exception as e:
+                print(f"Error reading memory batch journal {path}: {e}")
+                release_lock(fd)
+        for lock_path in glob.glob(self.journal_pattern + ".lock"):
+            # Lock files of workers that exited (or crashed) with nothing journaled
+            journal = lock_path[: -len(".lock")]
+            if journal == self.journal_file or os.path.exists(journal):
+                continue
+            fd = try_lock(journal)
+            if fd is not None:
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                release_lock(fd)
+        if self._pending:
+            # Journal adopted batches under our own name before dropping the old files
+            with self._lock:
+                self._write_journal()
+        for path, fd in adopted:
+            try:
+                os.remove(path)
+                os.remove(path + ".lock")
+            except OSError:
+                pass
+            release_lock(fd)
+        if self._pending:
+            # Replayed batches are due immediately
+            for entry in self._pending.values():
+                entry["last_seen"] = 0.0
+            self._ensure_worker()
+            self._wake.set()
@@ -0,0 +1,55 @@
+"""In-process counters and timing samples exposed via the /metrics endpoint."""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    """Increment a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float) -> None:
+    """Record a sample (latency, token count, ...) under a name."""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            _timings[name] = {"count": 1, "total": value, "min": value, "max": value}
+            return
+        stats["count"] += 1
+        stats["total"] += value
+        stats["min"] = min(stats["min"], value)
+        stats["max"] = max(stats["max"], value)
+
+
+@contextmanager
+def timed(name: str):
+    """Context manager that observes elapsed milliseconds under a name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000.0)
+
+
+def snapshot() -> Dict:
+    """Return a copy of all counters and sample summaries."""
+    with _lock:
+        samples = {}
+        for name, stats in _timings.items():
+            samples[name] = dict(stats, avg=stats["total"] / stats["count"])
+        return {"counters": dict(_counters), "samples": samples}
+
+
+def reset() -> None:
+    """Clear all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _timings.clear()
@@ -0,0 +1,145 @@
+"""
+Speculative prefetch of likely follow-up generations.
+
+After a lecture is generated, its follow-ups (slides, simplify, expand) are
+queued here. A background thread generates them section by section while no
+interactive generation is running, and stores each output under
+"prefetch:<namespace>" in the generation cache with a short TTL. The
+follow-up endpoints look there before calling the model (see
+incremental_generation.generate_sections).
+
+Interactive traffic always wins: prefetch waits while anything interactive is
+running and aborts an in-flight generation as soon as an interactive one
+starts; the interrupted follow-up is retried later from where it stopped,
+up to MAX_YIELDS times.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from generation_cache import GenerationCache, prompt_key
+from llm_client import GenerationCancelled
+
+PREFIX = "prefetch:"
+# Times a follow-up may be interrupted by interactive work before it is dropped
+MAX_YIELDS = 5
+
+
+def prefetch_namespace(namespace: str) -> str:
+    """Cache namespace holding speculative outputs for `namespace`."""
+    return PREFIX + namespace
+
+
+class Prefetcher:
+    """Idle-time background generator of follow-up sections."""
+
+    def __init__(
+        self,
+        cache: GenerationCache,
+        generate: Callable[[str, str, Callable[[], bool]], str],
+        is_busy: Callable[[], bool],
+        model_for: Callable[[str], str],
+        ttl: float = 1800,
+        max_pending: int = 8,
+        idle_poll: float = 0.5,
+    ):
+        self.cache = cache
+        self.generate = generate
+        self.is_busy = is_busy
+        # Model a generation profile routes to; part of the cache key, as in generate_sections
+        self.model_for = model_for
+        self.ttl = ttl
+        self.idle_poll = idle_poll
+        # Newest first: the lecture just generated is the likeliest to be followed up
+        self._pending: deque = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def schedule(self, namespace: str, prompts: List[str], profile: str) -> None:
+        """Queue speculative generation of `prompts` for a follow-up endpoint, using its generation profile."""
+        model = self.model_for(profile)
+        items = [(prompt, prompt_key(model, prompt)) for prompt in prompts]
+        with self._lock:
+            self._pending.appendleft({"namespace": namespace, "items": items, "profile": profile})
+        metrics.incr("prefetch.scheduled", len(items))
+        self._ensure_worker()
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        """Queue depth plus hit rate of follow-up sections served from prefetch."""
+        counters = metrics.snapshot()["counters"]
+        hits = counters.get("prefetch.hit", 0)
+        misses = counters.get("prefetch.miss", 0)
+        with self._lock:
+            pending = sum(len(task["items"]) for task in self._pending)
+        return {
+            "pending_sections": pending,
+            "generated": counters.get("prefetch.generated", 0),
+            "yielded": counters.get("prefetch.yielded", 0),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None and not self._stopped:
+            self._worker = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            with self._lock:
+                task = self._pending.popleft() if self._pending else None
+            if task is None:
+                self._wake.wait(timeout=5.0)
+                self._wake.clear()
+                continue
+            self._process(task)
+
+    def _wait_idle(self) -> bool:
+        while self.is_busy():
+            if self._stopped:
+                return False
+            time.sleep(self.idle_poll)
+        return not self._stopped
+
+    def _process(self, task: Dict) -> None:
+        namespace = task["namespace"]
+        items = task["items"]
+        for index, (prompt, key) in enumerate(items):
+            if self.cache.get(namespace, key) or self.cache.get(prefetch_namespace(namespace), key):
+                continue
+            if not self._wait_idle():
+                return
+            try:
+                output = self.generate(prompt, task["profile"], self.is_busy)
+            except GenerationCancelled as e:
+                if e.reason != "prefetch_yield":
+                    # Deadline: the same prompt would time out again, so skip it
+                    metrics.incr("prefetch.errors")
+                    continue
+                # Interactive work started: give the model up, resume this task later
+                metrics.incr("prefetch.yielded")
+                yields = task.get("yields", 0) + 1
+                if yields >= MAX_YIELDS:
+                    metrics.incr("prefetch.dropped", len(items) - index)
+                    return
+                with self._lock:
+                    self._pending.appendleft({**task, "items": items[index:], "yields": yields})
+                return
+            except Exception as e:
+                metrics.incr("prefetch.errors")
+                print(f"Prefetch failed: {e}")
+                continue
+            if output:
+                self.cache.put(prefetch_namespace(namespace), key, output, ttl=self.ttl)
+                metrics.incr("prefetch.generated")
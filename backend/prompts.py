@@ -5,7 +5,8 @@ All prompts are designed to work with local LLMs via Ollama and should
 produce consistent, cleanly formatted outputs for university instructors.
 """
 
-from typing import Literal
+import re
+from typing import List, Literal, Optional
 
 
 Difficulty = Literal["beginner", "intermediate", "advanced"]
@@ -91,8 +92,12 @@ def adjust_content_prompt(text: str, action: Literal["simplify", "expand"]) -> s
     )
 
 
-def grading_prompt(question: str, answer: str, is_code: bool) -> str:
-    """Prompt to generate a suggested grade and concise feedback."""
+def grading_prompt(question: str, answer: str, is_code: bool, static_findings: Optional[List[str]] = None) -> str:
+    """Prompt to generate a suggested grade and concise feedback.
+
+    `static_findings` are issues already verified by a local static check of
+    the code; the model is told not to re-derive them.
+    """
     code_note = (
         "Focus on code correctness, common errors, and best practices."
         if is_code
@@ -100,6 +105,14 @@ def grading_prompt(question: str, answer: str, is_code: bool) -> str:
     )
     q = question.strip()
     a = answer.strip()
+    static_block = ""
+    if static_findings is not None:
+        listed = "\n".join(f"- {finding}" for finding in static_findings) or "- none (the code parses cleanly)"
+        static_block = (
+            "STATIC_ANALYSIS (verified locally):\n"
+            f"{listed}\n"
+            "Do not re-check syntax or style; judge whether the logic answers the question.\n\n"
+        )
     return (
         f"{system_preamble()}\n\n"
         "TASK: Grade a student's response to a university-level CS question and provide concise, constructive feedback.\n\n"
@@ -110,6 +123,7 @@ def grading_prompt(question: str, answer: str, is_code: bool) -> str:
         f"- {code_note}\n\n"
         f"QUESTION:\n{q}\n\n"
         f"STUDENT_RESPONSE:\n{a}\n\n"
+        f"{static_block}"
         "OUTPUT JSON SCHEMA:\n"
         "{\n"
         "  \"grade\": 0-100,\n"
@@ -148,11 +162,79 @@ def quiz_prompt(topic: str, difficulty: Difficulty, num_questions: int, qtype: L
     )
 
 
+def quiz_json_prompt(
+    topic: str,
+    difficulty: Difficulty,
+    num_questions: int,
+    qtype: Literal["mcq", "short"],
+    focus: str = "",
+    avoid: Optional[List[str]] = None,
+) -> str:
+    """Prompt to generate quiz questions as a JSON array for validation and merging."""
+    type_text = "Multiple Choice" if qtype == "mcq" else "Short Answer"
+    t = topic.strip()
+    focus_line = f"- Focus this set on: {focus}\n" if focus else ""
+    avoid_block = ""
+    if avoid:
+        listed = "\n".join(f"- {q}" for q in avoid)
+        avoid_block = f"DO NOT REPEAT THESE EXISTING QUESTIONS:\n{listed}\n\n"
+    item_schema = (
+        "  {\"question\": \"string\", \"options\": {\"A\": \"string\", \"B\": \"string\", \"C\": \"string\", \"D\": \"string\"}, "
+        "\"answer\": \"A-D\", \"rationale\": \"string\"}\n"
+        if qtype == "mcq"
+        else "  {\"question\": \"string\", \"answer\": \"concise expected answer\", \"rationale\": \"string\"}\n"
+    )
+    return (
+        f"{system_preamble()}\n\n"
+        f"TASK: Generate exactly {num_questions} {type_text} questions for university students on the topic below.\n\n"
+        f"REQUIREMENTS:\n"
+        f"- Difficulty: {difficulty.capitalize()}\n"
+        f"{focus_line}"
+        "- Each question must be distinct and self-contained\n"
+        "- Output JSON only: a single array, no Markdown and no commentary\n\n"
+        f"{avoid_block}"
+        f"TOPIC:\n{t}\n\n"
+        "OUTPUT JSON SCHEMA:\n"
+        "[\n"
+        f"{item_schema}"
+        "]\n"
+    )
+
+
+def flashcards_json_prompt(text: str, num_cards: int) -> str:
+    """Prompt to generate flashcards from source text as a JSON array."""
+    src = text.strip()
+    return (
+        f"{system_preamble()}\n\n"
+        f"TASK: Create exactly {num_cards} flashcards for students based on the text below. Make them clear and memorable.\n\n"
+        "REQUIREMENTS:\n"
+        "- One fact or concept per card\n"
+        "- Output JSON only: a single array, no Markdown and no commentary\n\n"
+        f"TEXT:\n{src}\n\n"
+        "OUTPUT JSON SCHEMA:\n"
+        "[\n"
+        "  {\"front\": \"question or term\", \"back\": \"answer or definition\"}\n"
+        "]\n"
+    )
+
+
 # -------- Additional prompts for Admin Tools, Ideas, Help --------
 
-def admin_prompt(template: str, variables: dict) -> str:
-    """Prompt for admin templates: reminder email, course summary, grading rubric."""
+def admin_prompt(template: str, variables: dict, placeholders: Optional[List[str]] = None) -> str:
+    """Prompt for admin templates: reminder email, course summary, grading rubric.
+
+    With `placeholders`, the output is a reusable template: each {{field}} is
+    kept verbatim so it can be filled in per recipient afterwards.
+    """
     base = system_preamble()
+    if placeholders:
+        tokens = ", ".join("{{" + name + "}}" for name in placeholders)
+        base += (
+            "\n\nThis text is a TEMPLATE that will be filled in separately for each recipient. "
+            f"Use these placeholders verbatim wherever their value belongs: {tokens}. "
+            "Do not invent values for them, do not add other placeholders, and address the "
+            "recipient individually (e.g. 'Dear {{name}},') rather than as a group when a name placeholder exists."
+        )
     if template == "reminder_email":
         subject = variables.get("subject", "Assignment")
         due = variables.get("due", "the due date")
@@ -192,6 +274,18 @@ def admin_prompt(template: str, variables: dict) -> str:
     return base
 
 
+def personalization_prompt(field: str, hint: str, recipient: dict) -> str:
+    """Prompt for one short personalized passage inside a batch-rendered template."""
+    details = "\n".join(f"- {k}: {v}" for k, v in recipient.items() if k != field and v not in (None, ""))
+    return (
+        f"{system_preamble()}\n\n"
+        f"Write 1-2 sentences to insert into a message to one student (field: {field}).\n"
+        f"What to address: {hint}\n"
+        f"Recipient details:\n{details or '- (none)'}\n\n"
+        "Be warm and specific. Output ONLY the sentences, with no greeting, sign-off or quotes."
+    )
+
+
 def ideas_prompt(topic: str, level: Difficulty, variations: bool) -> str:
     """Prompt to generate project or lab ideas."""
     t = topic.strip()
@@ -219,13 +313,49 @@ def help_prompt(question: str) -> str:
     )
 
 
-def chat_prompt(message: str, history: list = None) -> str:
-    """Prompt for conversational chat with context awareness."""
+DEFAULT_FILE_REQUEST = (
+    "Please analyze this file and provide a comprehensive summary of its content, "
+    "including key topics, main concepts, and important points."
+)
+
+
+# Budget for file excerpts in follow-ups once the whole file has been analyzed
+FOLLOWUP_EXCERPT_CHARS = 1200
+
+
+def _document_excerpts(text: str, question: str, budget: int = FOLLOWUP_EXCERPT_CHARS) -> str:
+    """Paragraphs of `text` sharing words with `question`, in document order, within `budget` chars.
+
+    Falls back to the opening of the file when nothing matches (e.g. "summarize it again").
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    words = set(re.findall(r"\w{3,}", question.lower()))
+    scores = [len(words & set(re.findall(r"\w{3,}", p.lower()))) for p in paragraphs]
+    ranked = sorted((i for i, score in enumerate(scores) if score), key=lambda i: -scores[i])
+    chosen, used = [], 0
+    for i in ranked or range(len(paragraphs)):
+        if used + len(paragraphs[i]) <= budget:
+            chosen.append(i)
+            used += len(paragraphs[i])
+    if not chosen:
+        return text.strip()[:budget]
+    return "\n\n".join(paragraphs[i] for i in sorted(chosen))
+
+
+def chat_prompt(
+    message: str, history: list = None, document: Optional[dict] = None, document_in_history: bool = False
+) -> str:
+    """Prompt for conversational chat with context awareness.
+
+    `document` ({"name", "text"}) is an uploaded file the conversation is about.
+    With `document_in_history` the file was already analyzed in an earlier turn,
+    so only a reference and the excerpts relevant to the message are included.
+    """
     msg = message.strip()
     context = ""
     
-    # Check if this is a file upload (contains "File:" and "Extracted content:")
-    is_file_upload = "File:" in msg and "Extracted content:" in msg
+    # Older clients inline the file in the message ("File:" and "Extracted content:")
+    is_file_upload = document is not None or ("File:" in msg and "Extracted content:" in msg)
     
     if history and len(history) > 0:
         context = "CONVERSATION HISTORY:\n"
@@ -236,7 +366,7 @@ def chat_prompt(message: str, history: list = None) -> str:
         context += "\n"
     
     if is_file_upload:
-        return (
+        preamble = (
             "You are StudyMind AI, an intelligent study companion. "
             "A student has uploaded a file and you need to analyze its content.\n\n"
             "INSTRUCTIONS:\n"
@@ -246,6 +376,28 @@ def chat_prompt(message: str, history: list = None) -> str:
             "4. Identify key concepts, main topics, and important points\n"
             "5. Use markdown formatting for better readability\n"
             "6. Be specific and reference actual content from the file\n\n"
+        )
+        if document is not None and document_in_history:
+            excerpts = _document_excerpts(document["text"], msg)
+            return (
+                f"{preamble}"
+                f"FILE: {document['name']} (analyzed earlier in this conversation)\n\n"
+                f"RELEVANT EXCERPTS:\n{excerpts}\n\n"
+                f"{context}"
+                f"USER REQUEST: {msg or DEFAULT_FILE_REQUEST}\n\n"
+                "YOUR ANALYSIS:"
+            )
+        if document is not None:
+            # File before history: follow-ups about the same file share the prompt prefix
+            return (
+                f"{preamble}"
+                f"FILE: {document['name']}\n\nFILE CONTENT:\n{document['text'].strip()}\n\n"
+                f"{context}"
+                f"USER REQUEST: {msg or DEFAULT_FILE_REQUEST}\n\n"
+                "YOUR ANALYSIS:"
+            )
+        return (
+            f"{preamble}"
             f"{context}"
             f"FILE CONTENT AND USER REQUEST:\n{msg}\n\n"
             "YOUR ANALYSIS:"
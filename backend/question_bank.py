@@ -0,0 +1,449 @@
+"""
+Precomputed question and flashcard bank built from uploaded documents.
+
+After an upload, a background worker splits the document into sections and
+generates questions and flashcards for each one. Items are stored in SQLite,
+tagged by topic, difficulty and type, so /quiz and the flashcards task of
+/generate can be served without a model call when coverage is sufficient.
+
+Builds run at background priority: they wait while interactive generations
+run and give up an in-flight generation when one starts, retrying it once
+the model is idle again. Progress is recorded per section, so a build cut
+short by a restart resumes where it stopped.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from interprocess import release_lock, try_lock
+from llm_client import GenerationCancelled
+from prompts import flashcards_json_prompt, quiz_json_prompt
+from quiz_generator import QuizQuestion, parse_questions, question_key
+
+SECTION_CHARS = 3000
+QUESTIONS_PER_SECTION = 5
+FLASHCARDS_PER_SECTION = 6
+BANK_DIFFICULTIES = ("beginner", "intermediate", "advanced")
+BANK_QUESTION_TYPES = ("mcq", "short")
+# Topic matches (no document given) need this many topic terms, all found in the section
+MIN_TOPIC_TERMS = 2
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the their this to was "
+    "were will with which what when where how why who can use using used page about these those than then "
+    "there such also not but all any each more most other some".split()
+)
+
+_HEADING = re.compile(r"^#{1,3}\s+(.+)$", re.MULTILINE)
+_PAGE_MARKER = re.compile(r"^--- Page \d+ ---$", re.MULTILINE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    content_hash TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    owner TEXT,
+    text TEXT,
+    sections INTEGER NOT NULL DEFAULT 0,
+    built INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_name ON documents(name);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL,
+    section INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    UNIQUE (document_id, kind, difficulty, item_key)
+);
+CREATE INDEX IF NOT EXISTS idx_items_lookup ON items(document_id, kind, difficulty);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    document_id INTEGER NOT NULL,
+    section INTEGER NOT NULL,
+    PRIMARY KEY (term, document_id, section)
+);
+"""
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of document text used to recognise re-sent content."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def keywords(text: str, limit: Optional[int] = None) -> List[str]:
+    """Lower-cased content words, most frequent first."""
+    words = [w for w in re.findall(r"[a-z][a-z0-9+#-]{2,}", text.lower()) if w not in STOPWORDS]
+    return [w for w, _ in Counter(words).most_common(limit)]
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split a document into (topic, body) sections of roughly SECTION_CHARS."""
+    text = text.strip()
+    if not text:
+        return []
+
+    headings = list(_HEADING.finditer(text))
+    if headings:
+        blocks = []
+        for i, match in enumerate(headings):
+            end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+            blocks.append((match.group(1).strip(), text[match.start():end].strip()))
+        if headings[0].start() > 0 and text[: headings[0].start()].strip():
+            blocks.insert(0, ("Introduction", text[: headings[0].start()].strip()))
+    else:
+        parts = _PAGE_MARKER.split(text) if _PAGE_MARKER.search(text) else text.split("\n\n")
+        blocks = [("", part.strip()) for part in parts if part.strip()]
+
+    # Merge small neighbouring blocks so each section is worth a generation
+    sections: List[Tuple[str, str]] = []
+    for topic, body in blocks:
+        if sections and len(sections[-1][1]) + len(body) <= SECTION_CHARS:
+            prev_topic, prev_body = sections[-1]
+            sections[-1] = (prev_topic or topic, f"{prev_body}\n\n{body}")
+        else:
+            sections.append((topic, body[: SECTION_CHARS * 2]))
+    return [(topic or " ".join(keywords(body, 4)) or "General", body) for topic, body in sections]
+
+
+def parse_flashcards(raw: str) -> List[Dict[str, str]]:
+    """Parse and validate a JSON array of {front, back} flashcards."""
+    start = raw.find("[")
+    end = raw.rfind("]")
+    if start == -1 or end <= start:
+        return []
+    try:
+        items = json.loads(raw[start : end + 1])
+    except json.JSONDecodeError:
+        return []
+    cards = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and str(item.get("front", "")).strip() and str(item.get("back", "")).strip():
+            cards.append({"front": str(item["front"]).strip(), "back": str(item["back"]).strip()})
+    return cards
+
+
+def render_flashcards(cards: List[Dict[str, str]]) -> str:
+    """Render flashcards in the Q&A text format of the flashcards task."""
+    return "\n\n".join(f"**Q{i}:** {c['front']}\n**A{i}:** {c['back']}" for i, c in enumerate(cards, 1))
+
+
+class _BuildStopped(Exception):
+    """The bank is closing; a build in progress stops and is resumed by the next process."""
+
+
+class QuestionBank:
+    """SQLite-backed store of pre-generated questions and flashcards."""
+
+    def __init__(
+        self,
+        db_path: str,
+        generate: Callable[[str, Callable[[], bool]], str],
+        is_busy: Callable[[], bool] = lambda: False,
+        max_workers: int = 1,
+        idle_poll: float = 0.5,
+    ):
+        """`generate(prompt, should_cancel)` must abort with GenerationCancelled once `should_cancel()` is true."""
+        self.db_path = db_path
+        self.generate = generate
+        self.is_busy = is_busy
+        self.idle_poll = idle_poll
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="question-bank")
+        # Builds are tagged with their process; its lock file shows the process is still alive
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._owner_lock = try_lock(self._owner_path(self.owner))
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(documents)")}
+            for column, ddl in (("owner", "owner TEXT"), ("text", "text TEXT"), ("built", "built INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {ddl}")
+            # Builds of exited processes are interrupted; other live workers' builds are left alone
+            live = self._sweep_dead_owners()
+            conn.execute(
+                "UPDATE documents SET status = 'interrupted' WHERE status IN ('pending', 'building') "
+                f"AND (owner IS NULL OR owner NOT IN ({','.join('?' for _ in live)}))",
+                live,
+            )
+        self._resume_interrupted()
+
+    def _resume_interrupted(self) -> None:
+        """Claim interrupted builds (one worker wins each) and continue them from their last built section."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, content_hash FROM documents WHERE status = 'interrupted' AND text IS NOT NULL"
+            ).fetchall()
+        for row in rows:
+            with self._connect() as conn:
+                claimed = conn.execute(
+                    "UPDATE documents SET status = 'pending', owner = ? WHERE id = ? AND status = 'interrupted'",
+                    (self.owner, row["id"]),
+                ).rowcount
+            if claimed:
+                self._pool.submit(self._build_safely, row["content_hash"])
+
+    def _sweep_dead_owners(self) -> List[str]:
+        """Delete lock files of exited processes; return the owners still alive (this one included)."""
+        live = [self.owner]
+        prefix = os.path.basename(self.db_path) + "."
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        for fname in os.listdir(directory):
+            if not (fname.startswith(prefix) and fname.endswith(".lock")):
+                continue
+            owner = fname[len(prefix) : -len(".lock")]
+            if owner == self.owner or "." in owner:
+                continue
+            fd = try_lock(self._owner_path(owner))
+            if fd is None:
+                live.append(owner)
+                continue
+            release_lock(fd)
+            try:
+                os.remove(os.path.join(directory, fname))
+            except OSError:
+                pass
+        return live
+
+    def _owner_path(self, owner: str) -> str:
+        return f"{self.db_path}.{owner}"
+
+    def close(self) -> None:
+        """Stop accepting builds and release this process's ownership lock."""
+        self._closed = True
+        self._pool.shutdown(wait=False)
+        if self._owner_lock is not None:
+            release_lock(self._owner_lock)
+            self._owner_lock = None
+            try:
+                os.remove(self._owner_path(self.owner) + ".lock")
+            except OSError:
+                pass
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -------- Building --------
+    def schedule_document(self, name: str, text: str) -> None:
+        """Queue a document for background bank generation (no-op if already known).
+
+        Re-uploading a file under the same name with new content replaces the
+        old version's items.
+        """
+        digest = content_hash(text)
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, text FROM documents WHERE content_hash = ?", (digest,)).fetchone()
+            if row and row["status"] in ("pending", "building", "ready"):
+                return
+            resume = bool(row) and row["status"] == "interrupted" and row["text"] is not None
+            if resume:
+                # Same content cut short by a restart: continue from its last built section
+                conn.execute(
+                    "UPDATE documents SET status = 'pending', owner = ?, name = ? WHERE content_hash = ?",
+                    (self.owner, name, digest),
+                )
+            # A failed/interrupted build of this content, or an earlier version of the
+            # same file, is replaced along with its items in one transaction
+            stale = [r["id"] for r in conn.execute(
+                "SELECT id FROM documents WHERE (content_hash = ? AND NOT ?) OR (name = ? AND content_hash != ?)",
+                (digest, resume, name, digest),
+            )]
+            for table in ("items", "terms"):
+                conn.executemany(f"DELETE FROM {table} WHERE document_id = ?", [(doc_id,) for doc_id in stale])
+            conn.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in stale])
+            if not resume:
+                conn.execute(
+                    "INSERT INTO documents (name, content_hash, status, owner, text, created_at) "
+                    "VALUES (?, ?, 'pending', ?, ?, ?)",
+                    (name, digest, self.owner, text, datetime.now().isoformat()),
+                )
+        self._pool.submit(self._build_safely, digest)
+
+    def _build_safely(self, digest: str) -> None:
+        try:
+            self.build_document(digest)
+        except _BuildStopped:
+            pass  # shutting down: the build stays 'building' and is resumed after the restart
+        except Exception as e:
+            print(f"Question bank build failed for {digest[:12]}: {e}")
+            with self._connect() as conn:
+                conn.execute("UPDATE documents SET status = 'failed', text = NULL WHERE content_hash = ?", (digest,))
+
+    def _wait_idle(self) -> None:
+        """Block while interactive generations run; raise _BuildStopped on shutdown."""
+        while self.is_busy():
+            if self._closed:
+                raise _BuildStopped()
+            time.sleep(self.idle_poll)
+        if self._closed:
+            raise _BuildStopped()
+
+    def _generate(self, prompt: str) -> str:
+        """Generate at background priority, yielding the model to interactive work and retrying afterwards."""
+        while True:
+            self._wait_idle()
+            try:
+                return self.generate(prompt, self.is_busy)
+            except GenerationCancelled as e:
+                if e.reason != "bank_yield":
+                    raise
+
+    def build_document(self, digest: str) -> None:
+        """Generate and store bank items for every section of a document not built yet."""
+        with self._connect() as conn:
+            doc = conn.execute("SELECT id, text, built FROM documents WHERE content_hash = ?", (digest,)).fetchone()
+            doc_id = doc["id"]
+            conn.execute("UPDATE documents SET status = 'building' WHERE id = ?", (doc_id,))
+
+        sections = split_sections(doc["text"])
+        for index, (topic, body) in enumerate(sections):
+            if index < doc["built"]:
+                continue
+            rows = []
+            for difficulty in BANK_DIFFICULTIES:
+                for qtype in BANK_QUESTION_TYPES:
+                    raw = self._generate(quiz_json_prompt(body, difficulty, QUESTIONS_PER_SECTION, qtype))  # type: ignore[arg-type]
+                    for q in parse_questions(raw, qtype):
+                        rows.append((doc_id, index, topic, difficulty, qtype, question_key(q), json.dumps(q)))
+            raw = self._generate(flashcards_json_prompt(body, FLASHCARDS_PER_SECTION))
+            for card in parse_flashcards(raw):
+                key = re.sub(r"[^a-z0-9]+", " ", card["front"].lower()).strip()
+                rows.append((doc_id, index, topic, "any", "flashcard", key, json.dumps(card)))
+
+            terms = set(keywords(f"{topic} {body}", 25)) | set(keywords(topic))
+            with self._connect() as conn:
+                if conn.execute("SELECT 1 FROM documents WHERE id = ? AND content_hash = ?", (doc_id, digest)).fetchone() is None:
+                    return  # replaced by a newer version of the file while building
+                conn.executemany(
+                    "INSERT OR IGNORE INTO items (document_id, section, topic, difficulty, kind, item_key, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO terms (term, document_id, section) VALUES (?, ?, ?)",
+                    [(term, doc_id, index) for term in terms],
+                )
+                conn.execute("UPDATE documents SET built = ? WHERE id = ?", (index + 1, doc_id))
+
+        with self._connect() as conn:
+            # The text is only kept to resume an interrupted build
+            conn.execute(
+                "UPDATE documents SET status = 'ready', sections = ?, text = NULL WHERE id = ?", (len(sections), doc_id)
+            )
+        print(f"Question bank ready for document {doc_id} ({len(sections)} sections)")
+
+    # -------- Serving --------
+    def _document_id(self, conn: sqlite3.Connection, name: Optional[str] = None, text: Optional[str] = None) -> Optional[int]:
+        """Ready document by name (the one the caller asked for), else by content."""
+        if name:
+            row = conn.execute(
+                "SELECT id FROM documents WHERE name = ? AND status = 'ready' ORDER BY id DESC LIMIT 1", (name,)
+            ).fetchone()
+        elif text:
+            row = conn.execute(
+                "SELECT id FROM documents WHERE content_hash = ? AND status = 'ready'", (content_hash(text),)
+            ).fetchone()
+        else:
+            row = None
+        return row["id"] if row else None
+
+    def _matching_sections(self, conn: sqlite3.Connection, topic: str) -> List[Tuple[int, int]]:
+        """Sections of one ready document whose terms include every topic term.
+
+        Partial matches are not enough: a section sharing "python" with a topic
+        about Python decorators is about something else. Only the document with
+        the most matching sections is used, so one quiz never mixes uploads.
+        """
+        topic_terms = keywords(topic.strip().splitlines()[0] if topic.strip() else "", 8)
+        if len(topic_terms) < MIN_TOPIC_TERMS:
+            return []
+        placeholders = ",".join("?" for _ in topic_terms)
+        rows = conn.execute(
+            f"SELECT t.document_id, t.section FROM terms t "
+            f"JOIN documents d ON d.id = t.document_id AND d.status = 'ready' "
+            f"WHERE t.term IN ({placeholders}) GROUP BY t.document_id, t.section HAVING COUNT(*) = ?",
+            (*topic_terms, len(topic_terms)),
+        ).fetchall()
+        if not rows:
+            return []
+        best = Counter(r["document_id"] for r in rows).most_common(1)[0][0]
+        return [(r["document_id"], r["section"]) for r in rows if r["document_id"] == best]
+
+    def questions_for(
+        self,
+        qtype: str,
+        difficulty: str,
+        count: int,
+        document: Optional[str] = None,
+        topic: str = "",
+    ) -> Optional[List[QuizQuestion]]:
+        """Return `count` banked questions, or None if coverage is insufficient."""
+        with self._connect() as conn:
+            if document:
+                doc_id = self._document_id(conn, name=document)
+                if doc_id is None:
+                    return None
+                rows = conn.execute(
+                    "SELECT payload FROM items WHERE document_id = ? AND kind = ? AND difficulty = ?",
+                    (doc_id, qtype, difficulty),
+                ).fetchall()
+            else:
+                sections = self._matching_sections(conn, topic)
+                rows = []
+                for doc_id, section in sections:
+                    rows += conn.execute(
+                        "SELECT payload FROM items WHERE document_id = ? AND section = ? AND kind = ? AND difficulty = ?",
+                        (doc_id, section, qtype, difficulty),
+                    ).fetchall()
+        if len(rows) < count:
+            return None
+        return [json.loads(r["payload"]) for r in random.sample(rows, count)]
+
+    def flashcards_for(self, text: Optional[str] = None, document: Optional[str] = None, limit: int = 30) -> Optional[List[Dict[str, str]]]:
+        """Return banked flashcards for a known document, or None if it is not ready."""
+        with self._connect() as conn:
+            doc_id = self._document_id(conn, name=document, text=text)
+            if doc_id is None:
+                return None
+            rows = conn.execute(
+                "SELECT payload FROM items WHERE document_id = ? AND kind = 'flashcard' ORDER BY section, id LIMIT ?",
+                (doc_id, limit),
+            ).fetchall()
+        return [json.loads(r["payload"]) for r in rows] or None
+
+    def status(self, name: str) -> Optional[Dict]:
+        """Return build status and item counts for a document by name."""
+        with self._connect() as conn:
+            doc = conn.execute(
+                "SELECT id, status, sections FROM documents WHERE name = ? ORDER BY id DESC LIMIT 1", (name,)
+            ).fetchone()
+            if doc is None:
+                return None
+            counts = conn.execute(
+                "SELECT kind, COUNT(*) AS n FROM items WHERE document_id = ? GROUP BY kind", (doc["id"],)
+            ).fetchall()
+        return {"status": doc["status"], "sections": doc["sections"], "items": {r["kind"]: r["n"] for r in counts}}
@@ -0,0 +1,162 @@
+"""
+Parallel, structured quiz generation.
+
+Large question counts are split into concurrent sub-generations, each with its
+own focus area, that return JSON. Questions are validated, deduplicated and
+yielded as soon as their sub-generation completes.
+"""
+
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Tuple, TypedDict
+
+from llm_client import GenerationCancelled
+from prompts import Difficulty, quiz_json_prompt
+
+QUESTIONS_PER_CHUNK = 5
+MAX_WORKERS = 4
+
+# Distinct angles so concurrent sub-generations don't produce the same questions
+FOCUS_AREAS = [
+    "core definitions and terminology",
+    "applying the concepts to concrete examples",
+    "common misconceptions and pitfalls",
+    "analysis, comparison and trade-offs",
+    "problem solving and tracing through scenarios",
+]
+
+
+class QuizQuestion(TypedDict, total=False):
+    question: str
+    options: Dict[str, str]
+    answer: str
+    rationale: str
+
+
+def plan_chunks(count: int) -> List[Tuple[int, str]]:
+    """Split a question count into (size, focus) sub-generations."""
+    if count <= QUESTIONS_PER_CHUNK:
+        return [(count, "")]
+    chunks = []
+    remaining = count
+    i = 0
+    while remaining > 0:
+        size = min(QUESTIONS_PER_CHUNK, remaining)
+        chunks.append((size, FOCUS_AREAS[i % len(FOCUS_AREAS)]))
+        remaining -= size
+        i += 1
+    return chunks
+
+
+def _validate(item: Dict, qtype: str) -> Optional[QuizQuestion]:
+    """Return a cleaned question, or None if it does not match the schema."""
+    if not isinstance(item, dict):
+        return None
+    question = str(item.get("question", "")).strip()
+    answer = str(item.get("answer", "")).strip()
+    if not question or not answer:
+        return None
+    result: QuizQuestion = {"question": question, "answer": answer, "rationale": str(item.get("rationale", "")).strip()}
+    if qtype == "mcq":
+        options = item.get("options")
+        if isinstance(options, list) and len(options) == 4:
+            options = dict(zip("ABCD", options))
+        if not isinstance(options, dict):
+            return None
+        options = {str(k).strip().upper()[:1]: str(v).strip() for k, v in options.items()}
+        if sorted(options) != ["A", "B", "C", "D"] or not all(options.values()):
+            return None
+        letter = answer.upper()[:1]
+        if letter not in options:
+            return None
+        result["options"] = {k: options[k] for k in "ABCD"}
+        result["answer"] = letter
+    return result
+
+
+def parse_questions(raw: str, qtype: str) -> List[QuizQuestion]:
+    """Parse and validate a JSON array of questions from model output."""
+    start = raw.find("[")
+    end = raw.rfind("]")
+    if start == -1 or end <= start:
+        return []
+    try:
+        items = json.loads(raw[start : end + 1])
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(items, list):
+        return []
+    return [q for q in (_validate(item, qtype) for item in items) if q]
+
+
+def question_key(question: QuizQuestion) -> str:
+    """Normalized question text used for deduplication."""
+    return re.sub(r"[^a-z0-9]+", " ", question["question"].lower()).strip()
+
+
+def generate_questions(
+    generate: Callable[[str], str],
+    topic: str,
+    difficulty: Difficulty,
+    count: int,
+    qtype: Literal["mcq", "short"],
+) -> Iterator[QuizQuestion]:
+    """Yield up to `count` unique questions as concurrent sub-generations complete.
+
+    `generate` maps a prompt to model output and must be safe to call from
+    worker threads. A single top-up round fills any shortfall left by
+    truncated or invalid sub-generations.
+    """
+    seen = set()
+    asked: List[str] = []
+    produced = 0
+    for attempt in range(2):
+        needed = count - produced
+        if needed <= 0:
+            return
+        avoid = asked[:count] if attempt > 0 else None
+        chunks = plan_chunks(needed)
+        pool = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(chunks)))
+        try:
+            futures = [
+                pool.submit(generate, quiz_json_prompt(topic, difficulty, size, qtype, focus, avoid))
+                for size, focus in chunks
+            ]
+            for future in as_completed(futures):
+                try:
+                    raw = future.result()
+                except GenerationCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Quiz sub-generation failed: {e}")
+                    continue
+                for question in parse_questions(raw, qtype):
+                    key = question_key(question)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    asked.append(question["question"])
+                    produced += 1
+                    yield question
+                    if produced >= count:
+                        return
+        finally:
+            # Stop queued sub-generations if the consumer went away or we have enough
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_markdown(questions: List[QuizQuestion], qtype: str) -> str:
+    """Render questions in the Markdown layout used by quiz_prompt."""
+    lines = ["## Questions"]
+    for i, q in enumerate(questions, 1):
+        lines.append(f"{i}. {q['question']}")
+        if qtype == "mcq":
+            for letter, text in q.get("options", {}).items():
+                lines.append(f"   {letter}. {text}")
+        lines.append("")
+    lines.append("## Answer Key")
+    for i, q in enumerate(questions, 1):
+        rationale = f" - {q['rationale']}" if q.get("rationale") else ""
+        lines.append(f"{i}. {q['answer']}{rationale}")
+    return "\n".join(lines).strip() + "\n"
@@ -0,0 +1,176 @@
+"""
+Full-text search over saved outputs and uploaded documents.
+
+An SQLite FTS5 inverted index under the data directory. Files are indexed as
+they are written (saved lectures, admin batches, uploads), and `sync` picks up
+anything written or deleted behind the server's back by comparing file size
+and mtime, so only changed files are re-read. Queries are ranked with BM25 and
+return highlighted snippets.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    name, body, tokenize = 'porter unicode61'
+);
+"""
+
+# Saved outputs that sync reads from disk; other indexed files (PDF uploads)
+# are only indexed with the text extracted at upload time.
+TEXT_EXTENSIONS = (".md", ".txt")
+MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 24
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and any are did do does for from has have how i in is it of on or that the this to was were what "
+    "when where which who why with".split()
+)
+
+
+def match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching any of its words (None if no words).
+
+    BM25 ranks documents containing more of the words first, so questions like
+    "which lecture covered recursion" work without exact phrasing.
+    """
+    terms = [t for t in _TERM.findall(query.lower()) if t not in _STOPWORDS] or _TERM.findall(query.lower())
+    if not terms:
+        return None
+    # Quoted terms cannot be read as FTS5 operators (AND, NEAR, column filters)
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+class SearchIndex:
+    """Incremental inverted index of the text files in `data_dir`."""
+
+    def __init__(self, db_path: str, data_dir: str):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def index_file(self, name: str, text: str, kind: str = "output") -> None:
+        """Add or replace the indexed text of data file `name`."""
+        path = os.path.join(self.data_dir, name)
+        try:
+            st = os.stat(path)
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size, mtime = len(text), time.time()
+        with self._connect() as conn:
+            self._replace(conn, name, text, kind, size, mtime)
+
+    def _replace(self, conn: sqlite3.Connection, name: str, text: str, kind: str, size: int, mtime: float) -> None:
+        # Insert first: it takes the write lock, so concurrent indexers of the same name serialize
+        conn.execute(
+            "INSERT OR IGNORE INTO documents (name, kind, size, mtime, indexed_at) VALUES (?, ?, ?, ?, ?)",
+            (name, kind, size, mtime, time.time()),
+        )
+        doc_id = conn.execute("SELECT id FROM documents WHERE name = ?", (name,)).fetchone()[0]
+        conn.execute(
+            "UPDATE documents SET kind = ?, size = ?, mtime = ?, indexed_at = ? WHERE id = ?",
+            (kind, size, mtime, time.time(), doc_id),
+        )
+        conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+        conn.execute("INSERT INTO documents_fts (rowid, name, body) VALUES (?, ?, ?)", (doc_id, name, text))
+
+    def remove(self, name: str) -> None:
+        with self._connect() as conn:
+            self._delete(conn, name)
+
+    def _delete(self, conn: sqlite3.Connection, name: str) -> None:
+        row = conn.execute("SELECT id FROM documents WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+    def sync(self) -> Tuple[int, int]:
+        """Index new or changed text files and drop deleted ones; returns (indexed, removed)."""
+        with self._connect() as conn:
+            known = {row[0]: row[1:] for row in conn.execute("SELECT name, size, mtime, kind FROM documents")}
+        on_disk: Dict[str, os.stat_result] = {}
+        try:
+            with os.scandir(self.data_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        on_disk[entry.name] = entry.stat()
+        except OSError as e:
+            print(f"Search index sync failed: {e}")
+            return 0, 0
+
+        indexed = removed = 0
+        with self._connect() as conn:
+            for name in known:
+                if name not in on_disk:
+                    self._delete(conn, name)
+                    removed += 1
+            for name, st in on_disk.items():
+                previous = known.get(name)
+                if not name.endswith(TEXT_EXTENSIONS) or (previous and previous[:2] == (st.st_size, st.st_mtime)):
+                    continue
+                try:
+                    with open(os.path.join(self.data_dir, name), "r", encoding="utf-8", errors="ignore") as f:
+                        text = f.read()
+                except OSError:
+                    continue
+                kind = previous[2] if previous else "output"
+                self._replace(conn, name, text, kind, st.st_size, st.st_mtime)
+                indexed += 1
+        return indexed, removed
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> Dict:
+        """Rank documents matching `query`; one page of results with snippets."""
+        page = max(1, page)
+        page_size = max(1, min(MAX_PAGE_SIZE, page_size))
+        fts_query = match_query(query)
+        if fts_query is None:
+            return {"query": query, "total": 0, "page": page, "page_size": page_size, "results": []}
+        with self._connect() as conn:
+            total = conn.execute("SELECT count(*) FROM documents_fts WHERE documents_fts MATCH ?", (fts_query,)).fetchone()[0]
+            rows = conn.execute(
+                """
+                SELECT d.name, d.kind, d.mtime, bm25(documents_fts) AS rank,
+                       snippet(documents_fts, 1, '**', '**', '…', ?)
+                FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+                """,
+                (SNIPPET_TOKENS, fts_query, page_size, (page - 1) * page_size),
+            ).fetchall()
+        return {
+            "query": query,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "results": [
+                # bm25() is lower-is-better; flip it so higher scores rank first
+                {"name": name, "kind": kind, "modified": mtime, "score": round(-rank, 4), "snippet": snippet}
+                for name, kind, mtime, rank, snippet in rows
+            ],
+        }
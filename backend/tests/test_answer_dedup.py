@@ -0,0 +1,56 @@
+import pytest
+
+from answer_dedup import AnswerIndex, normalize_answer
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ('s.split("#")[0]', 's.split("#")[1]'),
+        ('x = "a  b"', 'x = "a b"'),
+        ("msg = 'no # comment here'", "msg = 'no '"),
+        ("#include <stdio.h>\nint main() { return 0; }", "#include <stdlib.h>\nint main() { return 0; }"),
+    ],
+)
+def test_distinct_code_does_not_collide(first, second):
+    assert normalize_answer(first, True) != normalize_answer(second, True)
+
+
+def test_formatting_and_comments_are_ignored():
+    a = "def f(x):\n    return x+1  # add one\n"
+    b = "def f( x ):\n\n    # comment line\n    return x + 1\n"
+    assert normalize_answer(a, True) == normalize_answer(b, True)
+
+
+def test_indentation_is_kept():
+    a = "for i in r:\n    f(i)\n    g(i)\n"
+    b = "for i in r:\n    f(i)\ng(i)\n"
+    assert normalize_answer(a, True) != normalize_answer(b, True)
+
+
+def test_exact_threshold_does_not_reuse_string_variant(tmp_path):
+    index = AnswerIndex(str(tmp_path / "answers.sqlite3"))
+    index.add("Split on hash", 'def f(s):\n    return s.split("#")[0]\n', True, {"grade": 100})
+    assert index.find("Split on hash", 'def f(s):\n    return s.split("#")[1]\n', True, 1.0) is None
+    match = index.find("Split on hash", 'def f(s):  # first part\n    return s.split("#")[0]\n', True, 1.0)
+    assert match is not None and match[0]["grade"] == 100
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [("x < y", "x > y"), ("-5", "5"), ("2+3", "2*3"), ("O(n^2)", "O(n)^2")],
+)
+def test_distinct_prose_does_not_collide(first, second):
+    assert normalize_answer(first, False) != normalize_answer(second, False)
+
+
+def test_prose_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_answer("  The Stack is  LIFO. ", False) == normalize_answer("the stack is lifo", False)
+
+
+def test_prose_operator_variant_does_not_reuse_grade(tmp_path):
+    index = AnswerIndex(str(tmp_path / "answers.sqlite3"))
+    index.add("Which is smaller?", "x < y", False, {"grade": 100})
+    assert index.find("Which is smaller?", "x > y", False, 0.9) is None
+    match = index.find("Which is smaller?", "X < Y.", False, 0.9)
+    assert match is not None and match[0]["grade"] == 100
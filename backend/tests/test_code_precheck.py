@@ -0,0 +1,34 @@
+import pytest
+
+from code_precheck import analyze, local_grade
+
+
+def test_uniformly_indented_code_parses():
+    report = analyze("    def add(a, b):\n        return a + b")
+    assert report["syntax_error"] is None and local_grade(report) is None
+
+
+@pytest.mark.parametrize(
+    "answer",
+    ["if the list is empty we return None otherwise we sort it", "for each item: add it to total\nreturn total"],
+)
+def test_keyword_prose_goes_to_the_model(answer):
+    report = analyze(answer)
+    assert local_grade(report) is None
+    assert report["findings"][0].startswith("Does not parse as Python")
+
+
+def test_broken_python_program_is_graded_locally():
+    result = local_grade(analyze("def f(x):\n    return x +\n"))
+    assert result["grade"] == 0
+
+
+@pytest.mark.parametrize("call", ["sys.exit(0)", "exit()", "os._exit(1)"])
+def test_exit_call_ends_while_true(call):
+    report = analyze(f"import os\nimport sys\nwhile True:\n    {call}\n")
+    assert not any("Infinite loop" in finding for finding in report["findings"])
+
+
+def test_future_import_is_not_unused():
+    report = analyze("from __future__ import annotations\n\ndef f(x: int) -> int:\n    return x\n")
+    assert report["findings"] == []
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import llm_client
+from llm_backends import OllamaBackend, OpenAICompatibleBackend, get_backend
+
+
+def _sse(*events):
+    return [b"data: " + (e if isinstance(e, bytes) else json.dumps(e).encode()) for e in events]
+
+
+def _delta(text, finish_reason=None):
+    return {"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": finish_reason}]}
+
+
+USAGE_CHUNK = {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+
+
+class _FakeServer(BaseHTTPRequestHandler):
+    """Streams `server.lines` after `server.delay` seconds, then stalls `server.stall` seconds before ending.
+
+    Requests are recorded in `server.requests`.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.requests.append((self.path, dict(self.headers), json.loads(self.rfile.read(length))))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if "/v1/" in self.path else "application/x-ndjson")
+        # Chunked and kept alive like Ollama and vLLM, so each line reaches the client as it is written
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.delay)
+        for line in self.server.lines:
+            data = line + b"\n\n" if line.startswith(b"data:") else line + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        time.sleep(self.server.stall)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeServer)
+    server.daemon_threads = True
+    server.lines, server.requests, server.delay, server.stall = [], [], 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _stream(backend, server):
+    url, body, headers = backend.request("m", "hi", {"temperature": 0.1, "options": {}, "format": None})
+    resp = requests.post(url, json=body, headers=headers, stream=True, timeout=5)
+    resp.raise_for_status()
+    return list(backend.parse_stream(resp.iter_lines()))
+
+
+def test_openai_stream_with_usage_chunk_and_done(fake_server):
+    fake_server.lines = _sse(_delta("Hel"), _delta("lo", "stop"), USAGE_CHUNK, b"[DONE]")
+    backend = OpenAICompatibleBackend(_base_url(fake_server) + "/v1", api_key="secret")
+    events = _stream(backend, fake_server)
+    assert "".join(text for text, _ in events) == "Hello"
+    assert [usage for _, usage in events[:-1]] == [None, None]
+    assert events[-1][1] == {"output_tokens": 3, "prompt_tokens": 12, "truncated": False, "generation_seconds": None}
+    path, headers, body = fake_server.requests[-1]
+    assert path == "/v1/chat/completions"
+    assert headers["Authorization"] == "Bearer secret"
+    assert body["stream_options"] == {"include_usage": True}
+
+
+def test_openai_stream_without_done_still_reports_usage(fake_server):
+    fake_server.lines = _sse(_delta("cut"), _delta(" off", "length"))
+    events = _stream(OpenAICompatibleBackend(_base_url(fake_server) + "/v1"), fake_server)
+    assert "".join(text for text, _ in events) == "cut off"
+    assert events[-1][1]["truncated"] is True
+    assert events[-1][1]["output_tokens"] is None
+
+
+def test_openai_stream_error_event_raises(fake_server):
+    fake_server.lines = _sse(_delta("a"), {"error": {"message": "model not loaded"}})
+    with pytest.raises(requests.exceptions.RequestException, match="model not loaded"):
+        _stream(OpenAICompatibleBackend(_base_url(fake_server) + "/v1"), fake_server)
+
+
+def test_ollama_stream_stops_at_done(fake_server):
+    fake_server.lines = [
+        json.dumps({"response": "Hi", "done": False}).encode(),
+        json.dumps(
+            {"response": " there", "done": True, "done_reason": "stop", "eval_count": 2,
+             "prompt_eval_count": 5, "eval_duration": 500_000_000}
+        ).encode(),
+        json.dumps({"response": "ignored", "done": False}).encode(),
+    ]
+    events = _stream(OllamaBackend(_base_url(fake_server) + "/api/generate"), fake_server)
+    assert [text for text, _ in events] == ["Hi", " there"]
+    assert events[-1][1] == {"output_tokens": 2, "prompt_tokens": 5, "truncated": False, "generation_seconds": 0.5}
+    assert fake_server.requests[-1][2]["options"]["temperature"] == 0.1
+
+
+@pytest.mark.parametrize("backend_cls, path", [(OllamaBackend, "/api/generate"), (OpenAICompatibleBackend, "/v1")])
+def test_generate_text_through_each_backend(fake_server, monkeypatch, backend_cls, path):
+    if backend_cls is OllamaBackend:
+        fake_server.lines = [
+            json.dumps({"response": "four", "done": False}).encode(),
+            json.dumps({"response": "", "done": True, "eval_count": 1}).encode(),
+        ]
+    else:
+        fake_server.lines = _sse(_delta("four", "stop"), USAGE_CHUNK, b"[DONE]")
+    backend = backend_cls(_base_url(fake_server) + path)
+    monkeypatch.setattr(llm_client, "get_backend", lambda name=None: backend)
+    chunks = []
+    assert llm_client.generate_text("2+2?", on_chunk=chunks.append, timeout=5) == "four"
+    assert chunks == ["four"]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown LLM backend"):
+        get_backend("nope")
+
+
+def test_stalled_stream_is_cancelled_at_the_deadline(fake_server, monkeypatch):
+    # A late first chunk restarts the request's read timeout; each later read is capped at the time left
+    fake_server.lines = [json.dumps({"response": "partial", "done": False}).encode()]
+    fake_server.delay, fake_server.stall = 0.7, 5
+    backend = OllamaBackend(_base_url(fake_server) + "/api/generate")
+    monkeypatch.setattr(llm_client, "get_backend", lambda name=None: backend)
+    start = time.time()
+    with pytest.raises(llm_client.GenerationCancelled) as cancelled:
+        llm_client.generate_text("slow", deadline=start + 1.0, timeout=30)
+    assert cancelled.value.reason == "deadline"
+    assert time.time() - start < 1.4
@@ -0,0 +1,26 @@
+from markdown_slides import is_structured, markdown_to_slides
+
+LECTURE = """# Research Methods
+
+## Case Studies
+
+Dr. Smith compared the U.S. and EU samples, e.g. by region. Mr. J. Doe replicated it. Results held.
+
+## Takeaways
+
+- Replicate before you generalize
+- Report effect sizes
+"""
+
+
+def test_abbreviations_do_not_split_bullets():
+    slides = markdown_to_slides(LECTURE)
+    assert "- Dr. Smith compared the U.S. and EU samples, e.g. by region" in slides
+    assert "- Mr. J. Doe replicated it" in slides
+    assert "- Results held" in slides
+    assert "- Dr\n" not in slides
+
+
+def test_plain_prose_is_not_structured():
+    assert is_structured(LECTURE)
+    assert not is_structured("Loops repeat work. They stop when a condition fails. Use them for iteration.")
@@ -0,0 +1,6 @@
+from bench_startup import BUDGET_MS, measure
+
+
+def test_cold_start_within_budget(tmp_path):
+    summary = measure(runs=5, data_dir=str(tmp_path))
+    assert summary["overhead_ms"] <= BUDGET_MS, summary
@@ -2,9 +2,12 @@
 
 import os
 import json
+import tempfile
 from datetime import datetime
 from typing import Dict, Union, Optional
 
+from interprocess import file_lock
+
 def ensure_data_dir(data_dir: str) -> None:
     """Create data directory if it doesn't exist."""
     if not os.path.exists(data_dir):
@@ -18,10 +21,13 @@ def sanitize_filename(name: str) -> str:
 
 def atomic_write(content: str, filepath: str) -> None:
     """Write content to file atomically using a temporary file."""
-    temp_path = filepath + ".tmp"
+    # Unique temp name so concurrent writers (threads or worker processes) never share it
+    fd, temp_path = tempfile.mkstemp(
+        prefix=os.path.basename(filepath) + ".", suffix=".tmp", dir=os.path.dirname(filepath) or "."
+    )
     try:
         # Write to temp file
-        with open(temp_path, "w", encoding="utf-8") as f:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write(content)
         # Atomic rename
         os.replace(temp_path, filepath)
@@ -37,8 +43,9 @@ def atomic_write(content: str, filepath: str) -> None:
 def save_jsonl(data: Dict, filepath: str, mode: str = "a") -> None:
     """Append or write a JSON line to a file."""
     try:
-        with open(filepath, mode, encoding="utf-8") as f:
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        with file_lock(filepath):
+            with open(filepath, mode, encoding="utf-8") as f:
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
     except Exception as e:
         raise Exception(f"Failed to save JSONL: {str(e)}")
 
@@ -1,6 +1,7 @@
 "use client";
 
 import { useState, useEffect } from "react";
+import { FileText, X } from "lucide-react";
 import { Conversation } from "@/types";
 import { useTheme } from "@/hooks/useTheme";
 import { useChat } from "@/hooks/useChat";
@@ -33,7 +34,9 @@ export default function StudyMind() {
     handleSend,
     handleKeyPress,
     handleInputResize,
-    handleFileUpload
+    handleFileUpload,
+    activeDocument,
+    clearActiveDocument
   } = useChat(userId);
   const { tone, toneMenuOpen, setToneMenuOpen, availableTones, changeTone } = useTone(userId, setMessages);
 
@@ -199,6 +202,19 @@ export default function StudyMind() {
           </div>
         )}
 
+        {/* File the chat is currently about */}
+        {activeTab === 'chat' && activeDocument && (
+          <div className="px-6 pt-2">
+            <div className={`inline-flex items-center gap-2 px-3 py-1.5 rounded-full text-sm ${isDark ? 'bg-gray-800 text-gray-200 border border-gray-700' : 'bg-gray-100 text-gray-800 border border-gray-300'}`}>
+              <FileText className="w-4 h-4" />
+              <span className="truncate max-w-xs">{activeDocument.name}</span>
+              <button onClick={clearActiveDocument} title="Stop referring to this file" className="hover:opacity-70">
+                <X className="w-4 h-4" />
+              </button>
+            </div>
+          </div>
+        )}
+
         {/* Chat Input Area */}
         {activeTab === 'chat' && (
           <ChatInput
@@ -17,6 +17,8 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
   const [cgDifficulty, setCgDifficulty] = useState<string>("beginner");
   const [cgOutput, setCgOutput] = useState<string>("");
   const [cgSlides, setCgSlides] = useState<string>("");
+  // "local" when the backend converted the lecture without the model
+  const [cgSlidesMode, setCgSlidesMode] = useState<string>("");
   const [cgSaving, setCgSaving] = useState<boolean>(false);
   const [loading, setLoading] = useState<boolean>(false);
 
@@ -24,6 +26,7 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
     if (!cgInput.trim()) return;
     setLoading(true);
     setCgSlides("");
+    setCgSlidesMode("");
     try {
       const combined = ctxText.trim() ? `${cgInput}\n\nContext:\n${ctxText}` : cgInput;
       const res = await fetch("http://127.0.0.1:5000/content/create", {
@@ -54,7 +57,7 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
     }
   };
 
-  const generateSlides = async () => {
+  const generateSlides = async (mode: "auto" | "llm" = "auto") => {
     if (!cgOutput.trim()) return;
     setLoading(true);
     try {
@@ -64,7 +67,7 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
           "Content-Type": "application/json",
           "Accept": "application/json"
         },
-        body: JSON.stringify({ content: cgOutput })
+        body: JSON.stringify({ content: cgOutput, mode })
       });
 
       if (!res.ok) {
@@ -78,8 +81,10 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
       }
 
       setCgSlides(data.slides || "");
+      setCgSlidesMode(data.mode || "");
     } catch (e) {
       setCgSlides(`Error: ${e instanceof Error ? e.message : "Failed to create slides"}. Please try again.`);
+      setCgSlidesMode("");
       console.error('Slide Generation Error:', e);
     } finally {
       setLoading(false);
@@ -170,12 +175,20 @@ export default function ContentGeneration({ isDark, userId, ctxText, setCtxText,
               {loading ? 'Generating...' : 'Generate Lecture'}
             </span>
           </button>
-          <button onClick={generateSlides} disabled={loading || !cgOutput.trim()} className={`px-6 py-2.5 rounded-xl font-semibold text-white transition-all duration-300 transform hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed disabled:hover:scale-100 shadow-lg ${loading || !cgOutput.trim() ? 'bg-gray-400' : 'bg-gradient-to-r from-purple-500 to-pink-600 hover:from-purple-600 hover:to-pink-700 shadow-pink-500/30'}`}>
+          <button onClick={() => generateSlides()} disabled={loading || !cgOutput.trim()} className={`px-6 py-2.5 rounded-xl font-semibold text-white transition-all duration-300 transform hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed disabled:hover:scale-100 shadow-lg ${loading || !cgOutput.trim() ? 'bg-gray-400' : 'bg-gradient-to-r from-purple-500 to-pink-600 hover:from-purple-600 hover:to-pink-700 shadow-pink-500/30'}`}>
             <span className="flex items-center gap-2">
               <Presentation className="w-4 h-4" />
               Generate Slides
             </span>
           </button>
+          {cgSlidesMode === "local" && (
+            <button onClick={() => generateSlides("llm")} disabled={loading} title="Slides were converted directly from the lecture structure; ask the model for a creative rewrite" className={`px-4 py-2.5 rounded-xl font-medium transition-all duration-300 transform hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed ${isDark ? 'bg-gray-700/50 hover:bg-gray-600/50 border border-gray-600' : 'bg-gray-100 hover:bg-gray-200 border border-gray-300'}`}>
+              <span className="flex items-center gap-2">
+                <Sparkles className="w-4 h-4" />
+                AI Rewrite
+              </span>
+            </button>
+          )}
           <button onClick={() => adjustContent('simplify')} disabled={loading || (!cgOutput.trim() && !cgSlides.trim())} className={`px-4 py-2.5 rounded-xl font-medium transition-all duration-300 transform hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed ${isDark ? 'bg-gray-700/50 hover:bg-gray-600/50 border border-gray-600' : 'bg-gray-100 hover:bg-gray-200 border border-gray-300'}`}>
             <span className="flex items-center gap-2">
               <Minimize2 className="w-4 h-4" />
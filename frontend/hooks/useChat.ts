@@ -3,6 +3,14 @@
 import { useState, useRef, useEffect } from "react";
 import { Message } from "@/types";
 
+// Last few messages, plus the turn that uploaded the current file when it has scrolled out
+function historyWindow(messages: Message[], documentId?: string): Message[] {
+  const recent = messages.slice(-5);
+  if (!documentId || recent.some(m => m.documentId === documentId)) return recent;
+  const upload = messages.find(m => m.documentId === documentId);
+  return upload ? [upload, ...recent] : recent;
+}
+
 export function useChat(userId: string) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputText, setInputText] = useState<string>("");
@@ -11,6 +19,9 @@ export function useChat(userId: string) {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLTextAreaElement>(null);
   const [uploadedFile, setUploadedFile] = useState<File | null>(null);
+  // File the conversation is about; its text stays on the server and is referenced by id.
+  // Shown (and detachable) above the chat input.
+  const [activeDocument, setActiveDocument] = useState<{ id: string; name: string } | null>(null);
 
   useEffect(() => {
     setMessages([
@@ -47,12 +58,13 @@ export function useChat(userId: string) {
     setIsTyping(true);
     
     try {
-      let textToSend = messageText;
+      let documentId = activeDocument?.id ?? null;
       
       // Handle file upload if present
       if (uploadedFile) {
         const formData = new FormData();
         formData.append('file', uploadedFile);
+        formData.append('include_text', '0');
         
         const uploadRes = await fetch('http://127.0.0.1:5000/upload', {
           method: 'POST',
@@ -61,7 +73,6 @@ export function useChat(userId: string) {
         
         if (uploadRes.ok) {
           const uploadData = await uploadRes.json();
-          const extractedContent = uploadData.extracted_text || "";
           const charCount = uploadData.char_count || 0;
           
           console.log(`File upload: ${uploadData.filename}`);
@@ -69,7 +80,7 @@ export function useChat(userId: string) {
           console.log(`Characters extracted: ${charCount}`);
           
           // Check if extraction failed
-          if (!extractedContent || charCount < 50) {
+          if (!uploadData.document_id || charCount < 50) {
             setIsTyping(false);
             const errorMsg: Message = {
               id: Date.now() + 1,
@@ -83,12 +94,11 @@ export function useChat(userId: string) {
             return;
           }
           
-          // Format the message clearly for the AI
-          if (messageText && messageText.trim()) {
-            textToSend = `File: ${uploadData.filename}\n\nExtracted content:\n${extractedContent}\n\nUser question: ${messageText}`;
-          } else {
-            textToSend = `File: ${uploadData.filename}\n\nExtracted content:\n${extractedContent}\n\nUser question: Please analyze this file and provide a comprehensive summary of its content, including key topics, main concepts, and important points.`;
-          }
+          // Follow-up messages keep referring to this file until it is detached or replaced.
+          // Tagging the upload turn lets the server send only relevant excerpts for follow-ups.
+          documentId = uploadData.document_id;
+          setActiveDocument({ id: uploadData.document_id, name: uploadData.filename });
+          setMessages(prev => prev.map(m => m.id === userMessage.id ? { ...m, documentId: uploadData.document_id } : m));
         }
         setUploadedFile(null);
       }
@@ -98,12 +108,22 @@ export function useChat(userId: string) {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
-          message: textToSend,
+          message: messageText,
           user_id: userId,
-          history: messages.slice(-5).map(m => ({ role: m.type === 'user' ? 'user' : 'assistant', content: m.content }))
+          document_id: documentId,
+          history: historyWindow(messages, documentId).map(m => ({
+            role: m.type === 'user' ? 'user' : 'assistant',
+            content: m.content,
+            ...(m.documentId ? { document_id: m.documentId } : {})
+          }))
         }),
       });
       
+      if (res.status === 404 && documentId) {
+        // The server no longer has the file (expired); stop referring to it
+        setActiveDocument(null);
+        throw new Error(`The uploaded file is no longer available, please upload it again`);
+      }
       if (!res.ok) {
         throw new Error(`HTTP error! status: ${res.status}`);
       }
@@ -164,6 +184,8 @@ export function useChat(userId: string) {
     handleKeyPress,
     handleInputResize,
     handleFileUpload,
-    uploadedFile
+    uploadedFile,
+    activeDocument,
+    clearActiveDocument: () => setActiveDocument(null)
   };
 }
@@ -6,6 +6,8 @@ export interface Message {
   task?: string;
   isProcessing?: boolean;
   isError?: boolean;
+  // Server-side id of the file uploaded with this message
+  documentId?: string;
 }
 
 export interface Option {